@@ -0,0 +1,728 @@
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Deque, Iterator, Optional, Tuple
+
+from error_handler import GeminiError, classify_error, logger
+
+class RecordingNotFoundError(GeminiError):
+    """A replay-only backend has no recorded response for the request"""
+    user_message = "No recorded response matches this request."
+
+def request_options(timeout: Optional[float]) -> Dict[str, Any]:
+    """Keyword arguments passing the remaining deadline to the SDK as its request timeout"""
+    if timeout is None:
+        return {}
+    return {"request_options": {"timeout": timeout}}
+
+def extract_response_text(response: Any) -> str:
+    """Extract text from Gemini API response"""
+    try:
+        if (response.candidates and
+            len(response.candidates) > 0 and
+            response.candidates[0].content and
+            len(response.candidates[0].content.parts) > 0):
+            return response.candidates[0].content.parts[0].text
+        else:
+            logger.warning("Unexpected response structure: %s", response)
+            return "No response from Gemini."
+    except Exception as e:
+        logger.error("Error extracting response text: %s", e)
+        return "Error processing AI response."
+
+def extract_chunk_text(chunk: Any) -> str:
+    """Extract the text carried by one chunk of a streamed Gemini response"""
+    try:
+        if (chunk.candidates and
+            len(chunk.candidates) > 0 and
+            chunk.candidates[0].content):
+            return "".join(getattr(part, "text", "") for part in chunk.candidates[0].content.parts)
+    except Exception as e:
+        logger.error("Error extracting chunk text: %s", e)
+    return ""
+
+def close_response(response: Any) -> None:
+    """
+    Drop the connection behind a streamed response that is being abandoned.
+
+    The SDK's streamed responses wrap a gRPC call (which has cancel()) or an
+    HTTP response iterator (which has close()); either is used when present.
+    """
+    for target in (response, getattr(response, "_iterator", None)):
+        for method in ("cancel", "close"):
+            stop = getattr(target, method, None)
+            if callable(stop):
+                try:
+                    stop()
+                except Exception as e:
+                    logger.debug("Error closing abandoned response stream: %s", e)
+                return
+
+def estimate_content_tokens(contents: Any) -> int:
+    """Cheap local token estimate for request contents (about four characters per token)"""
+    if isinstance(contents, str):
+        return max(1, len(contents) // 4)
+    return sum(max(1, len(str(part)) // 4) for message in contents for part in message["parts"])
+
+class ModelBackend:
+    """
+    Interface every model provider implements.
+
+    stream() and stream_async() open the request before returning, so a
+    failure to connect is raised by the call itself and can be retried or
+    failed over; the returned iterator yields the reply's text chunks.
+    The timeout is the number of seconds left for the request, or None.
+    """
+    name = "backend"
+
+    def generate(self, contents: Any, timeout: Optional[float] = None) -> str:
+        raise NotImplementedError
+
+    def stream(self, contents: Any, timeout: Optional[float] = None) -> Iterator[str]:
+        raise NotImplementedError
+
+    async def generate_async(self, contents: Any, timeout: Optional[float] = None) -> str:
+        raise NotImplementedError
+
+    async def stream_async(self, contents: Any, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    def count_tokens(self, contents: Any) -> int:
+        return estimate_content_tokens(contents)
+
+    def warmup(self) -> None:
+        """Do any slow setup ahead of the first request"""
+
+class GeminiBackend(ModelBackend):
+    """
+    A Gemini model, built and cached by a ModelRegistry.
+
+    The model is looked up on every call, so replacing the registry's
+    factory (e.g. with the fake backend) takes effect immediately.
+
+    With a ContextCache, a request that starts with a prefix already cached
+    upstream is sent as only the messages after it, to a model bound to the
+    cached content. If the API says that content is gone, the request is
+    sent again in full.
+    """
+    def __init__(self, registry: Any, model_name: str, context_cache: Any = None):
+        self.registry = registry
+        self.model_name = model_name
+        self.name = model_name
+        self.context_cache = context_cache
+
+    def model(self) -> Any:
+        return self.registry.get_model(self.model_name)
+
+    def _prepare(self, contents: Any) -> Tuple[Any, Any, Any]:
+        """The model to call, the contents to send it and the cached prefix used (or None)"""
+        if self.context_cache is not None and isinstance(contents, list):
+            found = self.context_cache.lookup(self.model_name, contents)
+            if found is not None:
+                prefix, rest = found
+                try:
+                    return self.context_cache.model_for(prefix), rest, prefix
+                except Exception as e:
+                    logger.warning("Could not use cached context for %s: %s", self.model_name, e)
+                    self.context_cache.invalidate(prefix, resent=True)
+        return self.model(), contents, None
+
+    def _fall_back(self, prefix: Any, error: Exception) -> bool:
+        """True if a failed call should be resent without its cached prefix"""
+        if prefix is None or not self.context_cache.is_cache_error(error):
+            return False
+        self.context_cache.invalidate(prefix, resent=True)
+        return True
+
+    def _observe(self, contents: Any, prefix: Any) -> None:
+        if self.context_cache is not None and isinstance(contents, list):
+            self.context_cache.observe(self.model_name, contents, prefix)
+
+    def _open(self, contents: Any, **kwargs) -> Any:
+        model, send, prefix = self._prepare(contents)
+        try:
+            response = model.generate_content(send, **kwargs)
+        except Exception as e:
+            if not self._fall_back(prefix, e):
+                raise
+            prefix = None
+            response = self.model().generate_content(contents, **kwargs)
+        self._observe(contents, prefix)
+        return response
+
+    async def _open_async(self, contents: Any, **kwargs) -> Any:
+        model, send, prefix = self._prepare(contents)
+        try:
+            response = await model.generate_content_async(send, **kwargs)
+        except Exception as e:
+            if not self._fall_back(prefix, e):
+                raise
+            prefix = None
+            response = await self.model().generate_content_async(contents, **kwargs)
+        self._observe(contents, prefix)
+        return response
+
+    def generate(self, contents: Any, timeout: Optional[float] = None) -> str:
+        return extract_response_text(self._open(contents, **request_options(timeout)))
+
+    def stream(self, contents: Any, timeout: Optional[float] = None) -> Iterator[str]:
+        response = self._open(contents, stream=True, **request_options(timeout))
+        return self._texts(response)
+
+    @staticmethod
+    def _texts(response: Any) -> Iterator[str]:
+        try:
+            for chunk in response:
+                text = extract_chunk_text(chunk)
+                if text:
+                    yield text
+        except BaseException:
+            # Closed early, cancelled or failed: stop the download rather than leaving it running
+            close_response(response)
+            raise
+
+    async def generate_async(self, contents: Any, timeout: Optional[float] = None) -> str:
+        response = await self._open_async(contents, **request_options(timeout))
+        return extract_response_text(response)
+
+    async def stream_async(self, contents: Any, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        response = await self._open_async(contents, stream=True, **request_options(timeout))
+        return self._texts_async(response)
+
+    @staticmethod
+    async def _texts_async(response: Any) -> AsyncIterator[str]:
+        try:
+            async for chunk in response:
+                text = extract_chunk_text(chunk)
+                if text:
+                    yield text
+        except BaseException:
+            close_response(response)
+            raise
+
+    def count_tokens(self, contents: Any) -> int:
+        model = self.model()
+        if not hasattr(model, "count_tokens"):
+            return estimate_content_tokens(contents)
+        return model.count_tokens(contents).total_tokens
+
+    def warmup(self) -> None:
+        self.model()
+
+class ReplayBackend(ModelBackend):
+    """
+    Deterministic offline backend answering from recorded responses.
+
+    Responses are keyed by a hash of the request contents and kept in a
+    JSONL file. With an `inner` backend the requests it has no recording
+    for are forwarded there and the replies are appended to the file
+    (record mode); without one they raise RecordingNotFoundError.
+    Streamed replays are split into words, so they are deterministic too.
+    """
+    def __init__(self, path: str, inner: Optional[ModelBackend] = None):
+        self.path = path
+        self.inner = inner
+        self.name = f"replay:{os.path.basename(path)}"
+        self._responses: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @staticmethod
+    def request_key(contents: Any) -> str:
+        return hashlib.sha256(json.dumps(contents, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _load(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for line_number, line in enumerate(f, 1):
+                        try:
+                            record = json.loads(line)
+                            self._responses[record["key"]] = record["response"]
+                        except (ValueError, KeyError, TypeError):
+                            logger.warning("Ignoring malformed recording on line %s of %s", line_number, self.path)
+            self._loaded = True
+            logger.info("Loaded %s recorded responses from %s", len(self._responses), self.path)
+
+    def _lookup(self, contents: Any) -> Tuple[str, Optional[str]]:
+        self._load()
+        key = self.request_key(contents)
+        with self._lock:
+            response = self._responses.get(key)
+        if response is None and self.inner is None:
+            raise RecordingNotFoundError(f"No recording for request {key[:12]} in {self.path}")
+        return key, response
+
+    def _record(self, key: str, response: str) -> None:
+        line = json.dumps({"key": key, "response": response}, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._responses[key] = response
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    @staticmethod
+    def _words(text: str) -> List[str]:
+        words = text.split(" ")
+        return [word + " " for word in words[:-1]] + [words[-1]]
+
+    def _recording_stream(self, key: str, chunks: Iterator[str]) -> Iterator[str]:
+        parts = []
+        for text in chunks:
+            parts.append(text)
+            yield text
+        self._record(key, "".join(parts))
+
+    async def _recording_stream_async(self, key: str, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+        parts = []
+        async for text in chunks:
+            parts.append(text)
+            yield text
+        self._record(key, "".join(parts))
+
+    @staticmethod
+    async def _replay_async(words: List[str]) -> AsyncIterator[str]:
+        for word in words:
+            yield word
+
+    def generate(self, contents: Any, timeout: Optional[float] = None) -> str:
+        key, response = self._lookup(contents)
+        if response is None:
+            response = self.inner.generate(contents, timeout)
+            self._record(key, response)
+        return response
+
+    def stream(self, contents: Any, timeout: Optional[float] = None) -> Iterator[str]:
+        key, response = self._lookup(contents)
+        if response is None:
+            return self._recording_stream(key, self.inner.stream(contents, timeout))
+        return iter(self._words(response))
+
+    async def generate_async(self, contents: Any, timeout: Optional[float] = None) -> str:
+        key, response = self._lookup(contents)
+        if response is None:
+            response = await self.inner.generate_async(contents, timeout)
+            self._record(key, response)
+        return response
+
+    async def stream_async(self, contents: Any, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        key, response = self._lookup(contents)
+        if response is None:
+            return self._recording_stream_async(key, await self.inner.stream_async(contents, timeout))
+        return self._replay_async(self._words(response))
+
+    def count_tokens(self, contents: Any) -> int:
+        if self.inner is not None:
+            return self.inner.count_tokens(contents)
+        return estimate_content_tokens(contents)
+
+    def warmup(self) -> None:
+        self._load()
+        if self.inner is not None:
+            self.inner.warmup()
+
+_attempt_budget: "contextvars.ContextVar[Optional[Tuple[Callable[[], Any], Callable[[], Awaitable[Any]]]]]" = \
+    contextvars.ContextVar("jarvis_attempt_budget", default=None)
+
+@contextlib.contextmanager
+def attempt_budget(acquire: Callable[[], Any], acquire_async: Callable[[], Awaitable[Any]]) -> Iterator[None]:
+    """
+    Charge every upstream attempt a BackendRouter makes inside this block.
+
+    acquire() runs before each sync attempt and acquire_async() is awaited
+    before each async one (e.g. to take rate-limit budget), so retries and
+    failovers are paid for like first attempts.
+    """
+    token = _attempt_budget.set((acquire, acquire_async))
+    try:
+        yield
+    finally:
+        _attempt_budget.reset(token)
+
+def _charge_attempt() -> None:
+    budget = _attempt_budget.get()
+    if budget is not None:
+        budget[0]()
+
+async def _charge_attempt_async() -> None:
+    budget = _attempt_budget.get()
+    if budget is not None:
+        await budget[1]()
+
+class BackendHealth:
+    """Exponentially weighted latency and error rate observed for one backend"""
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.last_attempt = 0.0
+
+    def record(self, latency: Optional[float], failed: bool) -> None:
+        self.calls += 1
+        if failed:
+            self.failures += 1
+        self.error_rate += self.alpha * ((1.0 if failed else 0.0) - self.error_rate)
+        if latency is not None:
+            self.latency = latency if self.latency is None else self.latency + self.alpha * (latency - self.latency)
+
+class BackendRouter(ModelBackend):
+    """
+    Sends each request to the first healthy backend, failing over in order.
+
+    A backend counts as degraded while its smoothed error rate is above
+    max_error_rate or its smoothed latency (time until it started answering)
+    is above max_latency. Degraded backends are skipped, except for one
+    probe request every probe_interval seconds so a recovered backend is
+    noticed. If every backend is degraded they are still tried, fastest
+    observed first, with the ones failing on errors last.
+
+    A retryable failure (rate limit, timeout, server error) moves the
+    request on to the next backend straight away. While another backend is
+    left to try, each attempt is given at most attempt_timeout seconds, so a
+    hung primary cannot use up the whole request deadline. Streams can only
+    fail over until their first chunk has been received. Every attempt is
+    charged to the caller's attempt_budget, if one is set.
+    """
+    def __init__(self, backends: List[ModelBackend], max_error_rate: float = 0.5, max_latency: float = 10.0,
+                 attempt_timeout: Optional[float] = 20.0, probe_interval: float = 30.0, alpha: float = 0.3):
+        if not backends:
+            raise ValueError("BackendRouter needs at least one backend")
+        self.backends = list(backends)
+        self.name = "router(" + ",".join(backend.name for backend in self.backends) + ")"
+        self.max_error_rate = max_error_rate
+        self.max_latency = max_latency
+        self.attempt_timeout = attempt_timeout
+        self.probe_interval = probe_interval
+        self._health = {id(backend): BackendHealth(alpha) for backend in self.backends}
+        self._lock = threading.Lock()
+        self.failovers = 0
+
+    def _degraded(self, health: BackendHealth) -> bool:
+        return health.error_rate > self.max_error_rate or (
+            health.latency is not None and health.latency > self.max_latency)
+
+    def candidates(self, contents: Any = None) -> List[ModelBackend]:
+        """Backends in the order the next request should try them"""
+        now = time.monotonic()
+        preferred, degraded = [], []
+        with self._lock:
+            for backend in self.backends:
+                health = self._health[id(backend)]
+                if not self._degraded(health):
+                    preferred.append(backend)
+                elif now - health.last_attempt >= self.probe_interval:
+                    # Let this request probe the degraded backend
+                    health.last_attempt = now
+                    preferred.append(backend)
+                else:
+                    degraded.append(backend)
+            degraded.sort(key=lambda backend: self._slowness(self._health[id(backend)]))
+        return preferred + degraded
+
+    def _slowness(self, health: BackendHealth) -> Tuple[bool, float]:
+        return (health.error_rate > self.max_error_rate, health.latency or 0.0)
+
+    def _attempt_timeout(self, timeout: Optional[float], last: bool) -> Optional[float]:
+        if last or self.attempt_timeout is None:
+            return timeout
+        return self.attempt_timeout if timeout is None else min(timeout, self.attempt_timeout)
+
+    def _record(self, backend: ModelBackend, latency: Optional[float], failed: bool) -> None:
+        with self._lock:
+            health = self._health[id(backend)]
+            health.record(latency, failed)
+            health.last_attempt = time.monotonic()
+
+    def _on_failure(self, backend: ModelBackend, error: Exception, last: bool) -> None:
+        """Record a failed attempt; re-raises unless the request should move to the next backend"""
+        if not classify_error(error).retryable:
+            # The request itself is at fault, so another backend would fail the same way
+            raise error
+        self._record(backend, None, True)
+        if last:
+            raise error
+        with self._lock:
+            self.failovers += 1
+        logger.warning("Backend %s failed (%s); failing over", backend.name, type(error).__name__)
+
+    def generate(self, contents: Any, timeout: Optional[float] = None) -> str:
+        candidates = self.candidates(contents)
+        for index, backend in enumerate(candidates):
+            last = index == len(candidates) - 1
+            _charge_attempt()
+            started = time.monotonic()
+            try:
+                text = backend.generate(contents, self._attempt_timeout(timeout, last))
+            except Exception as e:
+                self._on_failure(backend, e, last)
+                continue
+            self._record(backend, time.monotonic() - started, False)
+            return text
+
+    def stream(self, contents: Any, timeout: Optional[float] = None) -> Iterator[str]:
+        candidates = self.candidates(contents)
+        for index, backend in enumerate(candidates):
+            last = index == len(candidates) - 1
+            _charge_attempt()
+            started = time.monotonic()
+            try:
+                chunks = backend.stream(contents, self._attempt_timeout(timeout, last))
+                first = next(chunks, None)
+            except Exception as e:
+                self._on_failure(backend, e, last)
+                continue
+            self._record(backend, time.monotonic() - started, False)
+            return self._relay(backend, first, chunks)
+
+    def _relay(self, backend: ModelBackend, first: Optional[str], chunks: Iterator[str]) -> Iterator[str]:
+        if first is None:
+            return
+        yield first
+        try:
+            yield from chunks
+        except Exception as e:
+            if classify_error(e).retryable:
+                self._record(backend, None, True)
+            raise
+
+    async def generate_async(self, contents: Any, timeout: Optional[float] = None) -> str:
+        candidates = self.candidates(contents)
+        for index, backend in enumerate(candidates):
+            last = index == len(candidates) - 1
+            await _charge_attempt_async()
+            started = time.monotonic()
+            try:
+                text = await backend.generate_async(contents, self._attempt_timeout(timeout, last))
+            except Exception as e:
+                self._on_failure(backend, e, last)
+                continue
+            self._record(backend, time.monotonic() - started, False)
+            return text
+
+    async def stream_async(self, contents: Any, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        candidates = self.candidates(contents)
+        for index, backend in enumerate(candidates):
+            last = index == len(candidates) - 1
+            await _charge_attempt_async()
+            started = time.monotonic()
+            try:
+                chunks = await backend.stream_async(contents, self._attempt_timeout(timeout, last))
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                first = None
+            except Exception as e:
+                self._on_failure(backend, e, last)
+                continue
+            self._record(backend, time.monotonic() - started, False)
+            return self._relay_async(backend, first, chunks)
+
+    async def _relay_async(self, backend: ModelBackend, first: Optional[str],
+                           chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+        if first is None:
+            return
+        yield first
+        try:
+            async for text in chunks:
+                yield text
+        except Exception as e:
+            if classify_error(e).retryable:
+                self._record(backend, None, True)
+            raise
+
+    def count_tokens(self, contents: Any) -> int:
+        return self.candidates()[0].count_tokens(contents)
+
+    def warmup(self) -> None:
+        self.backends[0].warmup()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the failover count and each backend's observed health"""
+        with self._lock:
+            return {
+                "failovers": self.failovers,
+                "backends": [{
+                    "name": backend.name,
+                    "latency": health.latency,
+                    "error_rate": round(health.error_rate, 3),
+                    "calls": health.calls,
+                    "failures": health.failures,
+                    "degraded": self._degraded(health)
+                } for backend, health in ((b, self._health[id(b)]) for b in self.backends)]
+            }
+
+_route_hint: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("jarvis_route_hint", default=None)
+
+@contextlib.contextmanager
+def route_hint(name: Optional[str]) -> Iterator[None]:
+    """Ask an AdaptiveRouter to use the named route for model calls made inside this block"""
+    token = _route_hint.set(name)
+    try:
+        yield
+    finally:
+        _route_hint.reset(token)
+
+class Route:
+    """
+    A class of requests and the models allowed to serve it.
+
+    A request fits the route if its newest message has at most
+    max_prompt_tokens and the whole request (history included) at most
+    max_request_tokens; None means no limit.
+    """
+    def __init__(self, name: str, router: BackendRouter, max_prompt_tokens: Optional[int] = None,
+                 max_request_tokens: Optional[int] = None, window: int = 100):
+        self.name = name
+        self.router = router
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_request_tokens = max_request_tokens
+        self.requests = 0
+        self.failures = 0
+        self.hinted = 0
+        # Seconds until each recent request started answering, for the rolling percentiles in stats()
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+    def fits(self, prompt_tokens: int, request_tokens: int) -> bool:
+        return ((self.max_prompt_tokens is None or prompt_tokens <= self.max_prompt_tokens) and
+                (self.max_request_tokens is None or request_tokens <= self.max_request_tokens))
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class AdaptiveRouter(ModelBackend):
+    """
+    Picks a route for each request, then a model within it.
+
+    Classification is cheap and local: an explicit hint (see route_hint)
+    wins; otherwise the request goes to the first route whose prompt and
+    history limits it fits, and the last route takes everything else.
+
+    Each route has its own BackendRouter whose max_latency is the route's
+    latency SLO, so a model whose smoothed latency exceeds the SLO stops
+    getting traffic (apart from periodic probes) while another model in the
+    route meets it, and the fastest is used when none does. Latency is the
+    time until the model started answering: the first chunk of a stream, or
+    the whole reply otherwise.
+    """
+    def __init__(self, routes: List[Route], observer: Optional[Callable[[str, bool], None]] = None):
+        if not routes:
+            raise ValueError("AdaptiveRouter needs at least one route")
+        self.routes = list(routes)
+        # Called as observer(route name, failed) after every request, e.g. to count requests per route
+        self.observer = observer
+        self._by_name = {route.name: route for route in self.routes}
+        self.name = "adaptive(" + ",".join(route.name for route in self.routes) + ")"
+        self._lock = threading.Lock()
+
+    def classify(self, contents: Any) -> Route:
+        """Choose the route for a request"""
+        hinted = self._by_name.get(_route_hint.get())
+        if hinted is not None:
+            with self._lock:
+                hinted.hinted += 1
+            return hinted
+        request_tokens = estimate_content_tokens(contents)
+        prompt_tokens = request_tokens if isinstance(contents, str) else estimate_content_tokens(contents[-1:])
+        for route in self.routes[:-1]:
+            if route.fits(prompt_tokens, request_tokens):
+                return route
+        return self.routes[-1]
+
+    def _record(self, route: Route, started: float, failed: bool) -> None:
+        with self._lock:
+            route.requests += 1
+            if failed:
+                route.failures += 1
+            else:
+                route.latencies.append(time.monotonic() - started)
+        if self.observer is not None:
+            self.observer(route.name, failed)
+
+    def generate(self, contents: Any, timeout: Optional[float] = None) -> str:
+        route = self.classify(contents)
+        started = time.monotonic()
+        try:
+            text = route.router.generate(contents, timeout)
+        except Exception:
+            self._record(route, started, True)
+            raise
+        self._record(route, started, False)
+        return text
+
+    def stream(self, contents: Any, timeout: Optional[float] = None) -> Iterator[str]:
+        # The route's router returns once the first chunk has arrived
+        route = self.classify(contents)
+        started = time.monotonic()
+        try:
+            chunks = route.router.stream(contents, timeout)
+        except Exception:
+            self._record(route, started, True)
+            raise
+        self._record(route, started, False)
+        return chunks
+
+    async def generate_async(self, contents: Any, timeout: Optional[float] = None) -> str:
+        route = self.classify(contents)
+        started = time.monotonic()
+        try:
+            text = await route.router.generate_async(contents, timeout)
+        except Exception:
+            self._record(route, started, True)
+            raise
+        self._record(route, started, False)
+        return text
+
+    async def stream_async(self, contents: Any, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        route = self.classify(contents)
+        started = time.monotonic()
+        try:
+            chunks = await route.router.stream_async(contents, timeout)
+        except Exception:
+            self._record(route, started, True)
+            raise
+        self._record(route, started, False)
+        return chunks
+
+    def count_tokens(self, contents: Any) -> int:
+        return self.classify(contents).router.count_tokens(contents)
+
+    def warmup(self) -> None:
+        for route in self.routes:
+            route.router.warmup()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return per-route counts and rolling latencies, plus the failover stats of every route's models.
+
+        "backends" lists each route's models (tagged with the route), so their
+        calls, failures and smoothed latency show how traffic was split.
+        """
+        routes = {}
+        backends = []
+        failovers = 0
+        for route in self.routes:
+            router_stats = route.router.stats()
+            failovers += router_stats["failovers"]
+            for backend in router_stats["backends"]:
+                backends.append(dict(backend, route=route.name))
+            with self._lock:
+                p50, p90 = route.percentile(0.5), route.percentile(0.9)
+                routes[route.name] = {
+                    "requests": route.requests,
+                    "failures": route.failures,
+                    "hinted": route.hinted,
+                    "latency_slo": route.router.max_latency,
+                    "latency_p50_ms": None if p50 is None else round(p50 * 1000, 1),
+                    "latency_p90_ms": None if p90 is None else round(p90 * 1000, 1)
+                }
+        return {"failovers": failovers, "backends": backends, "routes": routes}
@@ -0,0 +1,187 @@
+import concurrent.futures
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, Iterator, List, Set, Tuple
+
+from chat_logic import chat_with_gemini, session_manager
+from error_handler import logger
+from scheduler import Priority
+
+class BatchConfig:
+    """Configuration for batch runs"""
+    WORKERS = int(os.getenv("JARVIS_BATCH_WORKERS", "8"))
+    FSYNC_EVERY = 100
+
+class BatchStats:
+    """Counters reported at the end of a batch run"""
+    def __init__(self):
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.interrupted = False
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def processed(self) -> int:
+        return self.succeeded + self.failed
+
+    def summary(self) -> str:
+        rate = self.processed / self.elapsed if self.elapsed > 0 else 0.0
+        summary = (f"Processed {self.processed} item(s) in {self.elapsed:.1f}s ({rate:.2f} prompts/sec): "
+                   f"{self.succeeded} succeeded, {self.failed} failed, {self.skipped} already done")
+        if self.interrupted:
+            summary += " (interrupted; run again to resume)"
+        return summary
+
+class JsonlWriter:
+    """Appends JSON records to a file as they complete, flushing each one"""
+    def __init__(self, path: str):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._unsynced = 0
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= BatchConfig.FSYNC_EVERY:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+def load_completed_ids(out_path: str) -> Set[str]:
+    """
+    Return the ids already written to an output file.
+
+    A partially written last line (from a crash mid-write) is cut off so new
+    results are appended after the last complete record.
+    """
+    completed: Set[str] = set()
+    if not os.path.exists(out_path):
+        return completed
+
+    good_length = 0
+    with open(out_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                completed.add(str(json.loads(line)["id"]))
+            except (ValueError, KeyError, TypeError):
+                logger.warning("Ignoring malformed line in %s", out_path)
+            good_length += len(line)
+
+    if good_length < os.path.getsize(out_path):
+        logger.warning("Truncating incomplete last record in %s", out_path)
+        with open(out_path, "r+b") as f:
+            f.truncate(good_length)
+    return completed
+
+def read_items(in_path: str) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Lazily read batch items from a JSONL file.
+
+    Each line is {"id": ..., "prompt": "..."} for a single prompt, or
+    {"id": ..., "messages": ["...", "..."]} for a conversation whose user
+    messages are sent in order. Lines without an id are numbered.
+    """
+    with open(in_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                logger.warning("Skipping invalid JSON on line %s of %s", line_number, in_path)
+                continue
+            messages = item.get("messages")
+            if messages is None:
+                messages = [item.get("prompt", "")]
+            if not messages or not all(isinstance(m, str) and m.strip() for m in messages):
+                logger.warning("Skipping line %s of %s: no prompt or messages", line_number, in_path)
+                continue
+            yield str(item.get("id", line_number)), messages
+
+def run_item(item_id: str, messages: List[str]) -> Dict[str, Any]:
+    """Run one batch item in its own session and return its output record"""
+    session_id = f"batch-{item_id}"
+    started = time.perf_counter()
+    try:
+        responses = [chat_with_gemini(message, session_id=session_id, priority=Priority.BATCH, raise_errors=True)
+                     for message in messages]
+    finally:
+        session_manager.remove(session_id)
+    return {"id": item_id, "responses": responses, "elapsed": round(time.perf_counter() - started, 3)}
+
+def run_batch(in_path: str, out_path: str, workers: int = BatchConfig.WORKERS) -> BatchStats:
+    """
+    Run every item of a JSONL file through the model with a pool of workers.
+
+    Results are appended to out_path as each item finishes, and items already
+    present there are skipped, so an interrupted run can simply be restarted.
+    Failed items are written to <out_path>.errors and retried on the next run.
+
+    Args:
+        in_path (str): Input JSONL file
+        out_path (str): Output JSONL file (also the checkpoint)
+        workers (int): Number of concurrent requests
+
+    Returns:
+        BatchStats: Counts and timing for the run
+    """
+    stats = BatchStats()
+    completed = load_completed_ids(out_path)
+    results = JsonlWriter(out_path)
+    errors = JsonlWriter(out_path + ".errors")
+    max_in_flight = workers * 2
+    in_flight: Set["concurrent.futures.Future[Dict[str, Any]]"] = set()
+    future_ids: Dict["concurrent.futures.Future[Dict[str, Any]]", str] = {}
+
+    def collect(done: Set["concurrent.futures.Future[Dict[str, Any]]"]) -> None:
+        for future in done:
+            in_flight.discard(future)
+            item_id = future_ids.pop(future)
+            try:
+                results.write(future.result())
+                stats.succeeded += 1
+            except Exception as e:
+                stats.failed += 1
+                errors.write({"id": item_id, "error": str(e), "type": type(e).__name__})
+                logger.warning("Batch item %s failed: %s", item_id, e)
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jarvis-batch")
+    try:
+        for item_id, messages in read_items(in_path):
+            if item_id in completed:
+                stats.skipped += 1
+                continue
+            # Keep a bounded number of items in flight so huge inputs are never buffered
+            if len(in_flight) >= max_in_flight:
+                done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                collect(done)
+            future = executor.submit(run_item, item_id, messages)
+            in_flight.add(future)
+            future_ids[future] = item_id
+        collect(concurrent.futures.wait(in_flight)[0])
+    except KeyboardInterrupt:
+        logger.warning("Batch interrupted; finishing requests already in flight")
+        for future in in_flight:
+            future.cancel()
+        collect({future for future in concurrent.futures.wait(in_flight)[0] if not future.cancelled()})
+        stats.interrupted = True
+    finally:
+        executor.shutdown(wait=True)
+        results.close()
+        errors.close()
+        stats.elapsed = time.perf_counter() - stats.started
+    return stats
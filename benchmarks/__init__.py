@@ -0,0 +1,10 @@
+"""
+Offline performance benchmarks for the Jarvis assistant.
+
+Run them from the repository root with
+
+    python -m benchmarks.run --out results.json
+
+Every benchmark talks to the local fake model from fake_backend, so no API
+key or network access is needed.
+"""
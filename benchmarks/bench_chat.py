@@ -0,0 +1,69 @@
+import time
+from typing import Dict, Any, List
+
+from chat_logic import (
+    CacheConfig, chat_with_gemini, chat_with_gemini_stream, model_registry,
+    response_cache, session_manager
+)
+from fake_backend import install_fake_backend
+from benchmarks.common import summarize, time_calls
+
+def _chat(message: str, session_id: str) -> str:
+    return chat_with_gemini(message, session_id=session_id, raise_errors=True)
+
+def run(iterations: int) -> Dict[str, Any]:
+    """
+    Measure the time chat_with_gemini adds on top of the model call.
+
+    The fake model answers instantly, so the request timings are almost
+    entirely our own overhead: session lookup, building the request,
+    scheduling, retries, caching, history commit, metrics and logging.
+    backend_only times the bare fake model call for comparison.
+
+    Args:
+        iterations (int): Requests timed per case
+
+    Returns:
+        Dict[str, Any]: Timing summaries keyed by case name
+    """
+    install_fake_backend(model_registry)
+    model = model_registry.get_model()
+    contents = [{"role": "user", "parts": ["Hello"]}]
+    results: Dict[str, Any] = {
+        "chat.backend_only": summarize(time_calls(lambda i: model.generate_content(contents), iterations))
+    }
+
+    cache_enabled = CacheConfig.ENABLED
+    CacheConfig.ENABLED = False
+    try:
+        def fresh_session(i: int) -> None:
+            _chat(f"Message {i}", f"bench-fresh-{i}")
+            session_manager.remove(f"bench-fresh-{i}")
+        results["chat.overhead.fresh_session"] = summarize(time_calls(fresh_session, iterations))
+
+        results["chat.overhead.long_session"] = summarize(
+            time_calls(lambda i: _chat(f"Message {i}", "bench-long"), iterations))
+        session_manager.remove("bench-long")
+
+        first_chunk: List[float] = []
+        def stream(i: int) -> None:
+            started = time.perf_counter()
+            for n, _ in enumerate(chat_with_gemini_stream(f"Message {i}", session_id="bench-stream")):
+                if n == 0:
+                    first_chunk.append(time.perf_counter() - started)
+        results["chat.stream.total"] = summarize(time_calls(stream, iterations))
+        results["chat.stream.first_chunk"] = summarize(first_chunk)
+        session_manager.remove("bench-stream")
+
+        CacheConfig.ENABLED = True
+        response_cache.clear()
+        _chat("Cached message", "bench-cache-warm")
+        def cache_hit(i: int) -> None:
+            _chat("Cached message", f"bench-cache-{i}")
+            session_manager.remove(f"bench-cache-{i}")
+        results["chat.cache_hit"] = summarize(time_calls(cache_hit, iterations))
+        session_manager.remove("bench-cache-warm")
+    finally:
+        CacheConfig.ENABLED = cache_enabled
+        response_cache.clear()
+    return results
@@ -0,0 +1,115 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+from chat_logic import (
+    chat_with_gemini, chat_with_gemini_stream_async, model_registry,
+    resilient_caller, session_manager
+)
+from fake_backend import install_fake_backend
+from benchmarks.common import summarize
+
+class LoadResult:
+    """Latencies and error counts collected from the simulated users"""
+    def __init__(self, users: int):
+        self.users = users
+        self.latencies: List[float] = []
+        self.first_chunks: List[float] = []
+        self.errors = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, failed: bool, first_chunk: Optional[float] = None) -> None:
+        with self._lock:
+            self.latencies.append(latency)
+            if first_chunk is not None:
+                self.first_chunks.append(first_chunk)
+            if failed:
+                self.errors += 1
+
+    def to_dict(self, retries: int) -> Dict[str, Any]:
+        requests = len(self.latencies)
+        result = {
+            "users": self.users,
+            "requests": requests,
+            "errors": self.errors,
+            "retries": retries,
+            "elapsed_s": round(self.elapsed, 4),
+            "throughput_rps": round(requests / self.elapsed, 2) if self.elapsed > 0 else None,
+            "latency": summarize(self.latencies)
+        }
+        if self.first_chunks:
+            result["first_chunk"] = summarize(self.first_chunks)
+        return result
+
+def _run_threads(users: int, messages_per_user: int) -> LoadResult:
+    """Each user is a thread sending its messages one after another in its own session"""
+    result = LoadResult(users)
+
+    def user(index: int) -> None:
+        session_id = f"bench-thread-{users}-{index}"
+        for n in range(messages_per_user):
+            started = time.perf_counter()
+            failed = False
+            try:
+                chat_with_gemini(f"User {index} message {n}", session_id=session_id, raise_errors=True)
+            except Exception:
+                failed = True
+            result.record(time.perf_counter() - started, failed)
+        session_manager.remove(session_id)
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=users, thread_name_prefix="bench-user") as executor:
+        list(executor.map(user, range(users)))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+async def _run_async_streams(users: int, messages_per_user: int) -> LoadResult:
+    """Each user is a task streaming its replies on a single event loop"""
+    result = LoadResult(users)
+
+    async def user(index: int) -> None:
+        session_id = f"bench-async-{users}-{index}"
+        for n in range(messages_per_user):
+            started = time.perf_counter()
+            stream = chat_with_gemini_stream_async(f"User {index} message {n}", session_id=session_id)
+            async for _ in stream:
+                pass
+            result.record(time.perf_counter() - started, stream.error_message is not None,
+                          stream.time_to_first_token)
+        session_manager.remove(session_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(index) for index in range(users)))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+def run(user_counts: List[int], messages_per_user: int, **backend_options: Any) -> Dict[str, Any]:
+    """
+    Simulate N concurrent users against the fake model.
+
+    Every user has its own session and sends messages_per_user messages, so
+    histories grow as they would in real conversations. Both the threaded
+    path (chat_with_gemini) and the async streaming path are measured.
+
+    Args:
+        user_counts (List[int]): Numbers of concurrent users to try
+        messages_per_user (int): Messages each user sends
+        **backend_options: FakeGenerativeModel options (latency, tokens_per_second, error_rate, ...)
+
+    Returns:
+        Dict[str, Any]: Throughput, error counts and latency summaries keyed by case name
+    """
+    install_fake_backend(model_registry, **backend_options)
+    results: Dict[str, Any] = {}
+    for users in user_counts:
+        retries_before = resilient_caller.stats()["retries"]
+        load = _run_threads(users, messages_per_user)
+        results[f"concurrency.threads.{users}"] = load.to_dict(resilient_caller.stats()["retries"] - retries_before)
+
+        retries_before = resilient_caller.stats()["retries"]
+        load = asyncio.run(_run_async_streams(users, messages_per_user))
+        results[f"concurrency.async_stream.{users}"] = load.to_dict(resilient_caller.stats()["retries"] - retries_before)
+    return results
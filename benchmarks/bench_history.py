@@ -0,0 +1,45 @@
+from typing import Dict, Any, List
+
+from chat_logic import ChatHistory, estimate_tokens
+from benchmarks.common import summarize, time_calls
+
+MESSAGE = "A moderately long chat message used to fill the history for benchmarking. " * 3
+
+def filled_history(messages: int, token_budget: int) -> ChatHistory:
+    """Build a history already holding `messages` alternating user/model messages"""
+    history = ChatHistory(token_budget=token_budget)
+    for i in range(messages // 2):
+        history.add_turn(MESSAGE, MESSAGE)
+    return history
+
+def run(sizes: List[int], iterations: int) -> Dict[str, Any]:
+    """
+    Time ChatHistory operations on histories of the given sizes.
+
+    For each size this measures add_message while the history only grows,
+    add_message when every add evicts (the budget is exactly full), and the
+    history snapshot every request takes to build its contents.
+
+    Args:
+        sizes (List[int]): History lengths in messages
+        iterations (int): Operations timed per case
+
+    Returns:
+        Dict[str, Any]: Timing summaries keyed by case name
+    """
+    results: Dict[str, Any] = {}
+    message_tokens = estimate_tokens(MESSAGE)
+    roles = ("user", "model")
+    for size in sizes:
+        history = filled_history(size, token_budget=10 ** 12)
+        results[f"history.add_message.growing.{size}"] = summarize(
+            time_calls(lambda i: history.add_message(roles[i % 2], MESSAGE), iterations))
+
+        history = filled_history(size, token_budget=size * message_tokens)
+        results[f"history.add_message.evicting.{size}"] = summarize(
+            time_calls(lambda i: history.add_message(roles[i % 2], MESSAGE), iterations))
+
+        snapshot_iterations = max(10, iterations // 10)
+        results[f"history.snapshot.{size}"] = summarize(
+            time_calls(lambda i: history.messages, snapshot_iterations))
+    return results
@@ -0,0 +1,45 @@
+import math
+import time
+from typing import List, Dict, Any, Callable, Optional
+
+def percentile(sorted_samples: List[float], q: float) -> Optional[float]:
+    """Linearly interpolated q-quantile (0 <= q <= 1) of already sorted samples"""
+    if not sorted_samples:
+        return None
+    position = q * (len(sorted_samples) - 1)
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_samples) - 1)
+    return sorted_samples[lower] + (sorted_samples[upper] - sorted_samples[lower]) * (position - lower)
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    """
+    Summarize per-operation timings.
+
+    Args:
+        samples (List[float]): Durations in seconds
+
+    Returns:
+        Dict[str, Any]: Count, mean, min, max and p50/p95/p99, all in milliseconds
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+    to_ms = lambda seconds: round(seconds * 1000, 4)
+    return {
+        "count": len(ordered),
+        "mean_ms": to_ms(sum(ordered) / len(ordered)),
+        "min_ms": to_ms(ordered[0]),
+        "p50_ms": to_ms(percentile(ordered, 0.50)),
+        "p95_ms": to_ms(percentile(ordered, 0.95)),
+        "p99_ms": to_ms(percentile(ordered, 0.99)),
+        "max_ms": to_ms(ordered[-1])
+    }
+
+def time_calls(fn: Callable[[int], Any], iterations: int) -> List[float]:
+    """Call fn(i) for i in range(iterations) and return each call's duration in seconds"""
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - started)
+    return samples
@@ -0,0 +1,142 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+from typing import Dict, Any, List, Optional, Tuple
+
+# Keep benchmark runs from touching the real log, cache and conversation files,
+# and make injected failures retry quickly. Explicit settings still win.
+_BENCH_DIR = os.path.join(tempfile.gettempdir(), "jarvis-benchmarks")
+os.environ.setdefault("JARVIS_LOG_FILE", os.path.join(_BENCH_DIR, "benchmarks.log"))
+os.environ.setdefault("JARVIS_CONVERSATION_DIR", os.path.join(_BENCH_DIR, "conversations"))
+os.environ.setdefault("JARVIS_CONSOLE_LOG_LEVEL", "ERROR")
+os.environ.setdefault("JARVIS_RESPONSE_CACHE", "0")
+os.environ.setdefault("JARVIS_RETRY_BASE_DELAY", "0.01")
+os.environ.setdefault("JARVIS_RETRY_MAX_DELAY", "0.1")
+os.makedirs(_BENCH_DIR, exist_ok=True)
+
+from benchmarks import bench_chat, bench_concurrency, bench_history
+
+RESULT_FORMAT_VERSION = 1
+SUITES = ("history", "chat", "concurrency")
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the Jarvis benchmarks against a local fake model")
+    parser.add_argument("--suite", action="append", choices=SUITES,
+                        help="Suite to run (repeatable; default: all)")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes and fewer iterations")
+    parser.add_argument("--out", help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="Compare against an earlier results file and exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative slowdown counted as a regression (default: 0.2)")
+    parser.add_argument("--history-sizes", type=_int_list, help="History lengths in messages, e.g. 1000,10000")
+    parser.add_argument("--iterations", type=int, help="Operations timed per case")
+    parser.add_argument("--users", type=_int_list, help="Concurrent user counts, e.g. 1,8,32")
+    parser.add_argument("--messages", type=int, help="Messages sent by each simulated user")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake model latency before the reply, in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Random extra latency, up to this many seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=500.0, help="Fake model output rate")
+    parser.add_argument("--reply-words", type=int, default=50, help="Words in each fake reply")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of fake model calls that fail with a retryable error")
+    parser.add_argument("--stream-error-rate", type=float, default=0.0,
+                        help="Fraction of fake streams that fail part-way through")
+    parser.add_argument("--seed", type=int, default=1234, help="Seed for latency jitter and error injection")
+    return parser.parse_args(argv)
+
+def run_suites(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the selected suites and return their results keyed by case name"""
+    suites = args.suite or SUITES
+    iterations = args.iterations or (200 if args.quick else 2000)
+    results: Dict[str, Any] = {}
+    if "history" in suites:
+        sizes = args.history_sizes or ([1000, 10000] if args.quick else [1000, 10000, 100000])
+        results.update(bench_history.run(sizes, iterations))
+    if "chat" in suites:
+        results.update(bench_chat.run(max(1, iterations // 4)))
+    if "concurrency" in suites:
+        results.update(bench_concurrency.run(
+            args.users or ([1, 8] if args.quick else [1, 8, 32, 128]),
+            args.messages or (5 if args.quick else 20),
+            latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+            reply_words=args.reply_words, error_rate=args.error_rate,
+            stream_error_rate=args.stream_error_rate, seed=args.seed
+        ))
+    return results
+
+def comparable_metrics(result: Dict[str, Any]) -> Dict[str, Tuple[float, bool]]:
+    """
+    Pick the numbers of one case that are compared between runs.
+
+    Returns:
+        Dict[str, Tuple[float, bool]]: metric name -> (value, True if higher is better)
+    """
+    latency = result.get("latency", result)
+    metrics = {name: (latency[name], False) for name in ("p50_ms", "p95_ms") if latency.get(name) is not None}
+    if result.get("throughput_rps") is not None:
+        metrics["throughput_rps"] = (result["throughput_rps"], True)
+    return metrics
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Compare two results documents case by case.
+
+    Returns:
+        List[str]: One line per metric that got worse by more than threshold
+    """
+    regressions = []
+    for case, result in sorted(current["results"].items()):
+        old_result = baseline["results"].get(case)
+        if old_result is None:
+            continue
+        old_metrics = comparable_metrics(old_result)
+        for metric, (value, higher_is_better) in comparable_metrics(result).items():
+            old_value = old_metrics.get(metric, (None,))[0]
+            if not old_value:
+                continue
+            change = (value - old_value) / old_value
+            worse = -change if higher_is_better else change
+            if worse > threshold:
+                regressions.append(f"{case} {metric}: {old_value} -> {value} ({change:+.0%})")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmarks, write the results and optionally check them against a baseline"""
+    args = parse_args(argv)
+    document = {
+        "version": RESULT_FORMAT_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {name: value for name, value in vars(args).items() if name not in ("out", "compare")},
+        "results": run_suites(args)
+    }
+
+    output = json.dumps(document, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"Wrote {len(document['results'])} benchmark results to {args.out}", file=sys.stderr)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, document, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
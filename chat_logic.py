@@ -1,8 +1,30 @@
 import os
-import google.generativeai as genai
+import asyncio
+import concurrent.futures
+import json
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
 from dotenv import load_dotenv
-from error_handler import ErrorHandler, logger
-from typing import List, Dict, Any, Optional
+from backends import (AdaptiveRouter, BackendRouter, GeminiBackend, ModelBackend, ReplayBackend, Route,
+                      attempt_budget, route_hint)
+from context_cache import ContextCache, GeminiCacheProvider, stable_prefix
+from conversation_search import FTS5_AVAILABLE, ConversationSearch
+from conversation_store import ConversationStore
+from document_index import AttachedDocument, DocumentLibrary
+from error_handler import AuthenticationError, ErrorHandler, classify_error, log_context, logger, new_request_id
+from metrics import SIZE_BUCKETS, MetricsRegistry, metrics_registry
+from resilience import CircuitBreaker, ResilientCaller, RetryPolicy, deadline_paused
+from response_cache import ResponseCache
+from scheduler import Priority, RequestScheduler
+from startup_profile import startup_profile
+from typing import (List, Dict, Any, AsyncIterator, Awaitable, Callable, Deque, Iterator, Optional, Set, Tuple,
+                    TYPE_CHECKING)
+
+if TYPE_CHECKING:
+    from semantic_cache import SemanticCache
 
 # Load environment variables from .env file
 load_dotenv()
@@ -10,108 +32,1652 @@ load_dotenv()
 class GeminiConfig:
     """Configuration class for Gemini API settings"""
     API_KEY = os.getenv("GEMINI_API_KEY")
-    MODEL_NAME = 'gemini-2.5-flash'
+    MODEL_NAME = os.getenv("JARVIS_MODEL", "gemini-2.5-flash")
     SAFETY_SETTINGS = [
         {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
         {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
         {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
         {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"}
     ]
+    GENERATION_CONFIG: Optional[Dict[str, Any]] = None
+
+# The Gemini SDK is slow to import, so it is loaded and configured on first use (see get_genai)
+_genai: Any = None
+_genai_lock = threading.Lock()
+
+def get_genai() -> Any:
+    """
+    Import and configure the Gemini SDK on first use.
+    
+    Returns:
+        module: The configured google.generativeai module
+    
+    Raises:
+        AuthenticationError: If GEMINI_API_KEY is not set
+    """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                # Validate API key
+                if not GeminiConfig.API_KEY:
+                    logger.error("No API key found. Please set GEMINI_API_KEY in .env file")
+                    raise AuthenticationError("Missing API key. Please set GEMINI_API_KEY in .env file")
+                with startup_profile.phase("import google.generativeai"):
+                    import google.generativeai as genai
+                # Configure the Gemini API client
+                with startup_profile.phase("configure Gemini client"):
+                    genai.configure(api_key=GeminiConfig.API_KEY)
+                _genai = genai
+    return _genai
+
+class SessionConfig:
+    """Configuration for conversation sessions held in memory"""
+    DEFAULT_SESSION_ID = "default"
+    MAX_SESSIONS = int(os.getenv("JARVIS_MAX_SESSIONS", "1000"))
+    SESSION_IDLE_TTL = float(os.getenv("JARVIS_SESSION_IDLE_TTL", "3600"))
+    MAX_SESSION_MEMORY = int(os.getenv("JARVIS_MAX_SESSION_MEMORY", str(64 * 1024 * 1024)))
+    HISTORY_TOKEN_BUDGET = int(os.getenv("JARVIS_HISTORY_TOKEN_BUDGET", "32000"))
+    SYSTEM_PREAMBLE = os.getenv("JARVIS_SYSTEM_PREAMBLE")
+
+class BackendConfig:
+    """Configuration for the model backend and failover between models"""
+    # gemini, local (the offline fake model), record or replay
+    BACKEND = os.getenv("JARVIS_BACKEND", "gemini")
+    FALLBACK_MODELS = [name.strip() for name in os.getenv("JARVIS_FALLBACK_MODELS", "").split(",") if name.strip()]
+    RECORDINGS_FILE = os.getenv("JARVIS_RECORDINGS_FILE", "recordings.jsonl")
+    FAILOVER_ERROR_RATE = float(os.getenv("JARVIS_FAILOVER_ERROR_RATE", "0.5"))
+    FAILOVER_LATENCY = float(os.getenv("JARVIS_FAILOVER_LATENCY", "10"))
+    FAILOVER_ATTEMPT_TIMEOUT = float(os.getenv("JARVIS_FAILOVER_ATTEMPT_TIMEOUT", "20"))
+    FAILOVER_PROBE_INTERVAL = float(os.getenv("JARVIS_FAILOVER_PROBE_INTERVAL", "30"))
+
+class RoutingConfig:
+    """
+    Configuration for adaptive routing between a fast and a deep set of models.
+    
+    Routing is on when JARVIS_FAST_MODELS is set. Short prompts in short
+    conversations go to the fast route (the fast models, then the main
+    model); everything else to the deep route (the main model, then
+    JARVIS_FALLBACK_MODELS). Start a message with "@fast " or "@deep " to
+    pick the route yourself.
+    """
+    FAST_MODELS = [name.strip() for name in os.getenv("JARVIS_FAST_MODELS", "").split(",") if name.strip()]
+    ENABLED = bool(FAST_MODELS)
+    FAST_MAX_PROMPT_TOKENS = int(os.getenv("JARVIS_FAST_MAX_PROMPT_TOKENS", "300"))
+    FAST_MAX_REQUEST_TOKENS = int(os.getenv("JARVIS_FAST_MAX_REQUEST_TOKENS", "4000"))
+    FAST_LATENCY_SLO = float(os.getenv("JARVIS_FAST_LATENCY_SLO", "3"))
+    DEEP_LATENCY_SLO = float(os.getenv("JARVIS_DEEP_LATENCY_SLO", str(BackendConfig.FAILOVER_LATENCY)))
+    LATENCY_WINDOW = int(os.getenv("JARVIS_ROUTE_LATENCY_WINDOW", "100"))
+    ROUTE_NAMES = ("fast", "deep")
+
+class ContextCacheConfig:
+    """Configuration for caching the stable start of long conversations upstream (cached contents)"""
+    ENABLED = os.getenv("JARVIS_CONTEXT_CACHE", "0") == "1"
+    # The API will not cache less than a model-specific minimum (1024-4096 tokens for 2.5 models)
+    MIN_TOKENS = int(os.getenv("JARVIS_CONTEXT_CACHE_MIN_TOKENS", "4096"))
+    TTL = float(os.getenv("JARVIS_CONTEXT_CACHE_TTL", "3600"))
+    MAX_ENTRIES = int(os.getenv("JARVIS_CONTEXT_CACHE_SIZE", "64"))
+
+class DocumentConfig:
+    """Configuration for documents attached to a conversation (/attach)"""
+    INDEX_DIR = os.getenv("JARVIS_DOCUMENT_INDEX_DIR", "document_index")
+    CHUNK_CHARS = int(os.getenv("JARVIS_DOCUMENT_CHUNK_CHARS", "1500"))
+    TOP_K = int(os.getenv("JARVIS_DOCUMENT_TOP_K", "4"))
+
+class StoreConfig:
+    """Configuration for the on-disk conversation store"""
+    DIRECTORY = os.getenv("JARVIS_CONVERSATION_DIR", "conversations")
+    RESUME_TURNS = int(os.getenv("JARVIS_RESUME_TURNS", "40"))
+    FSYNC = os.getenv("JARVIS_CONVERSATION_FSYNC", "0") == "1"
+    SEARCH_ENABLED = os.getenv("JARVIS_SEARCH_INDEX", "1") == "1"
+    SEARCH_DB = os.getenv("JARVIS_SEARCH_DB", os.path.join(DIRECTORY, "search.sqlite3"))
+
+class ResilienceConfig:
+    """Configuration for retries, deadlines and the circuit breaker around API calls"""
+    MAX_ATTEMPTS = int(os.getenv("JARVIS_MAX_ATTEMPTS", "3"))
+    RETRY_BASE_DELAY = float(os.getenv("JARVIS_RETRY_BASE_DELAY", "0.5"))
+    RETRY_MAX_DELAY = float(os.getenv("JARVIS_RETRY_MAX_DELAY", "8"))
+    REQUEST_DEADLINE = float(os.getenv("JARVIS_REQUEST_DEADLINE", "60"))
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv("JARVIS_BREAKER_THRESHOLD", "5"))
+    BREAKER_RESET_TIMEOUT = float(os.getenv("JARVIS_BREAKER_RESET", "30"))
+
+class RateLimitConfig:
+    """Client-side budgets for the shared API key (0 disables a budget)"""
+    REQUESTS_PER_MINUTE = float(os.getenv("JARVIS_REQUESTS_PER_MINUTE", "0"))
+    TOKENS_PER_MINUTE = float(os.getenv("JARVIS_TOKENS_PER_MINUTE", "0"))
 
-# Validate API key
-if not GeminiConfig.API_KEY:
-    logger.error("No API key found. Please set GEMINI_API_KEY in .env file")
-    raise ValueError("Missing API key. Please set GEMINI_API_KEY in .env file")
+class CacheConfig:
+    """Configuration for the response cache"""
+    # Off by default: a cached reply to the same question is returned again verbatim, with no way to regenerate it
+    ENABLED = os.getenv("JARVIS_RESPONSE_CACHE", "0") == "1"
+    MAX_ENTRIES = int(os.getenv("JARVIS_RESPONSE_CACHE_SIZE", "1024"))
+    TTL = float(os.getenv("JARVIS_RESPONSE_CACHE_TTL", "3600"))
+    DB_PATH = os.getenv("JARVIS_RESPONSE_CACHE_DB")
 
-# Configure the Gemini API client
-genai.configure(api_key=GeminiConfig.API_KEY)
+class SemanticCacheConfig:
+    """Configuration for the semantic (similar prompt) cache of first-turn replies"""
+    ENABLED = os.getenv("JARVIS_SEMANTIC_CACHE", "0") == "1"
+    THRESHOLD = float(os.getenv("JARVIS_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+    CAPACITY = int(os.getenv("JARVIS_SEMANTIC_CACHE_SIZE", "1024"))
+    DIRECTORY = os.getenv("JARVIS_SEMANTIC_CACHE_DIR")
+    EMBEDDING_MODEL = "models/text-embedding-004"
+
+class CompactionConfig:
+    """Configuration for summarizing old conversation turns"""
+    ENABLED = os.getenv("JARVIS_COMPACTION", "0") == "1"
+    THRESHOLD_TOKENS = int(os.getenv("JARVIS_COMPACTION_THRESHOLD", "24000"))
+    MESSAGES_TO_COMPACT = int(os.getenv("JARVIS_COMPACTION_MESSAGES", "10"))
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (about four characters per token)"""
+    return max(1, len(text) // 4)
 
 class ChatHistory:
-    """Class to manage chat history and message handling"""
-    def __init__(self, max_history_length: int = 20):
-        self.messages: List[Dict[str, Any]] = []
+    """
+    Class to manage chat history and message handling.
+    
+    The history is windowed by a token budget: each message's token count is
+    computed once when it is added, and the oldest user/model turns are
+    evicted from the front of a deque until the history fits the budget.
+    Pinned messages (e.g. a system preamble) always stay at the front of the
+    history and are never evicted.
+    """
+    # Share of the history's limits below which no turn is expected to be evicted soon (see stable_count)
+    STABLE_FILL = 0.75
+    
+    def __init__(self, max_history_length: Optional[int] = None,
+                 token_budget: int = SessionConfig.HISTORY_TOKEN_BUDGET,
+                 token_counter: Callable[[str], int] = estimate_tokens):
         self.max_history_length = max_history_length
+        self.token_budget = token_budget
+        self.token_counter = token_counter
+        self.pinned: List[Dict[str, Any]] = []
+        self._pinned_tokens = 0
+        self._turns: Deque[Dict[str, Any]] = deque()
+        self._turn_tokens: Deque[int] = deque()
+        self.token_count = 0
+        self.size_bytes = 0
+        # Input tokens each request saves because old turns were replaced by summaries
+        self.compaction_savings = 0
+        self._summary_savings: Dict[int, int] = {}
+        # Number of requests currently building on this history
+        self.pending_requests = 0
+        # Session id under which committed turns are appended to the conversation store
+        self.store_session_id: Optional[str] = None
+        # Documents whose relevant chunks are sent along with each request (never stored in the history)
+        self.attachments: List[AttachedDocument] = []
+        # Guards reads and commits of this history across threads
+        self.lock = threading.RLock()
+    
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        """The pinned messages followed by the conversation turns, oldest first"""
+        with self.lock:
+            return self.pinned + list(self._turns)
+    
+    def stable_count(self, token_limit: Optional[int] = None) -> int:
+        """
+        Number of leading messages that will stay at the front of the history for the next few turns.
+        
+        The pinned messages and a leading compaction summary always do. While the
+        history is well within its limits (the token budget, the turn limit and
+        token_limit, e.g. the compaction threshold), nothing is about to be
+        evicted from the front, so every committed turn counts as well.
+        
+        Args:
+            token_limit (Optional[int]): A lower token count at which the oldest turns are replaced
+        """
+        with self.lock:
+            limit = self.token_budget if token_limit is None else min(self.token_budget, token_limit)
+            filling = self.token_count > limit * self.STABLE_FILL or (
+                self.max_history_length is not None and
+                len(self._turns) > self.max_history_length * 2 * self.STABLE_FILL)
+            if not filling:
+                return len(self.pinned) + len(self._turns)
+            summarized = bool(self._turns) and id(self._turns[0]) in self._summary_savings
+            return len(self.pinned) + (2 if summarized else 0)
+    
+    @property
+    def turn_count(self) -> int:
+        """Number of conversation messages, not counting pinned ones"""
+        return len(self._turns)
+    
+    def pin_message(self, role: str, content: str) -> None:
+        """Add a message to the pinned section, which is never evicted"""
+        with self.lock:
+            self.pinned.append({"role": role, "parts": [content]})
+            tokens = self.token_counter(content)
+            self._pinned_tokens += tokens
+            self.token_count += tokens
+            self.size_bytes += len(content)
+    
+    def set_preamble(self, preamble: str) -> None:
+        """Pin a system preamble as an initial user/model exchange"""
+        self.pin_message("user", preamble)
+        self.pin_message("model", "Understood.")
     
     def add_message(self, role: str, content: str) -> None:
         """Add a message to the chat history"""
-        if len(self.messages) >= self.max_history_length * 2:
-            self.messages = self.messages[2:]
-            logger.info(f"Trimmed chat history to {len(self.messages)} messages")
+        with self.lock:
+            self._append(role, content)
+            # A model reply is kept together with the user message it answers
+            self._evict(keep=2 if role == "model" else 1)
+    
+    def add_turn(self, user_message: str, model_message: str) -> None:
+        """Commit a completed user/model exchange to the chat history"""
+        with self.lock:
+            self._append("user", user_message)
+            self._append("model", model_message)
+            self._evict(keep=2)
+    
+    def _append(self, role: str, content: str) -> None:
+        tokens = self.token_counter(content)
+        self._turns.append({"role": role, "parts": [content]})
+        self._turn_tokens.append(tokens)
+        self.token_count += tokens
+        self.size_bytes += len(content)
+    
+    def _pop_oldest(self) -> int:
+        """Drop the oldest turn; returns the compaction savings that went with it"""
+        message = self._turns.popleft()
+        self.token_count -= self._turn_tokens.popleft()
+        self.size_bytes -= len(message["parts"][0])
+        savings = self._summary_savings.pop(id(message), 0)
+        self.compaction_savings -= savings
+        return savings
+    
+    def oldest_turns(self, count: int) -> List[Dict[str, Any]]:
+        """Return up to `count` of the oldest turns, ending on a complete user/model exchange"""
+        with self.lock:
+            count = min(count, len(self._turns))
+            count -= count % 2
+            return [self._turns[i] for i in range(count)]
+    
+    def replace_oldest(self, turns: List[Dict[str, Any]], summary: str) -> int:
+        """
+        Replace the given oldest turns with a summary exchange.
+        
+        Nothing is changed if the history no longer starts with exactly these
+        turns (e.g. it was cleared or trimmed while the summary was generated),
+        or if the summary exchange would not be shorter than the turns.
         
-        self.messages.append({"role": role, "parts": [content]})
+        Returns:
+            int: Input tokens saved on every subsequent request (0 if nothing was replaced)
+        """
+        with self.lock:
+            if len(self._turns) < len(turns) or not all(self._turns[i] is turn for i, turn in enumerate(turns)):
+                return 0
+            
+            summary_message = {"role": "user", "parts": [f"Summary of our conversation so far: {summary}"]}
+            ack_message = {"role": "model", "parts": ["Understood."]}
+            summary_tokens = [self.token_counter(message["parts"][0]) for message in (ack_message, summary_message)]
+            removed_tokens = sum(self._turn_tokens[i] for i in range(len(turns)))
+            if removed_tokens - sum(summary_tokens) <= 0:
+                logger.info("Summary of %s messages is not shorter than they are; keeping them", len(turns))
+                return 0
+            
+            # Savings of earlier summaries being folded into this one carry over
+            saved = removed_tokens - sum(summary_tokens)
+            for _ in turns:
+                saved += self._pop_oldest()
+            
+            for message, tokens in zip((ack_message, summary_message), summary_tokens):
+                self._turns.appendleft(message)
+                self._turn_tokens.appendleft(tokens)
+                self.token_count += tokens
+                self.size_bytes += len(message["parts"][0])
+            
+            self._summary_savings[id(summary_message)] = saved
+            self.compaction_savings += saved
+            return saved
+    
+    def _evict(self, keep: int) -> None:
+        """Evict the oldest turns until the history fits, always keeping the newest `keep` messages"""
+        evicted = 0
+        while len(self._turns) > keep and (
+                self.token_count > self.token_budget or
+                (self.max_history_length is not None and len(self._turns) > self.max_history_length * 2)):
+            self._pop_oldest()
+            evicted += 1
+            # Evict whole exchanges so the conversation still starts with a user turn
+            if len(self._turns) > keep and self._turns[0]["role"] == "model":
+                self._pop_oldest()
+                evicted += 1
+        if evicted:
+            logger.info("Trimmed chat history to %s messages (%s tokens)", len(self._turns), self.token_count)
+    
+    def begin_request(self) -> None:
+        """Mark a request as in flight so the session is not evicted under it"""
+        with self.lock:
+            self.pending_requests += 1
+    
+    def end_request(self) -> None:
+        """Mark an in-flight request as finished"""
+        with self.lock:
+            self.pending_requests -= 1
     
     def remove_last_user_message(self) -> None:
         """Remove the last user message from history"""
-        if self.messages and self.messages[-1]["role"] == "user":
-            self.messages.pop()
+        with self.lock:
+            if self._turns and self._turns[-1]["role"] == "user":
+                message = self._turns.pop()
+                self.token_count -= self._turn_tokens.pop()
+                self.size_bytes -= len(message["parts"][0])
     
     def clear(self) -> None:
-        """Clear all messages from history"""
-        self.messages = []
+        """Clear all conversation turns from history; pinned messages are kept"""
+        with self.lock:
+            self._turns.clear()
+            self._turn_tokens.clear()
+            self.token_count = self._pinned_tokens
+            self.size_bytes = sum(len(message["parts"][0]) for message in self.pinned)
+            self.compaction_savings = 0
+            self._summary_savings.clear()
+            self.attachments = []
         logger.info("Chat history cleared")
 
-# Initialize chat history
-chat_history = ChatHistory()
+class SessionManager:
+    """
+    Hands out independent ChatHistory objects by session id.
+    
+    Sessions are kept in least-recently-used order. Sessions idle for longer
+    than idle_ttl are evicted, and the least recently used sessions are
+    evicted whenever the number of resident sessions or their approximate
+    memory use exceeds the configured caps. Sessions with a request in
+    flight are never evicted.
+    
+    Persistent sessions append every committed turn to the conversation
+    store; if one is evicted, its recent turns are reloaded from the store
+    the next time it is used.
+    """
+    def __init__(self, max_sessions: int = SessionConfig.MAX_SESSIONS,
+                 idle_ttl: float = SessionConfig.SESSION_IDLE_TTL,
+                 max_memory_bytes: int = SessionConfig.MAX_SESSION_MEMORY,
+                 token_budget: int = SessionConfig.HISTORY_TOKEN_BUDGET,
+                 preamble: Optional[str] = SessionConfig.SYSTEM_PREAMBLE,
+                 store: Optional[ConversationStore] = None,
+                 resume_turns: int = StoreConfig.RESUME_TURNS):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_memory_bytes = max_memory_bytes
+        self.token_budget = token_budget
+        self.preamble = preamble
+        self.store = store
+        self.resume_turns = resume_turns
+        self._sessions: "OrderedDict[str, ChatHistory]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._persistent: Set[str] = set()
+        self._lock = threading.Lock()
+        self.evictions = 0
+    
+    def get(self, session_id: str = SessionConfig.DEFAULT_SESSION_ID, begin_request: bool = False) -> ChatHistory:
+        """
+        Return the history for a session, creating it if needed.
+        
+        Args:
+            session_id (str): The session to look up
+            begin_request (bool): Mark a request as in flight on the history before the lock is released,
+                so the session cannot be evicted before the request commits (pair with end_request)
+        """
+        with self._lock:
+            history = self._sessions.get(session_id)
+            if history is None:
+                history = ChatHistory(token_budget=self.token_budget)
+                if self.preamble:
+                    history.set_preamble(self.preamble)
+                if session_id in self._persistent:
+                    self._restore(session_id, history)
+                self._sessions[session_id] = history
+            else:
+                self._sessions.move_to_end(session_id)
+            self._last_used[session_id] = time.monotonic()
+            if begin_request:
+                history.begin_request()
+            self._evict(keep=session_id)
+            return history
+    
+    def find(self, session_id: str) -> Optional[ChatHistory]:
+        """Return the history for a session that exists (resident or persistent), without creating one"""
+        with self._lock:
+            known = session_id in self._sessions or session_id in self._persistent
+        return self.get(session_id) if known else None
+    
+    def persist(self, session_id: str, resume: bool = False) -> int:
+        """
+        Append the session's future turns to the conversation store.
+        
+        Args:
+            session_id (str): The session to persist
+            resume (bool): Replace the resident history with the session's
+                most recent stored turns
+        
+        Returns:
+            int: Number of stored messages loaded into the history
+        """
+        if self.store is None:
+            raise RuntimeError("No conversation store configured")
+        with self._lock:
+            self._persistent.add(session_id)
+            history = self._sessions.get(session_id)
+            if history is not None and not resume:
+                history.store_session_id = session_id
+                return 0
+            self._sessions.pop(session_id, None)
+            self._last_used.pop(session_id, None)
+        history = self.get(session_id)
+        return history.turn_count
+    
+    def _restore(self, session_id: str, history: ChatHistory) -> None:
+        """Load the tail of a stored session into a new history. Caller must hold self._lock."""
+        history.store_session_id = session_id
+        turns = self.store.load_tail(session_id, self.resume_turns)
+        # Only whole user/model exchanges are restored; a window cut mid-exchange drops the stray half
+        user_message = None
+        for turn in turns:
+            if turn["role"] == "user":
+                user_message = turn["content"]
+            elif user_message is not None:
+                history.add_turn(user_message, turn["content"])
+                user_message = None
+        if turns:
+            logger.info("Restored %s message(s) of session %s from the store", history.turn_count, session_id)
+    
+    def remove(self, session_id: str) -> bool:
+        """Drop a session; returns True if it existed"""
+        with self._lock:
+            self._last_used.pop(session_id, None)
+            return self._sessions.pop(session_id, None) is not None
+    
+    def session_ids(self) -> List[str]:
+        """Return the resident session ids, least recently used first"""
+        with self._lock:
+            return list(self._sessions)
+    
+    def memory_usage(self) -> int:
+        """Approximate bytes of message text held by all resident sessions"""
+        with self._lock:
+            return sum(history.size_bytes for history in self._sessions.values())
+    
+    def evict_idle(self) -> int:
+        """Evict sessions that have been idle longer than the TTL; returns the count evicted"""
+        with self._lock:
+            return self._evict()
+    
+    def _evict(self, keep: Optional[str] = None) -> int:
+        """Apply the TTL, session-count and memory caps. Caller must hold self._lock."""
+        evicted = 0
+        now = time.monotonic()
+        memory = sum(history.size_bytes for history in self._sessions.values())
+        
+        for session_id in list(self._sessions):
+            history = self._sessions[session_id]
+            idle = now - self._last_used[session_id] > self.idle_ttl
+            over_cap = (len(self._sessions) > self.max_sessions or
+                        memory > self.max_memory_bytes)
+            if not idle and not over_cap:
+                # Sessions are in LRU order, so everything after this is in bounds too
+                break
+            if session_id == keep or not history.lock.acquire(blocking=False):
+                continue
+            try:
+                if history.pending_requests:
+                    continue
+                del self._sessions[session_id]
+                del self._last_used[session_id]
+            finally:
+                history.lock.release()
+            memory -= history.size_bytes
+            evicted += 1
+        
+        if evicted:
+            self.evictions += evicted
+            logger.info("Evicted %s chat session(s); %s resident", evicted, len(self._sessions))
+        return evicted
+
+# Durable, append-only record of persistent sessions
+conversation_store = ConversationStore(StoreConfig.DIRECTORY, fsync=StoreConfig.FSYNC)
+
+# Conversation sessions, each with its own chat history
+session_manager = SessionManager(store=conversation_store)
+
+def build_conversation_search() -> Optional[ConversationSearch]:
+    """Create the full-text index over saved conversations, if enabled and SQLite has FTS5"""
+    if not StoreConfig.SEARCH_ENABLED:
+        return None
+    if not FTS5_AVAILABLE:
+        logger.warning("SQLite was built without FTS5; conversation search disabled")
+        return None
+    search = ConversationSearch(conversation_store, StoreConfig.SEARCH_DB)
+    search.attach()
+    return search
+
+# Shared search index, kept up to date as turns are appended to the store
+conversation_search = build_conversation_search()
+
+def get_chat_history(session_id: str = SessionConfig.DEFAULT_SESSION_ID) -> ChatHistory:
+    """Return the chat history for a session"""
+    return session_manager.get(session_id)
+
+def begin_chat_request(session_id: str = SessionConfig.DEFAULT_SESSION_ID) -> ChatHistory:
+    """Return the chat history for a session with a request marked in flight on it (see ChatHistory.end_request)"""
+    return session_manager.get(session_id, begin_request=True)
+
+async def begin_chat_request_async(session_id: str = SessionConfig.DEFAULT_SESSION_ID) -> ChatHistory:
+    """Async version of begin_chat_request; a session restore from the store runs off the event loop"""
+    started = asyncio.ensure_future(asyncio.to_thread(begin_chat_request, session_id))
+    try:
+        return await asyncio.shield(started)
+    except asyncio.CancelledError:
+        # The lookup still finishes on its thread; release the request it marked
+        started.add_done_callback(lambda done: done.cancelled() or done.exception() or done.result().end_request())
+        raise
+
+async def commit_to_completion(fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a blocking commit on a worker thread and wait for it even if the awaiting task is cancelled.
+
+    The thread cannot be stopped once it has started, so a cancel that arrives
+    meanwhile is absorbed and the work reported as completed, rather than
+    claiming a request was stopped after its turn was written to the history.
+    """
+    commit = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+    while True:
+        try:
+            return await asyncio.shield(commit)
+        except asyncio.CancelledError:
+            if commit.cancelled():
+                raise
+            logger.info("Cancel arrived while the reply was being committed; finishing the commit")
+
+def find_chat_history(session_id: str) -> Optional[ChatHistory]:
+    """Return the chat history for a session, or None if there is no such session"""
+    return session_manager.find(session_id)
+
+class ModelRegistry:
+    """
+    Thread-safe registry of long-lived GenerativeModel instances.
+    
+    One model is built per (model name, safety settings, generation config)
+    combination and reused for the life of the process, so the per-request
+    hot path does not rebuild the client.
+    
+    The factory used to build models can be replaced (see set_factory), e.g.
+    to run against a local fake backend.
+    """
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        # None means genai.GenerativeModel, resolved when the first model is built
+        self._factory: Optional[Callable[..., Any]] = None
+        self._cache_provider: Any = None
+    
+    def set_factory(self, factory: Callable[..., Any]) -> None:
+        """
+        Replace the callable used to build models and drop any cached ones.
+        
+        Args:
+            factory (Callable): Called as factory(model_name, safety_settings=..., generation_config=...)
+        """
+        with self._lock:
+            self._factory = factory
+            self._models.clear()
+    
+    def set_cache_provider(self, provider: Any) -> None:
+        """
+        Replace the object used to create and use cached contents.
+        
+        Args:
+            provider: Has create(), extend(), delete() and model_for() like GeminiCacheProvider
+        """
+        with self._lock:
+            self._cache_provider = provider
+    
+    def cache_provider(self) -> Any:
+        """Return the cached-content provider, the Gemini SDK unless one was set"""
+        with self._lock:
+            if self._cache_provider is None:
+                self._cache_provider = GeminiCacheProvider(
+                    get_genai, GeminiConfig.SAFETY_SETTINGS, GeminiConfig.GENERATION_CONFIG)
+            return self._cache_provider
+    
+    @staticmethod
+    def _make_key(model_name: str, safety_settings: Any, generation_config: Any) -> str:
+        return json.dumps([model_name, safety_settings, generation_config], sort_keys=True, default=str)
+    
+    def get_model(self, model_name: Optional[str] = None,
+                  safety_settings: Optional[List[Dict[str, str]]] = None,
+                  generation_config: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Return the shared model for the given settings, building it on first use.
+        
+        Args:
+            model_name (Optional[str]): Model name, defaults to GeminiConfig.MODEL_NAME
+            safety_settings (Optional[List]): Defaults to GeminiConfig.SAFETY_SETTINGS
+            generation_config (Optional[Dict]): Defaults to GeminiConfig.GENERATION_CONFIG
+            
+        Returns:
+            genai.GenerativeModel: The cached model instance
+        """
+        model_name = model_name or GeminiConfig.MODEL_NAME
+        if safety_settings is None:
+            safety_settings = GeminiConfig.SAFETY_SETTINGS
+        if generation_config is None:
+            generation_config = GeminiConfig.GENERATION_CONFIG
+        key = self._make_key(model_name, safety_settings, generation_config)
+        
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                factory = self._factory or get_genai().GenerativeModel
+                model = factory(
+                    model_name,
+                    safety_settings=safety_settings,
+                    generation_config=generation_config
+                )
+                self._models[key] = model
+                logger.info("Created model client for %s", model_name)
+            return model
+    
+    def clear(self) -> None:
+        """Drop all cached models; they are rebuilt on next use"""
+        with self._lock:
+            self._models.clear()
+
+# Shared model registry
+model_registry = ModelRegistry()
+
+# Stable conversation prefixes cached upstream, shared by every model backend
+context_cache = ContextCache(
+    model_registry.cache_provider,
+    min_tokens=ContextCacheConfig.MIN_TOKENS,
+    ttl=ContextCacheConfig.TTL,
+    max_entries=ContextCacheConfig.MAX_ENTRIES,
+    token_counter=estimate_tokens
+) if ContextCacheConfig.ENABLED else None
+
+def warmup() -> None:
+    """
+    Import the SDK and build the default model ahead of the first request.
+    
+    Meant to run on a background thread once the UI is showing, so the first
+    message does not pay the SDK start-up cost.
+    
+    Raises:
+        AuthenticationError: If GEMINI_API_KEY is not set
+    """
+    with startup_profile.phase("warm up model client"):
+        model_backend.warmup()
+
+def build_router(model_names: List[str], max_latency: float) -> BackendRouter:
+    """Build a failover router over the named models"""
+    return BackendRouter(
+        [GeminiBackend(model_registry, name, context_cache) for name in model_names],
+        max_error_rate=BackendConfig.FAILOVER_ERROR_RATE,
+        max_latency=max_latency,
+        attempt_timeout=BackendConfig.FAILOVER_ATTEMPT_TIMEOUT,
+        probe_interval=BackendConfig.FAILOVER_PROBE_INTERVAL
+    )
+
+# Model requests counted by adaptive route
+route_requests = metrics_registry.counter("jarvis_route_requests_total", "Model requests by adaptive route and outcome")
+
+def build_adaptive_router() -> AdaptiveRouter:
+    """Build the fast/deep routes described in RoutingConfig"""
+    main_models = [GeminiConfig.MODEL_NAME] + BackendConfig.FALLBACK_MODELS
+    fast_models = RoutingConfig.FAST_MODELS + [name for name in [GeminiConfig.MODEL_NAME]
+                                               if name not in RoutingConfig.FAST_MODELS]
+    return AdaptiveRouter([
+        Route("fast", build_router(fast_models, RoutingConfig.FAST_LATENCY_SLO),
+              max_prompt_tokens=RoutingConfig.FAST_MAX_PROMPT_TOKENS,
+              max_request_tokens=RoutingConfig.FAST_MAX_REQUEST_TOKENS,
+              window=RoutingConfig.LATENCY_WINDOW),
+        Route("deep", build_router(main_models, RoutingConfig.DEEP_LATENCY_SLO), window=RoutingConfig.LATENCY_WINDOW)
+    ], observer=lambda route, failed: route_requests.inc(route=route, outcome="error" if failed else "success"))
+
+def build_model_backend() -> ModelBackend:
+    """
+    Build the backend requests are sent to, as selected by JARVIS_BACKEND.
+    
+    The configured model and any JARVIS_FALLBACK_MODELS sit behind a router
+    that fails over between them; with JARVIS_FAST_MODELS set, an adaptive
+    router first picks a fast or deep route for each request (see
+    RoutingConfig). "record" answers from the recordings file and records
+    whatever it has not seen; "replay" answers only from the recordings;
+    "local" routes to the offline fake model.
+    """
+    if BackendConfig.BACKEND == "replay":
+        return ReplayBackend(BackendConfig.RECORDINGS_FILE)
+    if BackendConfig.BACKEND == "local":
+        from fake_backend import install_fake_backend
+        install_fake_backend(model_registry)
+    elif BackendConfig.BACKEND not in ("gemini", "record"):
+        logger.warning("Unknown JARVIS_BACKEND %r; using gemini", BackendConfig.BACKEND)
+    
+    if RoutingConfig.ENABLED:
+        backend_router: ModelBackend = build_adaptive_router()
+    else:
+        backend_router = build_router([GeminiConfig.MODEL_NAME] + BackendConfig.FALLBACK_MODELS,
+                                      BackendConfig.FAILOVER_LATENCY)
+    if BackendConfig.BACKEND == "record":
+        return ReplayBackend(BackendConfig.RECORDINGS_FILE, inner=backend_router)
+    return backend_router
+
+# Shared backend every model call goes through
+model_backend = build_model_backend()
+
+def backend_stats() -> Dict[str, Any]:
+    """Return the failover (and route) counters of the backend, or {} when requests are only replayed"""
+    router = model_backend.inner if isinstance(model_backend, ReplayBackend) else model_backend
+    return router.stats() if isinstance(router, (BackendRouter, AdaptiveRouter)) else {}
+
+ROUTE_HINT_PATTERN = re.compile(r"@(\w+)\s+")
+
+def parse_route_hint(user_message: str) -> Tuple[Optional[str], str]:
+    """
+    Split an explicit route hint ("@fast ..." or "@deep ...") off the start of a message.
+    
+    Returns:
+        Tuple[Optional[str], str]: The route name (None without a hint, or when routing is off) and the message
+    """
+    if not RoutingConfig.ENABLED:
+        return None, user_message
+    match = ROUTE_HINT_PATTERN.match(user_message)
+    if match is None or match.group(1).lower() not in RoutingConfig.ROUTE_NAMES:
+        return None, user_message
+    return match.group(1).lower(), user_message[match.end():]
+
+# Shared retry/circuit breaker wrapper for model calls
+resilient_caller = ResilientCaller(
+    RetryPolicy(ResilienceConfig.MAX_ATTEMPTS, ResilienceConfig.RETRY_BASE_DELAY, ResilienceConfig.RETRY_MAX_DELAY),
+    CircuitBreaker(ResilienceConfig.BREAKER_FAILURE_THRESHOLD, ResilienceConfig.BREAKER_RESET_TIMEOUT),
+    ResilienceConfig.REQUEST_DEADLINE
+)
+
+# Shared rate limiter / priority queue for model calls
+request_scheduler = RequestScheduler(RateLimitConfig.REQUESTS_PER_MINUTE, RateLimitConfig.TOKENS_PER_MINUTE)
+
+def scheduler_budget(tokens: int, priority: int):
+    """
+    Charge every upstream attempt made in this block (retries and failovers too) to the rate limiter.
+    
+    The request deadline is paused while an attempt waits in the queue, so work
+    beyond the budget waits its turn instead of timing out (and tripping the
+    circuit breaker) before it is sent.
+    """
+    def acquire() -> None:
+        with deadline_paused():
+            request_scheduler.acquire(tokens, priority)
+    
+    async def acquire_async() -> None:
+        with deadline_paused():
+            await request_scheduler.acquire_async(tokens, priority)
+    
+    return attempt_budget(acquire, acquire_async)
+
+def estimate_request_tokens(history: ChatHistory, user_message: str) -> int:
+    """Estimate the input tokens of a request from the history's cached counts"""
+    return history.token_count + history.token_counter(user_message)
+
+def summarize_turns(turns: List[Dict[str, Any]]) -> str:
+    """
+    Ask the model for a concise summary of a run of conversation turns.
+    
+    The call is retried, bounded by the request deadline and rate limited
+    (at batch priority) like any other, so a hung upstream cannot block the
+    compactor's worker.
+    """
+    transcript = "\n".join(f"{turn['role']}: {turn['parts'][0]}" for turn in turns)
+    prompt = ("Summarize the following conversation so it can replace the original turns as context "
+              "for the rest of the conversation. Keep facts, decisions, names and open questions; "
+              "be concise.\n\n" + transcript)
+    with scheduler_budget(estimate_tokens(prompt), Priority.BATCH):
+        return resilient_caller.call(lambda timeout: model_backend.generate(prompt, timeout))
+
+class HistoryCompactor:
+    """
+    Replaces the oldest turns of a long conversation with a model-written summary.
+    
+    Once a history's token count crosses the threshold, its oldest turns are
+    summarized on a background thread so the current request is not delayed;
+    the summary is swapped in when it is ready. The input tokens this saves
+    on each later request are recorded in the stats.
+    """
+    def __init__(self, enabled: bool = CompactionConfig.ENABLED,
+                 threshold_tokens: int = CompactionConfig.THRESHOLD_TOKENS,
+                 messages_to_compact: int = CompactionConfig.MESSAGES_TO_COMPACT,
+                 summarize: Callable[[List[Dict[str, Any]]], str] = summarize_turns):
+        self.enabled = enabled
+        self.threshold_tokens = threshold_tokens
+        self.messages_to_compact = messages_to_compact
+        self.summarize = summarize
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="jarvis-compactor")
+        self._in_progress: set = set()
+        # The oldest turn of histories whose summary came out no shorter; not retried until that turn changes
+        self._unshrinkable: "weakref.WeakKeyDictionary[ChatHistory, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.compactions = 0
+        self.requests = 0
+        self.tokens_saved_total = 0
+        self.last_request_tokens_saved = 0
+    
+    @property
+    def token_limit(self) -> Optional[int]:
+        """Token count at which histories get compacted, or None when compaction is off"""
+        return self.threshold_tokens if self.enabled else None
+    
+    def record_request(self, history: ChatHistory) -> None:
+        """Record the input tokens a request saves thanks to earlier compactions"""
+        saved = history.compaction_savings
+        with self._lock:
+            self.requests += 1
+            self.tokens_saved_total += saved
+            self.last_request_tokens_saved = saved
+        if saved:
+            logger.debug("Compaction saved %s input tokens on this request", saved)
+    
+    def maybe_compact(self, history: ChatHistory) -> Optional["concurrent.futures.Future[int]"]:
+        """Start a background compaction if the history has crossed the threshold"""
+        if not self.enabled or history.token_count < self.threshold_tokens:
+            return None
+        turns = history.oldest_turns(self.messages_to_compact)
+        if len(turns) < 2:
+            return None
+        with self._lock:
+            if id(history) in self._in_progress or self._unshrinkable.get(history) is turns[0]:
+                return None
+            self._in_progress.add(id(history))
+        return self._executor.submit(self._compact, history, turns)
+    
+    def _compact(self, history: ChatHistory, turns: List[Dict[str, Any]]) -> int:
+        try:
+            summary = self.summarize(turns)
+            saved = history.replace_oldest(turns, summary)
+            if saved:
+                with self._lock:
+                    self.compactions += 1
+                    self._unshrinkable.pop(history, None)
+                logger.info("Compacted %s messages into a summary, saving %s tokens per request", len(turns), saved)
+            else:
+                with self._lock:
+                    self._unshrinkable[history] = turns[0]
+            return saved
+        except Exception as e:
+            ErrorHandler.log_error(e, "Error compacting chat history")
+            return 0
+        finally:
+            with self._lock:
+                self._in_progress.discard(id(history))
+    
+    def stats(self) -> Dict[str, int]:
+        """Return compaction counters"""
+        with self._lock:
+            return {
+                "compactions": self.compactions,
+                "requests": self.requests,
+                "tokens_saved_total": self.tokens_saved_total,
+                "last_request_tokens_saved": self.last_request_tokens_saved
+            }
+
+# Shared history compactor (disabled unless JARVIS_COMPACTION=1)
+history_compactor = HistoryCompactor()
+
+def commit_turn(history: ChatHistory, user_message: str, model_message: str) -> None:
+    """
+    Commit a completed exchange, append it to the conversation store if the
+    session is persistent, and schedule compaction if the history has grown too long.
+    """
+    history.add_turn(user_message, model_message)
+    if history.store_session_id is not None:
+        try:
+            conversation_store.append_turn(history.store_session_id, "user", user_message)
+            conversation_store.append_turn(history.store_session_id, "model", model_message)
+        except OSError as e:
+            ErrorHandler.log_error(e, "Error appending turn to the conversation store")
+    history_compactor.maybe_compact(history)
+
+# Shared response cache (memory tier, plus SQLite when JARVIS_RESPONSE_CACHE_DB is set)
+response_cache = ResponseCache(CacheConfig.MAX_ENTRIES, CacheConfig.TTL, CacheConfig.DB_PATH)
+
+# Placeholder replies produced when a response carried no usable text; never cached
+PLACEHOLDER_RESPONSES = ("No response from Gemini.", "Error processing AI response.")
+
+def is_cacheable(response_text: str) -> bool:
+    """Return True if a reply may be stored in the response cache"""
+    return response_text not in PLACEHOLDER_RESPONSES
+
+def response_cache_key(contents: List[Dict[str, Any]], route: Optional[str] = None) -> Optional[str]:
+    """Return the response cache key for a request, or None if caching is disabled"""
+    if not CacheConfig.ENABLED:
+        return None
+    # Replies asked for on an explicit route are kept apart from the automatically routed ones
+    model = GeminiConfig.MODEL_NAME if route is None else f"{GeminiConfig.MODEL_NAME}@{route}"
+    return ResponseCache.make_key(model, GeminiConfig.SAFETY_SETTINGS, GeminiConfig.GENERATION_CONFIG, contents)
+
+def gemini_embedder(model: str = SemanticCacheConfig.EMBEDDING_MODEL) -> Callable[[str], List[float]]:
+    """Return an embedding function backed by the Gemini embedding API"""
+    def embed(text: str) -> List[float]:
+        return get_genai().embed_content(model=model, content=text, task_type="semantic_similarity")["embedding"]
+    return embed
+
+def build_semantic_cache() -> Optional["SemanticCache"]:
+    """Create the semantic cache if it is enabled and numpy is installed"""
+    if not SemanticCacheConfig.ENABLED:
+        return None
+    # Imported here so numpy is only loaded when the semantic cache is used
+    from semantic_cache import NUMPY_AVAILABLE, SemanticCache
+    if not NUMPY_AVAILABLE:
+        logger.warning("JARVIS_SEMANTIC_CACHE is set but numpy is not installed; semantic cache disabled")
+        return None
+    return SemanticCache(gemini_embedder(), SemanticCacheConfig.CAPACITY,
+                         SemanticCacheConfig.THRESHOLD, SemanticCacheConfig.DIRECTORY)
+
+# Shared semantic cache (None unless JARVIS_SEMANTIC_CACHE=1)
+semantic_cache = build_semantic_cache()
+
+def semantic_lookup(first_turn: bool, user_message: str) -> Optional[str]:
+    """Return a cached reply to a similar first-turn prompt, if any"""
+    if semantic_cache is None or not first_turn:
+        return None
+    try:
+        return semantic_cache.lookup(user_message)
+    except Exception as e:
+        ErrorHandler.log_error(e, "Semantic cache lookup failed")
+        return None
+
+def semantic_store(first_turn: bool, user_message: str, response_text: str) -> None:
+    """Remember a first-turn reply in the semantic cache"""
+    if semantic_cache is None or not first_turn or not is_cacheable(response_text):
+        return
+    try:
+        semantic_cache.put(user_message, response_text)
+    except Exception as e:
+        ErrorHandler.log_error(e, "Semantic cache update failed")
+
+class RequestMetrics:
+    """Per-request latency, token, history and cache measurements"""
+    def __init__(self, registry: MetricsRegistry):
+        self.requests = registry.counter("jarvis_requests_total", "Chat requests by outcome")
+        self.errors = registry.counter("jarvis_request_errors_total", "Failed chat requests by error type")
+        self.duration = registry.histogram("jarvis_request_duration_seconds", "Wall time of chat requests")
+        self.time_to_first_token = registry.histogram("jarvis_time_to_first_token_seconds",
+                                                      "Time until the first streamed text arrived")
+        self.input_tokens = registry.histogram("jarvis_request_input_tokens",
+                                               "Estimated input tokens per request", SIZE_BUCKETS)
+        self.output_tokens = registry.histogram("jarvis_request_output_tokens",
+                                                "Estimated output tokens per request", SIZE_BUCKETS)
+        self.history_messages = registry.histogram("jarvis_history_messages",
+                                                   "History messages sent with each request", SIZE_BUCKETS)
+    
+    def record_success(self, started: float, cache_hit: bool, contents: List[Dict[str, Any]],
+                       input_tokens: int, response_text: str,
+                       time_to_first_token: Optional[float] = None) -> None:
+        """Record a completed request and log it with its latency as a structured field"""
+        elapsed = time.perf_counter() - started
+        self.requests.inc(outcome="cache_hit" if cache_hit else "success")
+        self.duration.observe(elapsed)
+        if time_to_first_token is not None:
+            self.time_to_first_token.observe(time_to_first_token)
+        self.input_tokens.observe(input_tokens)
+        self.output_tokens.observe(estimate_tokens(response_text))
+        self.history_messages.observe(len(contents) - 1)
+        latency_ms = round(elapsed * 1000, 1)
+        logger.info("Request completed in %.1f ms (cache hit: %s)", latency_ms, cache_hit,
+                    extra={"latency_ms": latency_ms})
+    
+    def record_error(self, error: Exception) -> None:
+        """Record a failed request by its classified error type"""
+        self.requests.inc(outcome="error")
+        self.errors.inc(type=type(classify_error(error)).__name__)
+    
+    def record_cancelled(self) -> None:
+        """Record a request stopped by the caller before it completed"""
+        self.requests.inc(outcome="cancelled")
+
+# Shared request instrumentation
+request_metrics = RequestMetrics(metrics_registry)
+
+def collect_component_stats() -> List[Any]:
+    """Expose the counters kept by the retry wrapper, backends, caches, scheduler and sessions as metrics"""
+    caller = resilient_caller.stats()
+    cache = response_cache.stats()
+    samples = [
+        ("jarvis_retries_total", "counter", "API call retries", caller["retries"]),
+        ("jarvis_circuit_rejections_total", "counter", "Calls rejected by the open circuit breaker",
+         caller["rejected"]),
+        ("jarvis_circuit_breaker_open", "gauge", "1 while the circuit breaker is open",
+         int(caller["breaker_state"] == CircuitBreaker.OPEN)),
+        ("jarvis_response_cache_hits_total", "counter", "Response cache hits", cache["hits"]),
+        ("jarvis_response_cache_misses_total", "counter", "Response cache misses", cache["misses"]),
+        ("jarvis_response_cache_entries", "gauge", "Entries in the in-memory response cache", cache["entries"]),
+        ("jarvis_scheduler_queue_depth", "gauge", "Requests waiting for rate limit budget",
+         request_scheduler.queue_depth()),
+        ("jarvis_sessions", "gauge", "Resident chat sessions", len(session_manager.session_ids())),
+        ("jarvis_session_memory_bytes", "gauge", "Approximate bytes held by chat sessions",
+         session_manager.memory_usage()),
+        ("jarvis_compactions_total", "counter", "History compactions", history_compactor.stats()["compactions"])
+    ]
+    backends = backend_stats()
+    if backends:
+        samples.append(("jarvis_backend_failovers_total", "counter", "Requests moved to a fallback model",
+                        backends["failovers"]))
+        samples.append(("jarvis_backends_degraded", "gauge", "Models currently skipped for errors or latency",
+                        sum(backend["degraded"] for backend in backends["backends"])))
+    if context_cache is not None:
+        cached = context_cache.stats()
+        samples.append(("jarvis_context_cache_hits_total", "counter", "Requests sent with a cached prefix",
+                        cached["hits"]))
+        samples.append(("jarvis_context_cache_fallbacks_total", "counter",
+                        "Cached prefixes found expired and resent in full", cached["fallbacks"]))
+        samples.append(("jarvis_context_cache_extend_failures_total", "counter",
+                        "Cached prefixes dropped because their expiry could not be extended",
+                        cached["extend_failures"]))
+        samples.append(("jarvis_context_cache_tokens_saved_total", "counter",
+                        "Estimated input tokens not resent thanks to cached prefixes", cached["tokens_saved"]))
+    if semantic_cache is not None:
+        samples.append(("jarvis_semantic_cache_hits_total", "counter", "Semantic cache hits",
+                        semantic_cache.stats()["hits"]))
+    return samples
+
+metrics_registry.register_collector(collect_component_stats)
+
+# Shared index of attached documents
+document_library = DocumentLibrary(DocumentConfig.INDEX_DIR, DocumentConfig.CHUNK_CHARS)
+
+def with_document_context(history: ChatHistory, user_message: str) -> str:
+    """
+    Return the prompt to send for a user message: the message itself, preceded by
+    the chunks of the conversation's attached documents that best match it.
+    """
+    with history.lock:
+        documents = list(history.attachments)
+    if not documents:
+        return user_message
+    try:
+        excerpts = document_library.search(documents, user_message, DocumentConfig.TOP_K)
+    except Exception as e:
+        ErrorHandler.log_error(e, "Error searching attached documents")
+        return user_message
+    if not excerpts:
+        return user_message
+    blocks = [f"[{document.name}, lines {first_line}-{last_line}]\n{text.rstrip()}"
+              for document, (first_line, last_line, text) in excerpts]
+    return ("Excerpts from the attached documents (use them if they are relevant):\n\n"
+            + "\n\n".join(blocks) + f"\n\nQuestion: {user_message}")
+
+def build_request(history: ChatHistory, user_message: str) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Build the request contents: a snapshot of the committed history plus the new user turn.
+    
+    Returns:
+        Tuple[List[Dict[str, Any]], int]: The contents and how many leading messages are stable (see stable_prefix)
+    """
+    with history.lock:
+        history_compactor.record_request(history)
+        return (history.messages + [{"role": "user", "parts": [user_message]}],
+                history.stable_count(history_compactor.token_limit))
 
-def chat_with_gemini(user_message: str) -> str:
+def chat_with_gemini(user_message: str, session_id: str = SessionConfig.DEFAULT_SESSION_ID,
+                     priority: int = Priority.INTERACTIVE, raise_errors: bool = False) -> str:
     """
     Sends a user message to the Gemini model and returns the model's response.
     Maintains a chat history with a maximum length to prevent token limit issues.
+    The exchange is only committed to the history once the model has answered.
+    
+    Runs chat_with_gemini_async on the shared background event loop and waits
+    for it, so there is a single implementation of the request flow.
     
     Args:
         user_message (str): The user's input message
+        session_id (str): The conversation to continue
+        priority (int): Scheduling priority when rate limits apply (Priority.INTERACTIVE or Priority.BATCH)
+        raise_errors (bool): Raise API errors as GeminiError instead of returning a user-friendly message
         
     Returns:
         str: The AI model's response text
     """
-    # Add user message to chat history
-    chat_history.add_message("user", user_message)
+    return get_background_loop().run(chat_with_gemini_async(user_message, session_id, priority, raise_errors))
+
+class _ChatStreamBase:
+    """Bookkeeping shared by the sync and async response streams"""
+    def __init__(self, user_message: str, session_id: str, priority: int):
+        self.route_hint, self.user_message = parse_route_hint(user_message)
+        self.session_id = session_id
+        self.priority = priority
+        self.history: Optional[ChatHistory] = None
+        self.request_id = new_request_id()
+        self.text = ""
+        self.error_message: Optional[str] = None
+        self.time_to_first_token: Optional[float] = None
+        self.total_time: Optional[float] = None
+        self.cache_hit = False
+        self._parts: List[str] = []
+        self._contents: List[Dict[str, Any]] = []
+        self._stable_count = 0
+        self._cache_key: Optional[str] = None
+        self._first_turn = False
+        self._request_tokens = 0
+        self._started = 0.0
+        self._committed = False
     
-    try:
-        # Initialize the model with safety settings
-        model = genai.GenerativeModel(
-            GeminiConfig.MODEL_NAME,
-            safety_settings=GeminiConfig.SAFETY_SETTINGS
-        )
+    def _log_context(self) -> Any:
+        """Tag records logged while the stream is advanced with this request's ids"""
+        return log_context(session_id=self.session_id, request_id=self.request_id)
+    
+    def _start(self, history: ChatHistory) -> None:
+        """Take over a history returned by begin_chat_request"""
+        self._started = time.perf_counter()
+        self.history = history
+    
+    def _accept_chunk(self, text: str) -> None:
+        """Record a streamed chunk of text"""
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self._started
+            logger.debug("Time to first token: %.3fs", self.time_to_first_token)
+        self._parts.append(text)
+    
+    def _fallback_text(self) -> Optional[str]:
+        """Return placeholder text if the stream finished without producing any"""
+        if self._parts:
+            return None
+        logger.warning("Streamed response contained no text")
+        self._parts.append("No response from Gemini.")
+        return self._parts[0]
+    
+    def _prepare(self) -> Optional[str]:
+        """Build the request contents; returns the cached reply if there is one"""
+        prompt = with_document_context(self.history, self.user_message)
+        self._first_turn = self.history.turn_count == 0 and prompt == self.user_message and self.route_hint is None
+        self._request_tokens = estimate_request_tokens(self.history, prompt)
+        self._contents, self._stable_count = build_request(self.history, prompt)
+        self._cache_key = response_cache_key(self._contents, self.route_hint)
+        cached = None
+        if self._cache_key is not None:
+            cached = response_cache.get(self._cache_key)
+        if cached is None:
+            cached = semantic_lookup(self._first_turn, self.user_message)
+        if cached is not None:
+            self.cache_hit = True
+            self.time_to_first_token = time.perf_counter() - self._started
+            self._parts.append(cached)
+        return cached
+    
+    def _commit(self) -> None:
+        self.text = "".join(self._parts)
+        if not self.cache_hit:
+            if self._cache_key is not None and is_cacheable(self.text):
+                response_cache.put(self._cache_key, self.text)
+            semantic_store(self._first_turn, self.user_message, self.text)
+        commit_turn(self.history, self.user_message, self.text)
+        self._committed = True
+    
+    def _fail(self, error: Exception) -> None:
+        request_metrics.record_error(error)
+        self.error_message = ErrorHandler.handle_api_error(error)
+    
+    def _finish(self) -> None:
+        self.history.end_request()
+        self.total_time = time.perf_counter() - self._started
+        if self._committed:
+            request_metrics.record_success(self._started, self.cache_hit, self._contents, self._request_tokens,
+                                           self.text, self.time_to_first_token)
+        elif self.error_message is None:
+            request_metrics.record_cancelled()
+            logger.info("Response stream abandoned before completion; chat history left unchanged")
+
+class ChatStream(_ChatStreamBase):
+    """
+    Iterator over the text chunks of a streamed Gemini response.
+    
+    The assembled reply is committed to the chat history only once the stream
+    has been fully consumed. If the request fails mid-stream, or the caller
+    stops iterating early, nothing is committed and the history is unchanged.
+    
+    Attributes:
+        text (str): The assembled reply, set once the stream completes
+        error_message (Optional[str]): User-friendly error text if the request failed
+        time_to_first_token (Optional[float]): Seconds until the first text chunk arrived
+        total_time (Optional[float]): Seconds until the stream finished
+        cache_hit (bool): Whether the reply was served from the response cache
+    """
+    def __init__(self, user_message: str, session_id: str = SessionConfig.DEFAULT_SESSION_ID,
+                 priority: int = Priority.INTERACTIVE):
+        super().__init__(user_message, session_id, priority)
+        self._chunks = self._stream()
+    
+    def __iter__(self) -> Iterator[str]:
+        return self
+    
+    def __next__(self) -> str:
+        with self._log_context():
+            return next(self._chunks)
+    
+    def close(self) -> None:
+        """Stop the stream early without committing anything to the history"""
+        with self._log_context():
+            self._chunks.close()
+    
+    def _stream(self) -> Iterator[str]:
+        self._start(begin_chat_request(self.session_id))
+        try:
+            cached = self._prepare()
+            if cached is not None:
+                yield cached
+            else:
+                # Only opening the stream is retried; a stream cannot be resumed part-way
+                with route_hint(self.route_hint), stable_prefix(self._stable_count), \
+                        scheduler_budget(self._request_tokens, self.priority):
+                    chunks = resilient_caller.call(lambda timeout: model_backend.stream(self._contents, timeout))
+                
+                try:
+                    for text in chunks:
+                        self._accept_chunk(text)
+                        yield text
+                except Exception as e:
+                    resilient_caller.record_failure(e)
+                    raise
+            
+            fallback = self._fallback_text()
+            if fallback:
+                yield fallback
+            self._commit()
+
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._finish()
+
+class AsyncChatStream(_ChatStreamBase):
+    """
+    Async iterator over the text chunks of a streamed Gemini response.
+    
+    Same semantics as ChatStream, driven by the SDK's async generation call
+    so many conversations can stream concurrently on one event loop.
+    """
+    def __init__(self, user_message: str, session_id: str = SessionConfig.DEFAULT_SESSION_ID,
+                 priority: int = Priority.INTERACTIVE):
+        super().__init__(user_message, session_id, priority)
+        self._chunks = self._stream()
+    
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self
+    
+    async def __anext__(self) -> str:
+        with self._log_context():
+            return await self._chunks.__anext__()
+    
+    async def aclose(self) -> None:
+        """Stop the stream early without committing anything to the history"""
+        with self._log_context():
+            await self._chunks.aclose()
+    
+    async def _stream(self) -> AsyncIterator[str]:
+        # Restoring a session, cache lookups (which may call the embedding API) and
+        # committing the turn all block, so keep them off the event loop
+        self._start(await begin_chat_request_async(self.session_id))
+        try:
+            cached = await asyncio.to_thread(self._prepare)
+            if cached is not None:
+                yield cached
+            else:
+                with route_hint(self.route_hint), stable_prefix(self._stable_count), \
+                        scheduler_budget(self._request_tokens, self.priority):
+                    chunks = await resilient_caller.call_async(
+                        lambda timeout: model_backend.stream_async(self._contents, timeout)
+                    )
+                
+                try:
+                    async for text in chunks:
+                        self._accept_chunk(text)
+                        yield text
+                except Exception as e:
+                    resilient_caller.record_failure(e)
+                    raise
+            
+            fallback = self._fallback_text()
+            if fallback:
+                yield fallback
+            # Past this point the reply is complete; a late cancel no longer stops it
+            await commit_to_completion(self._commit)
+
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._finish()
+
+def chat_with_gemini_stream(user_message: str, session_id: str = SessionConfig.DEFAULT_SESSION_ID,
+                            priority: int = Priority.INTERACTIVE) -> ChatStream:
+    """
+    Sends a user message to the Gemini model and streams the response.
+    
+    Args:
+        user_message (str): The user's input message
+        session_id (str): The conversation to continue
+        priority (int): Scheduling priority when rate limits apply (Priority.INTERACTIVE or Priority.BATCH)
         
-        # Generate content with the model
-        response = model.generate_content(chat_history.messages)
+    Returns:
+        ChatStream: Iterator yielding the response text chunks as they arrive
+    """
+    return ChatStream(user_message, session_id, priority)
 
-        # Extract and validate response text
-        model_response_text = extract_response_text(response)
+async def chat_with_gemini_async(user_message: str, session_id: str = SessionConfig.DEFAULT_SESSION_ID,
+                                  priority: int = Priority.INTERACTIVE, raise_errors: bool = False) -> str:
+    """
+    Async version of chat_with_gemini using the SDK's async generation call.
+    
+    Args:
+        user_message (str): The user's input message
+        session_id (str): The conversation to continue
+        priority (int): Scheduling priority when rate limits apply (Priority.INTERACTIVE or Priority.BATCH)
+        raise_errors (bool): Raise API errors as GeminiError instead of returning a user-friendly message
         
-        # Add the model's response to chat history
-        chat_history.add_message("model", model_response_text)
-        return model_response_text
+    Returns:
+        str: The AI model's response text
+    """
+    hint, user_message = parse_route_hint(user_message)
+    # Restoring a session, searching documents and committing a turn touch the disk, so run them off the loop
+    history = await begin_chat_request_async(session_id)
+    with log_context(session_id=session_id, request_id=new_request_id()):
+        started = time.perf_counter()
+        try:
+            prompt = await asyncio.to_thread(with_document_context, history, user_message)
+            # Replies grounded in attached documents or asked for on a given route skip the semantic cache
+            first_turn = history.turn_count == 0 and prompt == user_message and hint is None
+            request_tokens = estimate_request_tokens(history, prompt)
+            contents, stable_count = build_request(history, prompt)
+            
+            semantic_hit = False
+            
+            async def generate() -> str:
+                nonlocal semantic_hit
+                similar = await asyncio.to_thread(semantic_lookup, first_turn, user_message)
+                if similar is not None:
+                    semantic_hit = True
+                    return similar
+                # Each attempt waits for rate limit budget, then generates content and extracts the response text
+                with route_hint(hint), stable_prefix(stable_count), scheduler_budget(request_tokens, priority):
+                    text = await resilient_caller.call_async(
+                        lambda timeout: model_backend.generate_async(contents, timeout)
+                    )
+                await asyncio.to_thread(semantic_store, first_turn, user_message, text)
+                return text
+            
+            key = response_cache_key(contents, hint)
+            if key is None:
+                model_response_text, cache_hit = await generate(), False
+            else:
+                model_response_text, cache_hit = await response_cache.get_or_compute_async(key, generate, is_cacheable)
+            # A semantic hit counts as a cache hit, as it does for streams
+            cache_hit = cache_hit or semantic_hit
+            
+            # Add the exchange to chat history
+            await commit_to_completion(commit_turn, history, user_message, model_response_text)
+            request_metrics.record_success(started, cache_hit, contents, request_tokens, model_response_text)
+            return model_response_text
 
-    except Exception as e:
-        error_message = ErrorHandler.handle_api_error(e)
-        chat_history.remove_last_user_message()
-        return error_message
+        except Exception as e:
+            request_metrics.record_error(e)
+            if raise_errors:
+                classified = classify_error(e)
+                if classified is e:
+                    raise
+                raise classified from e
+            return ErrorHandler.handle_api_error(e)
+        finally:
+            history.end_request()
 
-def extract_response_text(response: Any) -> str:
-    """Extract text from Gemini API response"""
-    try:
-        if (response.candidates and 
-            len(response.candidates) > 0 and 
-            response.candidates[0].content and 
-            len(response.candidates[0].content.parts) > 0):
-            return response.candidates[0].content.parts[0].text
-        else:
-            logger.warning(f"Unexpected response structure: {response}")
-            return "No response from Gemini."    
-    except Exception as e:
-        logger.error(f"Error extracting response text: {e}")
-        return "Error processing AI response."
+def chat_with_gemini_stream_async(user_message: str, session_id: str = SessionConfig.DEFAULT_SESSION_ID,
+                                  priority: int = Priority.INTERACTIVE) -> AsyncChatStream:
+    """
+    Sends a user message to the Gemini model and streams the response asynchronously.
+    
+    Args:
+        user_message (str): The user's input message
+        session_id (str): The conversation to continue
+        priority (int): Scheduling priority when rate limits apply (Priority.INTERACTIVE or Priority.BATCH)
+        
+    Returns:
+        AsyncChatStream: Async iterator yielding the response text chunks as they arrive
+    """
+    return AsyncChatStream(user_message, session_id, priority)
+
+class BackgroundLoop:
+    """
+    A single event loop running on a daemon thread.
+    
+    Lets synchronous front ends (such as the Tk GUI) drive the async API
+    without starting an OS thread per request.
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="jarvis-event-loop", daemon=True)
+        self._thread.start()
+    
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+    
+    def submit(self, coro: Awaitable[Any]) -> "concurrent.futures.Future[Any]":
+        """Schedule a coroutine on the loop and return a future for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def run(self, coro: Awaitable[Any]) -> Any:
+        """Run a coroutine on the loop and block until it returns"""
+        if threading.current_thread() is self._thread:
+            # Waiting here would stall the loop the coroutine needs to run on
+            coro.close()
+            raise RuntimeError("BackgroundLoop.run called from the loop thread; await the coroutine instead")
+        future = self.submit(coro)
+        try:
+            return future.result()
+        except BaseException:
+            # Interrupted callers (e.g. Ctrl+C) should not leave the request running
+            future.cancel()
+            raise
 
+_background_loop: Optional[BackgroundLoop] = None
+_background_loop_lock = threading.Lock()
+
+def get_background_loop() -> BackgroundLoop:
+    """Return the shared background event loop, starting it on first use"""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = BackgroundLoop()
+        return _background_loop
+
+class CancellableRequest:
+    """
+    A streamed request running on the shared background event loop.
+    
+    Chunks are passed to on_chunk on the loop thread as they arrive. cancel()
+    may be called from any thread: the request's task is cancelled at
+    whatever it is waiting on (the rate limiter, a retry backoff or the open
+    stream), so the connection is dropped at once and nothing is committed
+    to the chat history. A cancel that only arrives once the whole reply has
+    been handed over and is being committed does not stop it: the request
+    ends normally and cancelled() stays False. Done callbacks run once the
+    task has really ended, after the last chunk has been handed over.
+    """
+    def __init__(self, user_message: str, session_id: str = SessionConfig.DEFAULT_SESSION_ID,
+                 on_chunk: Optional[Callable[[str], None]] = None, priority: int = Priority.INTERACTIVE):
+        self.stream = chat_with_gemini_stream_async(user_message, session_id, priority)
+        self._on_chunk = on_chunk
+        self._task: Optional["asyncio.Task[Any]"] = None
+        self._cancel_requested = False
+        self._loop = get_background_loop()
+        self._future = self._loop.submit(self._run())
+    
+    async def _run(self) -> AsyncChatStream:
+        self._task = asyncio.current_task()
+        if self._cancel_requested:
+            raise asyncio.CancelledError()
+        async for chunk in self.stream:
+            if self._cancel_requested:
+                # Don't let the stream go on to commit a reply the caller has already been told is stopped
+                await self.stream.aclose()
+                raise asyncio.CancelledError()
+            if self._on_chunk is not None:
+                self._on_chunk(chunk)
+        return self.stream
+    
+    def _cancel_task(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+    
+    def cancel(self) -> None:
+        """Stop the request; safe to call from any thread and more than once"""
+        self._cancel_requested = True
+        self._loop.loop.call_soon_threadsafe(self._cancel_task)
+    
+    def cancelled(self) -> bool:
+        """True once the request has ended because it was cancelled"""
+        return self._future.cancelled()
+    
+    def done(self) -> bool:
+        return self._future.done()
+    
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the request to end; returns False on timeout"""
+        return not concurrent.futures.wait([self._future], timeout).not_done
+    
+    def result(self, timeout: Optional[float] = None) -> AsyncChatStream:
+        """
+        Return the finished stream (check its error_message).
+        
+        Raises:
+            concurrent.futures.CancelledError: If the request was cancelled
+        """
+        return self._future.result(timeout)
+    
+    def add_done_callback(self, callback: Callable[["CancellableRequest"], None]) -> None:
+        """Call callback(request) once the request has ended (on the loop thread, or now if it already has)"""
+        self._future.add_done_callback(lambda _: callback(self))
 
-def clear_chat_history() -> str:
+def clear_chat_history(session_id: str = SessionConfig.DEFAULT_SESSION_ID) -> str:
     """
-    Clears the chat history.
+    Clears the chat history of a session.
     Useful for starting a new conversation or when the context needs to be reset.
     
+    Args:
+        session_id (str): The conversation to clear
+    
+    Returns:
+        str: Confirmation message
+    """
+    get_chat_history(session_id).clear()
+    return "Chat history has been cleared."
+
+def attach_document(path: str, session_id: str = SessionConfig.DEFAULT_SESSION_ID) -> AttachedDocument:
+    """
+    Attach a file to a conversation. Only the chunks relevant to each question
+    are sent with it, instead of the whole file riding along in the history.
+    
+    Args:
+        path (str): The file to attach
+        session_id (str): The conversation to attach it to
+    
+    Returns:
+        AttachedDocument: The attached file, with its chunk count
+    
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the file is not text
+    """
+    document = document_library.attach(path)
+    history = get_chat_history(session_id)
+    with history.lock:
+        history.attachments = [attached for attached in history.attachments
+                               if attached.sha256 != document.sha256] + [document]
+    return document
+
+def detach_documents(session_id: str = SessionConfig.DEFAULT_SESSION_ID) -> int:
+    """
+    Remove all attached documents from a conversation.
+    
+    Args:
+        session_id (str): The conversation to detach them from
+    
+    Returns:
+        int: Number of documents removed
+    """
+    history = get_chat_history(session_id)
+    with history.lock:
+        count = len(history.attachments)
+        history.attachments = []
+    return count
+
+def persist_session(session_id: str) -> None:
+    """
+    Save every future turn of a session to the conversation store as it happens.
+    
+    Args:
+        session_id (str): The conversation to persist
+    """
+    session_manager.persist(session_id)
+
+def resume_session(session_id: str) -> int:
+    """
+    Continue a stored conversation.
+    
+    Only the most recent turns (StoreConfig.RESUME_TURNS) are read back,
+    using the store's offset index, and new turns keep being appended.
+    
+    Args:
+        session_id (str): The stored conversation to resume
+    
+    Returns:
+        int: Number of messages loaded into the chat history
+    """
+    return session_manager.persist(session_id, resume=True)
+
+def search_conversations(query: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Search all saved conversations.
+    
+    Args:
+        query (str): Words every hit must contain; end a word with * to match prefixes
+        limit (int): Maximum number of hits
+    
+    Returns:
+        List[Dict]: Hits with "session_id", "turn", "role", "ts" and "snippet" keys, best first
+    
+    Raises:
+        RuntimeError: If conversation search is disabled or unavailable
+    """
+    if conversation_search is None:
+        raise RuntimeError("Conversation search is not available (disabled, or SQLite lacks FTS5)")
+    return conversation_search.search(query, limit)
+
+def list_saved_sessions() -> List[Dict[str, Any]]:
+    """
+    List the conversations in the store, most recently updated first.
+    
+    Returns:
+        List[Dict]: Entries with "session_id", "turns" and "updated" keys
+    """
+    return conversation_store.list_sessions()
+
+def get_stats() -> Dict[str, Any]:
+    """
+    Return a snapshot of the request metrics.
+    
+    Returns:
+        Dict: Counter totals and histogram summaries (count, mean, p50, p95, p99) by metric name
+    """
+    return metrics_registry.snapshot()
+
+async def clear_chat_history_async(session_id: str = SessionConfig.DEFAULT_SESSION_ID) -> str:
+    """
+    Async version of clear_chat_history.
+    
+    Args:
+        session_id (str): The conversation to clear
+    
     Returns:
         str: Confirmation message
     """
-    chat_history.clear()
-    return "Chat history has been cleared."
\ No newline at end of file
+    return await asyncio.to_thread(clear_chat_history, session_id)
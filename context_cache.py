@@ -0,0 +1,295 @@
+import concurrent.futures
+import contextlib
+import contextvars
+import datetime
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+
+from error_handler import ErrorHandler, logger
+
+# SDK exceptions (google.api_core.exceptions) raised when the cached content named in a request is gone;
+# matched by class name, as classify_error does, so the SDK need not be importable here
+CACHE_GONE_ERRORS = ("NotFound", "InvalidArgument")
+
+_stable_messages: "contextvars.ContextVar[Optional[int]]" = contextvars.ContextVar("jarvis_stable_messages",
+                                                                                  default=None)
+
+@contextlib.contextmanager
+def stable_prefix(count: int) -> Iterator[None]:
+    """
+    Declare that only the first `count` messages of requests sent in this block are stable.
+
+    Later messages are about to be dropped from the front of the history by
+    the token window or compaction, after which a cached prefix holding them
+    never matches again, so ContextCache.observe does not register them (see
+    ChatHistory.stable_count).
+    """
+    token = _stable_messages.set(count)
+    try:
+        yield
+    finally:
+        _stable_messages.reset(token)
+
+class GeminiCacheProvider:
+    """Creates and uses cached contents through the Gemini SDK (google.generativeai.caching)"""
+    def __init__(self, get_genai: Callable[[], Any], safety_settings: Optional[List[Dict[str, str]]] = None,
+                 generation_config: Optional[Dict[str, Any]] = None):
+        self._get_genai = get_genai
+        self.safety_settings = safety_settings
+        self.generation_config = generation_config
+
+    def create(self, model_name: str, contents: List[Dict[str, Any]], ttl: float) -> Any:
+        self._get_genai()
+        from google.generativeai import caching
+        if not model_name.startswith("models/"):
+            model_name = f"models/{model_name}"
+        return caching.CachedContent.create(model=model_name, contents=contents,
+                                            ttl=datetime.timedelta(seconds=ttl))
+
+    def extend(self, handle: Any, ttl: float) -> None:
+        handle.update(ttl=datetime.timedelta(seconds=ttl))
+
+    def delete(self, handle: Any) -> None:
+        handle.delete()
+
+    def model_for(self, model_name: str, handle: Any) -> Any:
+        return self._get_genai().GenerativeModel.from_cached_content(
+            cached_content=handle,
+            safety_settings=self.safety_settings,
+            generation_config=self.generation_config
+        )
+
+class CachedPrefix:
+    """A run of leading messages registered upstream as cached content"""
+    def __init__(self, model_name: str, key: str, message_count: int, tokens: int, handle: Any, ttl: float,
+                 provider: Any):
+        self.model_name = model_name
+        self.key = key
+        self.message_count = message_count
+        self.tokens = tokens
+        self.handle = handle
+        self.provider = provider
+        self.created = time.monotonic()
+        self.expires_at = self.created + ttl
+        self.model: Any = None
+        self.hits = 0
+
+def prefix_hashes(contents: List[Dict[str, Any]], count: int) -> List[str]:
+    """Chained hashes of contents[:1], contents[:2], ... contents[:count]"""
+    hashes = []
+    digest = b""
+    for message in contents[:count]:
+        digest = hashlib.sha256(digest + json.dumps(message, sort_keys=True, default=str).encode("utf-8")).digest()
+        hashes.append(digest.hex())
+    return hashes
+
+class ContextCache:
+    """
+    Sends the stable start of a conversation to the API once, as cached content.
+
+    Every request repeats the whole history. Once the stable part of it that
+    is not yet cached (see stable_prefix: the preamble, pasted documents and
+    older turns while the history has room to grow, the preamble and
+    compaction summary once it is full) reaches min_tokens, that prefix is
+    registered upstream on a background thread. Later requests that start
+    with a registered prefix send only the messages after it, using a model
+    bound to the cached content. Prefixes that reach past the stable part are
+    deleted, since the turns they hold are about to be evicted.
+
+    Entries are tracked with their expiry time: a prefix about to expire is
+    no longer used, one in use is extended before it runs out, and at most
+    max_entries are kept (the least recently used is deleted upstream).
+    If the API reports a cached prefix as gone, it is forgotten and the
+    request is resent in full (see is_cache_error).
+    """
+    def __init__(self, provider: Callable[[], Any], min_tokens: int = 4096, ttl: float = 3600.0,
+                 max_entries: int = 64, expiry_margin: float = 60.0,
+                 token_counter: Optional[Callable[[str], int]] = None):
+        self._provider = provider
+        self.min_tokens = min_tokens
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.expiry_margin = expiry_margin
+        self.token_counter = token_counter or (lambda text: max(1, len(text) // 4))
+        self._entries: "OrderedDict[Tuple[str, str], CachedPrefix]" = OrderedDict()
+        self._pending: set = set()
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="jarvis-context-cache")
+        self._paused_until = 0.0
+        self.hits = 0
+        self.fallbacks = 0
+        self.extend_failures = 0
+        self.created = 0
+        self.tokens_saved = 0
+
+    def _tokens(self, messages: List[Dict[str, Any]]) -> int:
+        return sum(self.token_counter(str(part)) for message in messages for part in message["parts"])
+
+    def lookup(self, model_name: str, contents: List[Dict[str, Any]]) -> Optional[Tuple[CachedPrefix, List[Dict[str, Any]]]]:
+        """
+        Find the longest live cached prefix of a request.
+
+        Returns:
+            Optional[Tuple]: The prefix and the messages still to send, or None if nothing applies
+        """
+        now = time.monotonic()
+        provider = self._provider()
+        with self._lock:
+            # Entries made by a provider that has since been replaced (e.g. by the fake backend) are ignored
+            counts = sorted({entry.message_count for (name, _), entry in self._entries.items()
+                             if name == model_name and entry.provider is provider
+                             and entry.message_count < len(contents)}, reverse=True)
+        if not counts:
+            return None
+        hashes = prefix_hashes(contents, counts[0])
+        with self._lock:
+            for count in counts:
+                entry = self._entries.get((model_name, hashes[count - 1]))
+                if entry is None or entry.provider is not provider:
+                    continue
+                if entry.expires_at - now < self.expiry_margin:
+                    self._entries.pop((model_name, entry.key))
+                    continue
+                self._entries.move_to_end((model_name, entry.key))
+                entry.hits += 1
+                self.hits += 1
+                self.tokens_saved += entry.tokens
+                if entry.expires_at - now < self.ttl / 2:
+                    # Still in use: push the expiry out before it lapses
+                    entry.expires_at = now + self.ttl
+                    self._executor.submit(self._extend, entry)
+                return entry, contents[count:]
+        return None
+
+    def observe(self, model_name: str, contents: List[Dict[str, Any]], cached: Optional[CachedPrefix]) -> None:
+        """
+        Register the stable start of the request's history as a new cached prefix if enough of it is uncached.
+
+        Called after a request succeeded; the upstream call runs in the background.
+        """
+        history = contents[:-1]
+        stable = _stable_messages.get()
+        if stable is not None:
+            if cached is not None and cached.message_count > stable:
+                # The history is about to evict turns these prefixes hold, after which they never match again
+                self._drop_unstable(model_name, history, stable)
+                cached = None
+            history = history[:stable]
+        if len(history) < 2 or time.monotonic() < self._paused_until:
+            return
+        uncached = self._tokens(history[cached.message_count:] if cached else history)
+        if uncached < self.min_tokens:
+            return
+        key = prefix_hashes(history, len(history))[-1]
+        with self._lock:
+            if (model_name, key) in self._entries or (model_name, key) in self._pending:
+                return
+            self._pending.add((model_name, key))
+        self._executor.submit(self._create, model_name, key, list(history))
+
+    def _create(self, model_name: str, key: str, history: List[Dict[str, Any]]) -> None:
+        provider = self._provider()
+        try:
+            handle = provider.create(model_name, history, self.ttl)
+        except Exception as e:
+            # Often the prefix is below the model's minimum cacheable size; do not retry on every turn
+            self._paused_until = time.monotonic() + self.expiry_margin * 5
+            ErrorHandler.log_error(e, "Error creating cached context")
+            return
+        finally:
+            with self._lock:
+                self._pending.discard((model_name, key))
+
+        entry = CachedPrefix(model_name, key, len(history), self._tokens(history), handle, self.ttl, provider)
+        with self._lock:
+            self._entries[(model_name, key)] = entry
+            self.created += 1
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[1])
+        logger.info("Cached %s messages (%s tokens) of context for %s", entry.message_count, entry.tokens, model_name)
+        for old in evicted:
+            self._delete(old)
+
+    def _extend(self, entry: CachedPrefix) -> None:
+        try:
+            entry.provider.extend(entry.handle, self.ttl)
+        except Exception as e:
+            logger.warning("Could not extend cached context: %s", e)
+            # Not a fallback: no request was resent, the prefix is just rebuilt when next observed
+            with self._lock:
+                self._forget(entry)
+                self.extend_failures += 1
+
+    def _delete(self, entry: CachedPrefix) -> None:
+        try:
+            entry.provider.delete(entry.handle)
+        except Exception as e:
+            logger.debug("Could not delete cached context: %s", e)
+
+    def model_for(self, entry: CachedPrefix) -> Any:
+        """Return the model bound to a cached prefix, building it on first use"""
+        if entry.model is None:
+            entry.model = entry.provider.model_for(entry.model_name, entry.handle)
+        return entry.model
+
+    @staticmethod
+    def is_cache_error(error: Exception) -> bool:
+        """True if the API rejected a request because its cached content is gone (expired or deleted)"""
+        return any(cls.__name__ in CACHE_GONE_ERRORS for cls in type(error).__mro__)
+
+    def _forget(self, entry: CachedPrefix) -> None:
+        """Drop an entry if it is still registered. Caller must hold self._lock."""
+        if self._entries.get((entry.model_name, entry.key)) is entry:
+            del self._entries[(entry.model_name, entry.key)]
+
+    def _drop_unstable(self, model_name: str, history: List[Dict[str, Any]], stable: int) -> None:
+        """Forget the cached prefixes of a history that reach past its stable part and delete them upstream"""
+        hashes = prefix_hashes(history, len(history))
+        with self._lock:
+            dropped = [self._entries.pop((model_name, key)) for key in hashes[stable:]
+                       if (model_name, key) in self._entries]
+        for entry in dropped:
+            logger.info("Dropping cached context of %s messages for %s; the history is about to be trimmed",
+                        entry.message_count, model_name)
+            self._executor.submit(self._delete, entry)
+
+    def invalidate(self, entry: CachedPrefix, resent: bool = False) -> None:
+        """
+        Forget a cached prefix, e.g. after the API reported it missing.
+
+        Args:
+            entry (CachedPrefix): The prefix to drop
+            resent (bool): The request that looked it up is being sent in full instead, so it is not a hit
+        """
+        with self._lock:
+            self._forget(entry)
+            self.fallbacks += 1
+            if resent:
+                self.hits -= 1
+                self.tokens_saved -= entry.tokens
+        logger.info("Cached context for %s is no longer available; sending the full history", entry.model_name)
+
+    def clear(self) -> None:
+        """Forget every cached prefix and delete them upstream"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._executor.submit(self._delete, entry)
+
+    def stats(self) -> Dict[str, int]:
+        """Return context cache counters"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "created": self.created,
+                "hits": self.hits,
+                "fallbacks": self.fallbacks,
+                "extend_failures": self.extend_failures,
+                "tokens_saved": self.tokens_saved
+            }
@@ -0,0 +1,192 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Optional, Set
+
+from error_handler import ErrorHandler, logger
+
+def _fts5_available() -> bool:
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE probe USING fts5(text)")
+        return True
+    except sqlite3.Error:
+        return False
+
+FTS5_AVAILABLE = _fts5_available()
+
+QUERY_TERM = re.compile(r"\w+\*?")
+
+def fts_query(text: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 query matching turns that contain every word.
+
+    A trailing * on a word matches any word starting with it. Returns None if
+    the text has no words.
+    """
+    terms = []
+    for term in QUERY_TERM.findall(text):
+        prefix = term.endswith("*")
+        term = term.rstrip("*")
+        terms.append(f'"{term}"*' if prefix else f'"{term}"')
+    return " ".join(terms) or None
+
+class ConversationSearch:
+    """
+    Full-text index over every session in a ConversationStore.
+
+    Turns go into an SQLite FTS5 table (an inverted index ranked with BM25),
+    and a second table records how many turns of each session are indexed.
+    Indexing a session therefore only reads the turns appended since it was
+    last indexed, straight from the store's offset index; nothing is ever
+    rebuilt.
+
+    The store notifies the index of each appended turn (see attach); the
+    changed sessions are indexed on a background thread after
+    `delay` seconds, so a burst of turns is written in one transaction.
+    Searches first index whatever is still pending, and every
+    `scan_interval` seconds compare all sessions in the store with the
+    index, which picks up conversations saved before the index existed
+    or by another process.
+    """
+    def __init__(self, store: Any, db_path: str, delay: float = 1.0, scan_interval: float = 30.0):
+        self.store = store
+        self.db_path = db_path
+        self.delay = delay
+        self.scan_interval = scan_interval
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._dirty: Set[str] = set()
+        self._dirty_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._last_scan: Optional[float] = None
+
+    def attach(self) -> None:
+        """Start indexing turns as the store appends them"""
+        self.store.add_listener(self.notify)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5.0)
+            # WAL lets searches run while another process indexes; commits need not wait for fsync
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS turns USING fts5("
+                       "content, session_id UNINDEXED, turn UNINDEXED, role UNINDEXED, ts UNINDEXED)")
+            db.execute("CREATE TABLE IF NOT EXISTS indexed_sessions (session_id TEXT PRIMARY KEY, turns INTEGER NOT NULL)")
+            db.commit()
+            self._db = db
+        return self._db
+
+    def notify(self, session_id: str, turn_index: int) -> None:
+        """Mark a session as having new turns to index (ConversationStore listener)"""
+        with self._dirty_lock:
+            self._dirty.add(session_id)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="jarvis-search-index", daemon=True)
+                self._worker.start()
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.delay)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                ErrorHandler.log_error(e, "Error updating the conversation search index")
+
+    def _index_session(self, db: sqlite3.Connection, session_id: str) -> int:
+        """Index the turns of one session that are not indexed yet; returns how many were added"""
+        row = db.execute("SELECT turns FROM indexed_sessions WHERE session_id = ?", (session_id,)).fetchone()
+        indexed = row[0] if row else 0
+        turns = self.store.read_turns(session_id, indexed)
+        if not turns:
+            return 0
+        db.executemany(
+            "INSERT INTO turns (content, session_id, turn, role, ts) VALUES (?, ?, ?, ?, ?)",
+            [(turn["content"], session_id, indexed + offset, turn["role"], turn["ts"])
+             for offset, turn in enumerate(turns)]
+        )
+        db.execute("INSERT OR REPLACE INTO indexed_sessions (session_id, turns) VALUES (?, ?)",
+                   (session_id, indexed + len(turns)))
+        return len(turns)
+
+    def _index(self, session_ids: List[str]) -> int:
+        if not session_ids:
+            return 0
+        added = 0
+        with self._lock:
+            db = self._connect()
+            # One immediate transaction, so processes indexing the same session cannot both add its turns
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for session_id in session_ids:
+                    added += self._index_session(db, session_id)
+                db.commit()
+            except BaseException:
+                db.rollback()
+                raise
+        if added:
+            logger.debug("Indexed %s new turn(s) from %s session(s) for search", added, len(session_ids))
+        return added
+
+    def flush(self) -> int:
+        """Index the sessions notified since the last flush; returns the number of turns added"""
+        with self._dirty_lock:
+            session_ids = sorted(self._dirty)
+            self._dirty.clear()
+        return self._index(session_ids)
+
+    def catch_up(self) -> int:
+        """Index every session in the store that has turns the index has not seen"""
+        with self._lock:
+            db = self._connect()
+            indexed = dict(db.execute("SELECT session_id, turns FROM indexed_sessions").fetchall())
+        self._last_scan = time.monotonic()
+        stale = [session["session_id"] for session in self.store.list_sessions()
+                 if session["turns"] > indexed.get(session["session_id"], 0)]
+        return self._index(stale)
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Find turns containing all the words of a query, best matches first.
+
+        Args:
+            query (str): Words to look for; end a word with * to match prefixes
+            limit (int): Maximum number of hits
+
+        Returns:
+            List[Dict]: Hits with "session_id", "turn", "role", "ts" and "snippet" keys
+        """
+        match = fts_query(query)
+        if match is None:
+            return []
+        self.flush()
+        if self._last_scan is None or time.monotonic() - self._last_scan >= self.scan_interval:
+            self.catch_up()
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT session_id, turn, role, ts, snippet(turns, 0, '[', ']', '...', 16) FROM turns "
+                "WHERE turns MATCH ? ORDER BY bm25(turns), ts DESC LIMIT ?",
+                (match, limit)
+            ).fetchall()
+        return [{"session_id": session_id, "turn": turn, "role": role, "ts": ts, "snippet": snippet}
+                for session_id, turn, role, ts, snippet in rows]
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of indexed sessions and turns"""
+        with self._lock:
+            sessions, turns = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(turns), 0) FROM indexed_sessions").fetchone()
+        return {"sessions": sessions, "turns": turns}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,176 @@
+import json
+import os
+import struct
+import threading
+import time
+from typing import List, Dict, Any, Callable, IO, Optional
+from urllib.parse import quote, unquote
+
+# Each index entry is the byte offset of one record in the session's .jsonl file
+_OFFSET = struct.Struct("<Q")
+
+class ConversationStore:
+    """
+    Durable, append-only store of conversation turns.
+
+    Each session has a JSONL segment holding one record per turn and an
+    index file of fixed-size record offsets. Appending a turn writes one
+    record and one index entry, so saving is O(new turns). Reading the last
+    N turns seeks straight to their offsets instead of parsing the whole
+    segment.
+
+    A crash between writing a record and its index entry only loses that
+    turn: unindexed bytes in a segment are never read back, and a partly
+    written index entry is cut off before the next one is appended.
+
+    File names are the percent-encoded session ids, so distinct ids never
+    share files and list_sessions can report the original ids.
+
+    Listeners (see add_listener) are told about every appended turn, e.g.
+    to keep a search index up to date.
+    """
+    def __init__(self, directory: str, fsync: bool = False):
+        self.directory = directory
+        self.fsync = fsync
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self._listeners: List[Callable[[str, int], None]] = []
+
+    def add_listener(self, listener: Callable[[str, int], None]) -> None:
+        """
+        Call listener(session_id, turn_index) after each appended turn.
+
+        Listeners run on the appending thread, so they should be quick.
+        """
+        self._listeners.append(listener)
+
+    @staticmethod
+    def _safe_name(session_id: str) -> str:
+        # Reversible: ids made only of these characters keep their name, anything else is %XX-escaped
+        return quote(session_id, safe="")
+
+    def segment_path(self, session_id: str) -> str:
+        """Path of the JSONL segment holding a session's turns"""
+        return os.path.join(self.directory, self._safe_name(session_id) + ".jsonl")
+
+    def _index_path(self, session_id: str) -> str:
+        return os.path.join(self.directory, self._safe_name(session_id) + ".idx")
+
+    def _lock_for(self, session_id: str) -> threading.Lock:
+        with self._locks_lock:
+            lock = self._locks.get(session_id)
+            if lock is None:
+                lock = self._locks[session_id] = threading.Lock()
+            return lock
+
+    def append_turn(self, session_id: str, role: str, content: str, timestamp: Optional[float] = None) -> int:
+        """
+        Append one turn to a session.
+
+        Returns:
+            int: The index of the new turn within the session
+        """
+        record = {"role": role, "content": content, "ts": timestamp if timestamp is not None else time.time()}
+        data = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock_for(session_id):
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.segment_path(session_id), "ab") as segment:
+                offset = segment.seek(0, os.SEEK_END)
+                segment.write(data)
+                segment.flush()
+                if self.fsync:
+                    os.fsync(segment.fileno())
+            with open(self._index_path(session_id), "ab") as index:
+                size = index.seek(0, os.SEEK_END)
+                if size % _OFFSET.size:
+                    # An entry was cut short by a crash; drop it so later offsets stay aligned
+                    size -= size % _OFFSET.size
+                    index.truncate(size)
+                turn_index = size // _OFFSET.size
+                index.write(_OFFSET.pack(offset))
+                index.flush()
+                if self.fsync:
+                    os.fsync(index.fileno())
+        for listener in self._listeners:
+            listener(session_id, turn_index)
+        return turn_index
+
+    def turn_count(self, session_id: str) -> int:
+        """Number of turns stored for a session"""
+        try:
+            return os.path.getsize(self._index_path(session_id)) // _OFFSET.size
+        except OSError:
+            return 0
+
+    def read_turns(self, session_id: str, start: int, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Read turns [start, stop) of a session using the offset index.
+
+        Returns:
+            List[Dict]: Records with "role", "content" and "ts" keys, oldest first
+        """
+        count = self.turn_count(session_id)
+        stop = count if stop is None else min(stop, count)
+        start = max(0, start)
+        if start >= stop:
+            return []
+
+        with open(self._index_path(session_id), "rb") as index:
+            index.seek(start * _OFFSET.size)
+            raw = index.read((stop - start) * _OFFSET.size)
+        offsets = [entry[0] for entry in _OFFSET.iter_unpack(raw)]
+
+        turns = []
+        with open(self.segment_path(session_id), "rb") as segment:
+            for offset in offsets:
+                # Records are usually back to back; seek only past unindexed bytes left by a crash
+                if segment.tell() != offset:
+                    segment.seek(offset)
+                turns.append(json.loads(segment.readline()))
+        return turns
+
+    def load_tail(self, session_id: str, count: int) -> List[Dict[str, Any]]:
+        """Read the last `count` turns of a session"""
+        total = self.turn_count(session_id)
+        return self.read_turns(session_id, total - count, total)
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        """Return the stored sessions, most recently updated first"""
+        sessions = []
+        if not os.path.isdir(self.directory):
+            return sessions
+        for name in os.listdir(self.directory):
+            if not name.endswith(".idx"):
+                continue
+            session_id = unquote(name[:-len(".idx")])
+            path = os.path.join(self.directory, name)
+            sessions.append({
+                "session_id": session_id,
+                "turns": os.path.getsize(path) // _OFFSET.size,
+                "updated": os.path.getmtime(path)
+            })
+        sessions.sort(key=lambda session: session["updated"], reverse=True)
+        return sessions
+
+    def export(self, session_id: str, output: IO[str], batch_size: int = 500) -> int:
+        """
+        Write a session as readable text, streaming it in batches.
+
+        Returns:
+            int: Number of turns written
+        """
+        total = self.turn_count(session_id)
+        for start in range(0, total, batch_size):
+            for turn in self.read_turns(session_id, start, start + batch_size):
+                stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(turn["ts"]))
+                sender = "User" if turn["role"] == "user" else "Jarvis"
+                output.write(f"[{stamp}] {sender}: {turn['content']}\n\n")
+        return total
+
+    def sync(self, session_id: str) -> None:
+        """Force a session's files to disk"""
+        with self._lock_for(session_id):
+            for path in (self.segment_path(session_id), self._index_path(session_id)):
+                if os.path.exists(path):
+                    with open(path, "ab") as f:
+                        os.fsync(f.fileno())
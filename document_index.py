@@ -0,0 +1,295 @@
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+from error_handler import logger
+
+INDEX_FORMAT_VERSION = 1
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+def file_sha256(path: str) -> str:
+    """Hash a file's contents through a memory map, without reading it into memory"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.sha256(b"").hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.sha256(mapped).hexdigest()
+
+def iter_chunks(path: str, chunk_chars: int) -> Iterator[Tuple[int, int, str]]:
+    """
+    Read a text file through a memory map and cut it into chunks of whole lines.
+
+    Args:
+        path (str): The file to read
+        chunk_chars (int): Maximum characters per chunk; longer lines are split
+
+    Yields:
+        Tuple[int, int, str]: First line number, last line number and text of each chunk
+
+    Raises:
+        ValueError: If the file looks binary
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if b"\0" in mapped[:8192]:
+                raise ValueError(f"{os.path.basename(path)} does not look like a text file")
+            parts: List[str] = []
+            size = 0
+            first = last = 0
+            for line_number, raw in enumerate(iter(mapped.readline, b""), 1):
+                text = raw.decode("utf-8", errors="replace")
+                for start in range(0, len(text), chunk_chars):
+                    piece = text[start:start + chunk_chars]
+                    if parts and size + len(piece) > chunk_chars:
+                        yield first, last, "".join(parts)
+                        parts, size = [], 0
+                    if not parts:
+                        first = line_number
+                    parts.append(piece)
+                    size += len(piece)
+                    last = line_number
+            if parts:
+                yield first, last, "".join(parts)
+
+class BM25Index:
+    """
+    Okapi BM25 ranking over the chunks of one document.
+
+    Postings map each term to [chunk number, term frequency] pairs, so a
+    query only touches the chunks that contain its terms.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # [first line, last line, text] per chunk
+        self.chunks: List[List[Any]] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[List[int]]] = {}
+        self._total_length = 0
+
+    def add(self, first_line: int, last_line: int, text: str) -> None:
+        """Index one chunk"""
+        chunk = len(self.chunks)
+        terms = Counter(tokenize(text))
+        for term, count in terms.items():
+            self.postings.setdefault(term, []).append([chunk, count])
+        length = sum(terms.values())
+        self.chunks.append([first_line, last_line, text])
+        self.lengths.append(length)
+        self._total_length += length
+
+    def chunk_frequencies(self, terms: Iterable[str]) -> Dict[str, int]:
+        """Number of chunks containing each term"""
+        return {term: len(self.postings.get(term, ())) for term in terms}
+
+    def search(self, query: str, k: int,
+               corpus: Optional[Tuple[int, float, Dict[str, int]]] = None) -> List[Tuple[float, int]]:
+        """
+        Rank the chunks against a query.
+
+        Args:
+            query (str): The query text
+            k (int): Number of chunks to return
+            corpus (Optional[Tuple]): (chunk count, average chunk length, chunks containing each query term)
+                of all the indexes searched together, so their scores are on one scale; defaults to this index
+
+        Returns:
+            List[Tuple[float, int]]: (score, chunk number) of the best k chunks sharing a term with the query
+        """
+        if not self.chunks:
+            return []
+        terms = set(tokenize(query))
+        if corpus is None:
+            corpus = (len(self.chunks), self._total_length / len(self.chunks), self.chunk_frequencies(terms))
+        count, average_length, frequencies = corpus
+        average_length = average_length or 1.0
+        scores: Dict[int, float] = {}
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            containing = frequencies.get(term, len(postings))
+            idf = math.log(1 + (count - containing + 0.5) / (containing + 0.5))
+            for chunk, frequency in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk] / average_length)
+                scores[chunk] = scores.get(chunk, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(k, ((score, chunk) for chunk, score in scores.items()))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"chunks": self.chunks, "lengths": self.lengths, "postings": self.postings}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "BM25Index":
+        index = cls()
+        index.chunks = data["chunks"]
+        index.lengths = data["lengths"]
+        index.postings = data["postings"]
+        index._total_length = sum(index.lengths)
+        return index
+
+class AttachedDocument:
+    """A file attached to a conversation; its index is looked up in the DocumentLibrary by hash"""
+    def __init__(self, path: str, sha256: str, chunk_count: int):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.sha256 = sha256
+        self.chunk_count = chunk_count
+
+class DocumentLibrary:
+    """
+    Builds, caches and searches the indexes of attached documents.
+
+    Indexes are written to `directory` as <sha256>.json, so attaching a file
+    that was indexed before (by any session, or an earlier run) only costs
+    hashing it. The most recently used indexes are also kept in memory.
+    """
+    def __init__(self, directory: str, chunk_chars: int = 1500, max_loaded: int = 8):
+        self.directory = directory
+        self.chunk_chars = chunk_chars
+        self.max_loaded = max_loaded
+        self._loaded: "OrderedDict[str, BM25Index]" = OrderedDict()
+        # (path, size, mtime) -> sha256, so re-attaching an unchanged file skips hashing it
+        self._hashes: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per hash being built, so concurrent attaches of the same file build it once
+        self._building: Dict[str, threading.Lock] = {}
+
+    def _index_path(self, sha256: str) -> str:
+        return os.path.join(self.directory, f"{sha256}.json")
+
+    def _hash(self, path: str) -> str:
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            sha256 = self._hashes.get(key)
+            if sha256 is not None:
+                self._hashes.move_to_end(key)
+                return sha256
+        sha256 = file_sha256(path)
+        with self._lock:
+            self._hashes[key] = sha256
+            while len(self._hashes) > self.max_loaded:
+                self._hashes.popitem(last=False)
+        return sha256
+
+    def _remember(self, sha256: str, index: BM25Index) -> None:
+        with self._lock:
+            self._loaded[sha256] = index
+            self._loaded.move_to_end(sha256)
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+
+    def _read(self, sha256: str) -> Optional[BM25Index]:
+        """Load an index from memory or disk, or None if it was never built"""
+        with self._lock:
+            index = self._loaded.get(sha256)
+            if index is not None:
+                self._loaded.move_to_end(sha256)
+                return index
+        try:
+            with open(self._index_path(sha256), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != INDEX_FORMAT_VERSION or data.get("chunk_chars") != self.chunk_chars:
+                return None
+            index = BM25Index.from_dict(data)
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning("Ignoring unreadable document index %s: %s", self._index_path(sha256), e)
+            return None
+        self._remember(sha256, index)
+        return index
+
+    def _build(self, path: str, sha256: str) -> BM25Index:
+        index = BM25Index()
+        for first_line, last_line, text in iter_chunks(path, self.chunk_chars):
+            index.add(first_line, last_line, text)
+        os.makedirs(self.directory, exist_ok=True)
+        data = index.to_dict()
+        data.update(version=INDEX_FORMAT_VERSION, chunk_chars=self.chunk_chars)
+        temp_path = self._index_path(sha256) + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp_path, self._index_path(sha256))
+        logger.info("Indexed %s into %s chunks", path, len(index.chunks))
+        self._remember(sha256, index)
+        return index
+
+    def attach(self, path: str) -> AttachedDocument:
+        """
+        Index a file, or reuse the index built for identical contents before.
+
+        Args:
+            path (str): The file to attach
+
+        Returns:
+            AttachedDocument: The attached file
+
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If the file is not text
+        """
+        path = os.path.abspath(os.path.expanduser(path))
+        sha256 = self._hash(path)
+        index = self._read(sha256)
+        if index is None:
+            with self._lock:
+                building = self._building.setdefault(sha256, threading.Lock())
+            try:
+                with building:
+                    # Another attach may have built it while this one waited
+                    index = self._read(sha256) or self._build(path, sha256)
+            finally:
+                with self._lock:
+                    self._building.pop(sha256, None)
+        return AttachedDocument(path, sha256, len(index.chunks))
+
+    def search(self, documents: List[AttachedDocument], query: str, k: int) -> List[Tuple[AttachedDocument, List[Any]]]:
+        """
+        Find the chunks of the given documents most relevant to a query.
+
+        The documents are scored as one corpus (term frequencies and chunk
+        lengths are taken over all of them), so a chunk's score means the same
+        in every document and results are merged on it directly.
+
+        Returns:
+            List[Tuple]: Up to k (document, [first line, last line, text]) pairs, best first
+        """
+        loaded = []
+        for document in documents:
+            index = self._read(document.sha256)
+            if index is None:
+                logger.warning("Index for %s is missing; re-attach the file", document.name)
+                continue
+            loaded.append((document, index))
+        if not loaded:
+            return []
+
+        terms = set(tokenize(query))
+        count = sum(len(index.chunks) for _, index in loaded)
+        frequencies: Counter = Counter()
+        for _, index in loaded:
+            frequencies.update(index.chunk_frequencies(terms))
+        corpus = (count, sum(index._total_length for _, index in loaded) / max(count, 1), dict(frequencies))
+
+        ranked = []
+        for document, index in loaded:
+            for rank, (score, chunk) in enumerate(index.search(query, k, corpus)):
+                if score > 0:
+                    ranked.append((-score, rank, document, index.chunks[chunk]))
+        # Ties go to each document's better-ranked chunks first, so one document cannot crowd out another
+        ranked.sort(key=lambda item: item[:2])
+        return [(document, chunk) for _, _, document, chunk in ranked[:k]]
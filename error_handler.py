@@ -1,20 +1,223 @@
+import atexit
+import contextvars
+import copy
+import json
 import logging
+import logging.handlers
+import os
+import queue
 import sys
 import traceback
-from typing import Callable, Any, Optional
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Any, Dict, Iterator, Optional
+
+class LogConfig:
+    """Configuration for the logging pipeline"""
+    FILE = os.getenv("JARVIS_LOG_FILE", "jarvis_assistant.log")
+    LEVEL = os.getenv("JARVIS_LOG_LEVEL", "INFO").upper()
+    CONSOLE_LEVEL = os.getenv("JARVIS_CONSOLE_LOG_LEVEL", "WARNING").upper()
+    MAX_BYTES = int(os.getenv("JARVIS_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    BACKUP_COUNT = int(os.getenv("JARVIS_LOG_BACKUPS", "5"))
+    JSON = os.getenv("JARVIS_LOG_FORMAT", "json") == "json"
+    TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Request fields copied onto every record logged while they are set (see log_context)
+CONTEXT_FIELDS = ("session_id", "request_id", "latency_ms")
+_log_context: "contextvars.ContextVar[Dict[str, Any]]" = contextvars.ContextVar("jarvis_log_context", default={})
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """Attach fields such as session_id and request_id to every record logged inside the block"""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+def new_request_id() -> str:
+    """Return a short random id for correlating the log records of one request"""
+    return uuid.uuid4().hex[:12]
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including the request context fields"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the logging thread instead of writing them.
+    
+    Only the work that depends on the calling thread happens here: the
+    message is interpolated and the request context is copied onto the
+    record. Formatting and disk writes happen on the listener thread.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        for field, value in _log_context.get().items():
+            if not hasattr(record, field):
+                setattr(record, field, value)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_exception_formatter = logging.Formatter()
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def configure_logging() -> logging.handlers.QueueListener:
+    """
+    Route all logging through a queue drained by a background listener.
+    
+    Callers only enqueue records, so request threads never block on disk.
+    The listener writes JSON lines to a size-rotated log file and readable
+    text to the console. Safe to call more than once.
+    
+    Returns:
+        QueueListener: The running listener, stopped (and flushed) at exit
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    
+    file_handler = logging.handlers.RotatingFileHandler(
+        LogConfig.FILE, maxBytes=LogConfig.MAX_BYTES, backupCount=LogConfig.BACKUP_COUNT,
+        encoding="utf-8", delay=True
+    )
+    file_handler.setFormatter(JsonFormatter() if LogConfig.JSON else logging.Formatter(LogConfig.TEXT_FORMAT))
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(LogConfig.CONSOLE_LEVEL)
+    console_handler.setFormatter(logging.Formatter(LogConfig.TEXT_FORMAT))
+    
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler,
+                                               respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    
+    root = logging.getLogger()
+    root.setLevel(LogConfig.LEVEL)
+    root.addHandler(ContextQueueHandler(log_queue))
+    return _listener
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("jarvis_assistant.log"),
-        logging.StreamHandler()
-    ]
-)
+configure_logging()
 
 logger = logging.getLogger("jarvis_assistant")
 
+class GeminiError(Exception):
+    """Base class for classified errors from the Gemini API"""
+    retryable = False
+    user_message = "An error occurred while communicating with the AI service."
+
+class AuthenticationError(GeminiError):
+    """The API key is missing, invalid or lacks permission"""
+    user_message = "There seems to be an issue with the API key. Please check your .env file."
+
+class RateLimitError(GeminiError):
+    """The request was rejected because of quota or rate limits"""
+    retryable = True
+    user_message = "You've reached your API usage limit. Please try again later."
+
+class ServiceUnavailableError(GeminiError):
+    """The API could not be reached or failed on the server side"""
+    retryable = True
+    user_message = "Unable to connect to the Gemini API. Please check your internet connection."
+
+class DeadlineExceededError(GeminiError):
+    """The request did not complete within its deadline"""
+    retryable = True
+    user_message = "The AI service took too long to respond. Please try again."
+
+class InvalidRequestError(GeminiError):
+    """The request was malformed or not accepted by the model"""
+
+class ContentBlockedError(GeminiError):
+    """The prompt or response was blocked by the safety settings"""
+    user_message = "The request was blocked by the content safety filters."
+
+class CircuitOpenError(GeminiError):
+    """Requests are failing fast because the API has been failing"""
+    user_message = "The AI service is currently unavailable. Please try again shortly."
+
+# SDK / transport exception class names mapped to our error types
+_ERROR_TYPES_BY_NAME = {
+    "Unauthenticated": AuthenticationError,
+    "PermissionDenied": AuthenticationError,
+    "Unauthorized": AuthenticationError,
+    "Forbidden": AuthenticationError,
+    "ResourceExhausted": RateLimitError,
+    "TooManyRequests": RateLimitError,
+    "ServiceUnavailable": ServiceUnavailableError,
+    "InternalServerError": ServiceUnavailableError,
+    "BadGateway": ServiceUnavailableError,
+    "ServerError": ServiceUnavailableError,
+    "Aborted": ServiceUnavailableError,
+    "ConnectionError": ServiceUnavailableError,
+    "DeadlineExceeded": DeadlineExceededError,
+    "GatewayTimeout": DeadlineExceededError,
+    "Timeout": DeadlineExceededError,
+    "TimeoutError": DeadlineExceededError,
+    "ReadTimeout": DeadlineExceededError,
+    "InvalidArgument": InvalidRequestError,
+    "BadRequest": InvalidRequestError,
+    "NotFound": InvalidRequestError,
+    "FailedPrecondition": InvalidRequestError,
+    "BlockedPromptException": ContentBlockedError,
+    "StopCandidateException": ContentBlockedError,
+}
+
+def classify_error(error: Exception) -> GeminiError:
+    """
+    Map an exception raised while calling the API to a typed GeminiError.
+    
+    SDK and transport exceptions are matched by class (including base
+    classes); anything unrecognised falls back to matching the message text.
+    The original exception is kept as __cause__.
+    """
+    if isinstance(error, GeminiError):
+        return error
+    
+    error_type = None
+    for cls in type(error).__mro__:
+        error_type = _ERROR_TYPES_BY_NAME.get(cls.__name__)
+        if error_type is not None:
+            break
+    
+    if error_type is None:
+        error_message = str(error).lower()
+        if "api key" in error_message or "authentication" in error_message:
+            error_type = AuthenticationError
+        elif "timeout" in error_message or "deadline" in error_message:
+            error_type = DeadlineExceededError
+        elif "connection" in error_message or "unavailable" in error_message:
+            error_type = ServiceUnavailableError
+        elif "quota" in error_message or "limit" in error_message:
+            error_type = RateLimitError
+        else:
+            error_type = GeminiError
+    
+    classified = error_type(str(error))
+    classified.__cause__ = error
+    return classified
+
 class ErrorHandler:
     """Error handling utility class for the Jarvis AI Assistant"""
     
@@ -25,26 +228,25 @@ class ErrorHandler:
         error_message = str(error)
         
         if context:
-            logger.error(f"{context} - {error_type}: {error_message}")
+            logger.error("%s - %s: %s", context, error_type, error_message)
         else:
-            logger.error(f"{error_type}: {error_message}")
+            logger.error("%s: %s", error_type, error_message)
         
-        logger.debug(traceback.format_exc())
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(traceback.format_exc())
     
     @staticmethod
     def handle_api_error(error: Exception) -> str:
         """Handle API-related errors and return user-friendly messages"""
-        error_message = str(error).lower()
+        classified = classify_error(error)
         
-        if "api key" in error_message or "authentication" in error_message:
-            return "There seems to be an issue with the API key. Please check your .env file."
-        elif "timeout" in error_message or "connection" in error_message:
-            return "Unable to connect to the Gemini API. Please check your internet connection."
-        elif "quota" in error_message or "limit" in error_message:
-            return "You've reached your API usage limit. Please try again later."
-        else:
+        if classified.user_message == GeminiError.user_message:
+            # No specific advice for this kind of error, so show its details
             ErrorHandler.log_error(error, "API Error")
-            return f"An error occurred while communicating with the AI service: {str(error)}"
+            return f"An error occurred while communicating with the AI service: {str(classified)}"
+        
+        logger.warning("API Error - %s: %s", type(classified).__name__, classified)
+        return classified.user_message
     
     @staticmethod
     def safe_execute(func: Callable, *args, **kwargs) -> tuple[bool, Any, Optional[Exception]]:
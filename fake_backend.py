@@ -0,0 +1,229 @@
+import asyncio
+import itertools
+import random
+import threading
+import time
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional
+
+class FakePart:
+    """A text part of a fake response"""
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeContent:
+    """The content of a fake response candidate"""
+    def __init__(self, text: str):
+        self.parts = [FakePart(text)]
+
+class FakeCandidate:
+    """A single candidate of a fake response"""
+    def __init__(self, text: str):
+        self.content = FakeContent(text)
+
+class FakeResponse:
+    """Mimics the shape of a Gemini GenerateContentResponse (or one streamed chunk of it)"""
+    def __init__(self, text: str):
+        self.candidates = [FakeCandidate(text)]
+        self.text = text
+
+class FakeTokenCount:
+    """Mimics the SDK's CountTokensResponse"""
+    def __init__(self, total_tokens: int):
+        self.total_tokens = total_tokens
+
+# Named like the SDK's exceptions so classify_error treats them the same way
+class ServiceUnavailable(Exception):
+    """Injected transient server failure"""
+
+class ResourceExhausted(Exception):
+    """Injected rate-limit failure"""
+
+class NotFound(Exception):
+    """A fake cached content that has expired or been deleted"""
+
+class FakeCachedContent:
+    """Mimics the SDK's caching.CachedContent: leading messages stored for reuse until expire_time"""
+    def __init__(self, name: str, model_name: str, contents: List[Dict[str, Any]], ttl: float):
+        self.name = name
+        self.model = model_name
+        self.contents = contents
+        self.expire_time = time.monotonic() + ttl
+        self.deleted = False
+
+    def check(self) -> None:
+        if self.deleted or time.monotonic() >= self.expire_time:
+            raise NotFound(f"CachedContent not found: {self.name}")
+
+class FakeGenerativeModel:
+    """
+    Local stand-in for genai.GenerativeModel that answers without any network access.
+
+    Replies are deterministic: the model echoes the last user message along
+    with the number of messages it was sent, so callers can check that the
+    chat history was passed through correctly.
+
+    For load tests the reply can be padded to `reply_words` words, streamed
+    at `tokens_per_second` (about one token per word), and a fraction of
+    calls can fail with retryable errors (`error_rate` when the call starts,
+    `stream_error_rate` part-way through a stream).
+
+    A model built for a FakeCachedContent (see FakeCacheProvider) prepends
+    the cached messages to whatever it is sent, and fails with NotFound
+    once that content has expired, like the real API.
+    """
+    def __init__(self, model_name: str, safety_settings: Optional[List[Dict[str, str]]] = None,
+                 generation_config: Optional[Dict[str, Any]] = None,
+                 latency: float = 0.0, chunk_delay: float = 0.0, jitter: float = 0.0,
+                 tokens_per_second: float = 0.0, reply_words: int = 0,
+                 error_rate: float = 0.0, stream_error_rate: float = 0.0, seed: Optional[int] = None,
+                 cached_content: Optional[FakeCachedContent] = None):
+        self.model_name = model_name
+        self.safety_settings = safety_settings
+        self.generation_config = generation_config
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.reply_words = reply_words
+        self.error_rate = error_rate
+        self.stream_error_rate = stream_error_rate
+        self._random = random.Random(seed)
+        self.cached_content = cached_content
+
+    def _with_cached(self, contents: Any) -> Any:
+        """The full context: cached messages followed by the ones sent"""
+        if self.cached_content is None:
+            return contents
+        self.cached_content.check()
+        if isinstance(contents, str):
+            contents = [{"role": "user", "parts": [contents]}]
+        return self.cached_content.contents + list(contents)
+
+    def _reply(self, contents: Any) -> str:
+        if isinstance(contents, list) and contents:
+            last = contents[-1]
+            text = last["parts"][0] if isinstance(last, dict) else str(last)
+            reply = f"You said: {text} ({len(contents)} messages in context)"
+        else:
+            reply = f"You said: {contents}"
+        padding = self.reply_words - len(reply.split(" "))
+        if padding > 0:
+            reply += " " + " ".join(f"word{i}" for i in range(padding))
+        return reply
+
+    def _start_delay(self) -> float:
+        """Latency before the reply starts, raising an injected error if one is due"""
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise self._random.choice((ServiceUnavailable, ResourceExhausted))("Injected failure")
+        return self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def _chunk_delay(self, chunk: str) -> float:
+        if self.tokens_per_second:
+            return max(1, len(chunk.split())) / self.tokens_per_second
+        return self.chunk_delay
+
+    def _fails_mid_stream(self) -> bool:
+        return bool(self.stream_error_rate) and self._random.random() < self.stream_error_rate
+
+    @staticmethod
+    def _chunks(text: str) -> List[str]:
+        words = text.split(" ")
+        return [word + " " for word in words[:-1]] + [words[-1]]
+
+    def count_tokens(self, contents: Any, **kwargs) -> FakeTokenCount:
+        """Count whitespace-separated words as tokens"""
+        if isinstance(contents, str):
+            return FakeTokenCount(len(contents.split()))
+        return FakeTokenCount(sum(len(str(part).split()) for message in contents for part in message["parts"]))
+
+    def generate_content(self, contents: Any, stream: bool = False, **kwargs) -> Any:
+        """Return a fake response, or an iterator of fake chunks when stream=True"""
+        contents = self._with_cached(contents)
+        time.sleep(self._start_delay())
+        reply = self._reply(contents)
+        if stream:
+            return self._stream(reply)
+        if self.tokens_per_second:
+            time.sleep(len(reply.split()) / self.tokens_per_second)
+        return FakeResponse(reply)
+
+    def _stream(self, reply: str) -> Iterator[FakeResponse]:
+        chunks = self._chunks(reply)
+        fail_at = self._random.randrange(len(chunks)) if self._fails_mid_stream() else None
+        for index, chunk in enumerate(chunks):
+            if index == fail_at:
+                raise ServiceUnavailable("Injected failure mid-stream")
+            time.sleep(self._chunk_delay(chunk))
+            yield FakeResponse(chunk)
+
+    async def generate_content_async(self, contents: Any, stream: bool = False, **kwargs) -> Any:
+        """Async version of generate_content"""
+        contents = self._with_cached(contents)
+        await asyncio.sleep(self._start_delay())
+        reply = self._reply(contents)
+        if stream:
+            return self._stream_async(reply)
+        if self.tokens_per_second:
+            await asyncio.sleep(len(reply.split()) / self.tokens_per_second)
+        return FakeResponse(reply)
+
+    async def _stream_async(self, reply: str) -> AsyncIterator[FakeResponse]:
+        chunks = self._chunks(reply)
+        fail_at = self._random.randrange(len(chunks)) if self._fails_mid_stream() else None
+        for index, chunk in enumerate(chunks):
+            if index == fail_at:
+                raise ServiceUnavailable("Injected failure mid-stream")
+            await asyncio.sleep(self._chunk_delay(chunk))
+            yield FakeResponse(chunk)
+
+class FakeCacheProvider:
+    """
+    Local stand-in for the API's cached-content facility (see context_cache.GeminiCacheProvider).
+
+    Cached contents live in memory until their TTL runs out; `created` and
+    `messages_cached` let tests check what was registered.
+    """
+    def __init__(self, **options):
+        self.options = options
+        self.caches: Dict[str, FakeCachedContent] = {}
+        self.created = 0
+        self.messages_cached = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def create(self, model_name: str, contents: List[Dict[str, Any]], ttl: float) -> FakeCachedContent:
+        with self._lock:
+            handle = FakeCachedContent(f"cachedContents/fake-{next(self._ids)}", model_name, list(contents), ttl)
+            self.caches[handle.name] = handle
+            self.created += 1
+            self.messages_cached += len(contents)
+        return handle
+
+    def extend(self, handle: FakeCachedContent, ttl: float) -> None:
+        handle.check()
+        handle.expire_time = time.monotonic() + ttl
+
+    def delete(self, handle: FakeCachedContent) -> None:
+        with self._lock:
+            handle.deleted = True
+            self.caches.pop(handle.name, None)
+
+    def expire_all(self) -> None:
+        """Make every cached content expire now, as if its TTL had run out"""
+        with self._lock:
+            for handle in self.caches.values():
+                handle.expire_time = time.monotonic()
+
+    def model_for(self, model_name: str, handle: FakeCachedContent) -> FakeGenerativeModel:
+        return FakeGenerativeModel(model_name, cached_content=handle, **self.options)
+
+def install_fake_backend(registry: Any, **options) -> None:
+    """
+    Make a ModelRegistry build FakeGenerativeModel instances, and emulate cached contents.
+
+    Args:
+        registry (ModelRegistry): The registry to patch, usually chat_logic.model_registry
+        **options: Extra FakeGenerativeModel arguments such as latency, tokens_per_second and error_rate
+    """
+    registry.set_factory(lambda model_name, **kwargs: FakeGenerativeModel(model_name, **kwargs, **options))
+    registry.set_cache_provider(FakeCacheProvider(**options))
@@ -1,87 +1,446 @@
 import tkinter as tk
 from tkinter import scrolledtext, ttk, messagebox, filedialog
-import threading
+import argparse
+import itertools
 import os
+import queue
 import sys
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
 
-from chat_logic import chat_with_gemini, clear_chat_history
+from startup_profile import startup_profile
+
+with startup_profile.phase("import chat_logic"):
+    from chat_logic import (CancellableRequest, attach_document, clear_chat_history, conversation_store,
+                            get_stats, persist_session, search_conversations, warmup)
 from error_handler import ErrorHandler, logger
 
+class UIConfig:
+    """Configuration for the GUI update pump"""
+    FRAME_MS = 16
+    MAX_UPDATES_PER_FRAME = 1000
+    # Messages kept in the chat window; older ones are paged in from the conversation store on scroll
+    # At least 2, so the exchange being streamed always fits
+    MAX_VISIBLE_MESSAGES = max(2, int(os.getenv("JARVIS_GUI_MAX_MESSAGES", "200")))
+    PAGE_MESSAGES = 50
+    STATS_REFRESH_MS = 2000
+
+def format_ms(seconds):
+    """Format a duration in seconds as milliseconds, or '-' if unknown"""
+    return "-" if seconds is None else f"{seconds * 1000:.0f} ms"
+
 class ChatApp:
-    """Main chat application class"""
+    """
+    Main chat application class
+    
+    The chat window is a view over the session's conversation store. It
+    holds at most UIConfig.MAX_VISIBLE_MESSAGES messages, each starting at a
+    Tk mark; messages scrolled out of that window are dropped from the
+    widget and paged back in from the store when the user scrolls to them.
+    
+    Messages typed while a reply is streaming are queued and sent as soon as
+    it finishes. Stop (or Escape) cancels the reply in progress; nothing from
+    a cancelled exchange is added to the chat history.
+    """
     def __init__(self, root):
         self.root = root
+        # UI updates posted from other threads, applied by _pump on the Tk thread
+        self.ui_queue = queue.Queue()
+        # [mark, stored] for each message in the chat window, oldest first
+        self.messages = deque()
+        self._mark_ids = itertools.count()
+        # The request whose reply is streaming, and messages typed ahead of it
+        self.current_request = None
+        self.pending_messages = deque()
+        # The [mark, stored] entries of the streaming exchange's user message and reply
+        self.exchange = None
+        self.reply_visible = False
+        self.start_session()
         self.setup_ui()
         self.show_welcome_message()
         self.is_processing = False
-        
+        self.root.after(UIConfig.FRAME_MS, self._pump)
+        self.root.after(UIConfig.STATS_REFRESH_MS, self.refresh_stats)
+    
+    def post(self, callback, *args):
+        """Schedule a UI update from any thread; it runs on the Tk thread at the next frame"""
+        self.ui_queue.put((callback, args))
+    
+    def _pump(self):
+        """Apply queued UI updates on the Tk thread, once per frame"""
+        try:
+            self.apply_ui_updates()
+        finally:
+            self.root.after(UIConfig.FRAME_MS, self._pump)
+    
+    def apply_ui_updates(self):
+        """
+        Apply the UI updates queued so far.
+        
+        Consecutive appends with the same tag (e.g. streamed chunks) are merged,
+        so a burst of small chunks costs one widget update per frame.
+        """
+        runs = []
+        try:
+            for _ in range(UIConfig.MAX_UPDATES_PER_FRAME):
+                try:
+                    callback, args = self.ui_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if callback == self.append_to_message or callback == self.append_to_reply:
+                    text, tag = args
+                    if runs and runs[-1][1] == tag and runs[-1][2] == callback:
+                        runs[-1][0] += text
+                    else:
+                        runs.append([text, tag, callback])
+                    continue
+                # Keep ordering: text queued before this update is written first
+                if runs:
+                    self._write_appends(runs)
+                    runs = []
+                callback(*args)
+            if runs:
+                self._write_appends(runs)
+        except Exception as e:
+            logger.error("Error applying UI update: %s", e)
+        
+    def _write_appends(self, runs):
+        """Write merged [text, tag, append method] runs, grouped by the method they were posted for"""
+        for append, group in itertools.groupby(runs, key=lambda run: run[2]):
+            texts = [(text, tag) for text, tag, _ in group]
+            if append == self.append_to_reply:
+                if self.reply_visible:
+                    self._insert_runs(texts, "reply_end")
+            else:
+                self._insert_runs(texts)
+    
     def send_message(self, event=None):
-        """Send user message and get AI response"""
+        """Send the typed message, or queue it if a reply is still streaming"""
         user_input = self.user_entry.get()
-        if not user_input.strip() or self.is_processing:
+        if not user_input.strip():
             return
-        
-        self.is_processing = True
-        
-        # Disable input during processing
-        self.user_entry.config(state=tk.DISABLED)
-        self.send_button.config(state=tk.DISABLED)
-        self.status_label.config(text="Processing...", foreground="#FF6600")
-        
-        # Display user message
-        self.display_message("User", user_input, "user_msg")
-        
-        # Clear input field
         self.user_entry.delete(0, tk.END)
         
-        # Use threading to prevent UI freezing
-        threading.Thread(target=self.get_ai_response, args=(user_input,), daemon=True).start()
+        if self.is_processing:
+            self.pending_messages.append(user_input)
+            self.show_processing_status()
+            return
+        self.get_ai_response(user_input)
     
     def get_ai_response(self, user_input):
-        """Get AI response in a separate thread"""
+        """Display a user message and stream the reply into the chat window"""
+        self.is_processing = True
+        self.stop_button.config(state=tk.NORMAL)
+        self.show_processing_status()
+        
+        # New messages go at the end of the conversation, so return there if scrolled back
+        if self.unshown_below:
+            self.show_latest()
+        user_message = self.display_message("User", user_input, "user_msg")
+        reply = self.begin_message("Jarvis", "ai_msg")
+        # Sending always brings the new exchange into view; the reply then follows it only while it stays there
+        self.chat_window.see(tk.END)
+        self.exchange = (user_message, reply)
+        self.reply_visible = True
+        # Chunks go in at this mark, so messages shown while the reply streams stay below it
+        self.chat_window.mark_set("reply_end", "end-1c")
+        self.chat_window.mark_gravity("reply_end", tk.RIGHT)
+        
+        # The request runs on the shared background event loop; each chunk is
+        # handed to the pump, which batches them per frame
+        request = CancellableRequest(
+            user_input, session_id=self.session_id,
+            on_chunk=lambda chunk: self.post(self.append_to_reply, chunk, "ai_msg")
+        )
+        self.current_request = request
+        request.add_done_callback(lambda finished: self.post(self.finish_response, finished))
+    
+    def finish_response(self, request):
+        """Show how a request ended, then send the next queued message"""
+        if request is not self.current_request:
+            # Abandoned by clear_chat
+            return
+        time_to_first_token = None
+        exchange = self.exchange
+        if request.cancelled():
+            self.append_to_reply(" [stopped]\n\n", "error_msg")
+        else:
+            self.append_to_reply("\n\n", "ai_msg")
+            try:
+                stream = request.result()
+                if stream.error_message:
+                    self.display_error(stream.error_message)
+                elif exchange is not None:
+                    # The exchange was committed, so both messages are now in the store
+                    self.mark_stored(exchange)
+                time_to_first_token = stream.time_to_first_token
+            except Exception as e:
+                self.display_error(ErrorHandler.handle_api_error(e))
+                logger.error("Error in get_ai_response: %s", e)
+        self._end_exchange()
+        
+        self.current_request = None
+        self.is_processing = False
+        if self.pending_messages:
+            self.get_ai_response(self.pending_messages.popleft())
+        else:
+            self.reset_ui_after_response(time_to_first_token, stopped=request.cancelled())
+    
+    def stop_response(self, event=None):
+        """Cancel the reply that is streaming; queued messages are still sent"""
+        if self.current_request is not None:
+            self.current_request.cancel()
+            self.status_label.config(text="Stopping...", foreground="#FF6600")
+    
+    def show_processing_status(self):
+        """Show that a reply is streaming and how many messages are queued behind it"""
+        text = "Processing..."
+        if self.pending_messages:
+            text += f" ({len(self.pending_messages)} queued)"
+        self.status_label.config(text=text, foreground="#FF6600")
+    
+    def start_warmup(self, report_profile=False):
+        """Load the model client on a background thread now that the window is showing"""
+        startup_profile.mark("first window")
+        threading.Thread(target=self._warm_up, args=(report_profile,), name="jarvis-warmup", daemon=True).start()
+    
+    def _warm_up(self, report_profile):
+        """Background part of start_warmup; reports a missing API key right away"""
         try:
-            # Get the AI's response
-            ai_response = chat_with_gemini(user_input)
-            
-            # Display AI response
-            self.display_message("Jarvis", ai_response, "ai_msg")
-            
+            warmup()
         except Exception as e:
-            error_msg = ErrorHandler.handle_api_error(e)
-            self.display_error(error_msg)
-            logger.error(f"Error in get_ai_response: {str(e)}")
-        finally:
-            # Re-enable input
-            self.root.after(0, self.reset_ui_after_response)
+            self.post(self.display_error, ErrorHandler.handle_api_error(e))
+        if report_profile:
+            print(startup_profile.report())
     
-    def reset_ui_after_response(self):
+    def reset_ui_after_response(self, time_to_first_token=None, stopped=False):
         """Reset UI elements after response processing"""
-        self.user_entry.config(state=tk.NORMAL)
-        self.send_button.config(state=tk.NORMAL)
-        self.status_label.config(text="Ready", foreground="black")
+        self.stop_button.config(state=tk.DISABLED)
+        if stopped:
+            self.status_label.config(text="Stopped", foreground="black")
+        elif time_to_first_token is not None:
+            self.status_label.config(text=f"Ready (first token in {time_to_first_token:.2f}s)", foreground="black")
+        else:
+            self.status_label.config(text="Ready", foreground="black")
         self.user_entry.focus()
-        self.is_processing = False
         
     def display_message(self, sender, message, tag):
-        """Display a message in the chat window"""
-        self.chat_window.config(state=tk.NORMAL)
+        """Display a message in the chat window; returns its [mark, stored] entry"""
+        entry = self.begin_message(sender, tag)
+        self.append_to_message(f"{message}\n\n", tag)
+        return entry
+    
+    def begin_message(self, sender, tag):
+        """
+        Start a new message in the chat window; its text is added with append_to_message.
+        
+        Returns:
+            list: The message's [mark, stored] entry
+        """
+        entry = [self._new_mark(self.chat_window.index("end-1c")), False]
+        self.messages.append(entry)
+        self._insert_runs(self._header_runs(sender, tag, datetime.now()))
+        self._keep_reply_above(entry)
+        self._trim_top(UIConfig.MAX_VISIBLE_MESSAGES)
+        return entry
+    
+    def _header_runs(self, sender, tag, when):
+        """The (text, tag) runs that start a message"""
+        runs = []
         
         # Add timestamp if enabled
         if hasattr(self, 'show_timestamp') and self.show_timestamp.get():
-            from datetime import datetime
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            self.chat_window.insert(tk.END, f"[{timestamp}] ", "timestamp")
+            runs.append((f"[{when.strftime('%H:%M:%S')}] ", "timestamp"))
         
-        # Insert the message
-        self.chat_window.insert(tk.END, f"{sender}: {message}\n\n", tag)
-        self.chat_window.config(state=tk.DISABLED)
-        self.chat_window.see(tk.END)
+        runs.append((f"{sender}: ", tag))
+        return runs
+    
+    def append_to_message(self, text, tag):
+        """Append text to the message currently being displayed (Tk thread only; use post elsewhere)"""
+        self._insert_runs([(text, tag)])
+    
+    def append_to_reply(self, text, tag):
+        """Append text to the streaming reply, even if other messages were shown below it (Tk thread only)"""
+        if self.reply_visible:
+            self._insert_runs([(text, tag)], "reply_end")
         
     def display_error(self, error_message):
         """Display an error message in the chat window"""
+        entry = [self._new_mark(self.chat_window.index("end-1c")), False]
+        self.messages.append(entry)
+        self._insert_runs([(f"System: {error_message}\n\n", "error_msg")])
+        self._keep_reply_above(entry)
+        self._trim_top(UIConfig.MAX_VISIBLE_MESSAGES)
+    
+    def _keep_reply_above(self, entry):
+        """Pin the streaming reply's insert point to the start of the first message shown after it"""
+        if self.reply_visible and len(self.messages) >= 2 and self.messages[-2] is self.exchange[1]:
+            self.chat_window.mark_set("reply_end", entry[0])
+    
+    def _end_exchange(self):
+        """Forget the streaming exchange once its reply is complete or discarded"""
+        if self.reply_visible:
+            self.chat_window.mark_unset("reply_end")
+        self.exchange = None
+        self.reply_visible = False
+    
+    def _insert_runs(self, runs, index=tk.END):
+        """
+        Insert (text, tag) runs in the chat window (at the end by default) in a single widget update.
+        
+        The view follows the new text only if it was already scrolled to the
+        bottom, so streamed replies don't pull the user away from older pages.
+        """
+        following = self.chat_window.yview()[1] >= 1.0
+        self.chat_window.config(state=tk.NORMAL)
+        for text, tag in runs:
+            self.chat_window.insert(index, text, tag)
+        self.chat_window.config(state=tk.DISABLED)
+        if following:
+            self.chat_window.see(tk.END)
+    
+    def start_session(self):
+        """Begin a new persistent session whose turns are saved to the conversation store"""
+        self.session_id = f"gui-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        persist_session(self.session_id)
+        # Stored messages before and after the range shown in the chat window
+        self.unshown_above = 0
+        self.unshown_below = 0
+    
+    def mark_stored(self, entries):
+        """Record that the given [mark, stored] entries have been written to the store"""
+        for entry in entries:
+            entry[1] = True
+            if not any(shown is entry for shown in self.messages):
+                # Trimmed off the top while unsaved; it is now a stored message above the window
+                self.unshown_above += 1
+    
+    def _new_mark(self, index):
+        """Create a mark that stays at the start of a message as text is added around it"""
+        mark = f"msg{next(self._mark_ids)}"
+        self.chat_window.mark_set(mark, index)
+        self.chat_window.mark_gravity(mark, tk.LEFT)
+        return mark
+    
+    def _trim_top(self, limit):
+        """Drop the oldest messages from the widget until at most `limit` remain"""
+        if len(self.messages) <= limit:
+            return
+        self.chat_window.config(state=tk.NORMAL)
+        while len(self.messages) > limit:
+            entry = self.messages.popleft()
+            mark, stored = entry
+            self.chat_window.delete(mark, self.messages[0][0])
+            self.chat_window.mark_unset(mark)
+            if stored:
+                self.unshown_above += 1
+            if self.reply_visible and entry is self.exchange[1]:
+                # The streaming reply was trimmed away; the rest of it is not shown
+                self.chat_window.mark_unset("reply_end")
+                self.reply_visible = False
+        self.chat_window.config(state=tk.DISABLED)
+    
+    def _trim_bottom(self, limit):
+        """Drop the newest messages from the widget until at most `limit` remain"""
+        if len(self.messages) <= limit or self.is_processing:
+            return
+        self.chat_window.config(state=tk.NORMAL)
+        while len(self.messages) > limit:
+            mark, stored = self.messages.pop()
+            self.chat_window.delete(mark, "end-1c")
+            self.chat_window.mark_unset(mark)
+            if stored:
+                self.unshown_below += 1
+        self.chat_window.config(state=tk.DISABLED)
+    
+    def _record_runs(self, record):
+        """The (text, tag) runs that display a stored turn"""
+        if record["role"] == "user":
+            sender, tag = "User", "user_msg"
+        else:
+            sender, tag = "Jarvis", "ai_msg"
+        runs = self._header_runs(sender, tag, datetime.fromtimestamp(record["ts"]))
+        runs.append((f"{record['content']}\n\n", tag))
+        return runs
+    
+    def _on_scroll(self, first, last):
+        """Scrollbar callback: page in stored messages when the view reaches either end"""
+        self.chat_window.vbar.set(first, last)
+        first, last = float(first), float(last)
+        if first <= 0.0 and last < 1.0 and self.unshown_above:
+            self.root.after_idle(self.page_older)
+        elif last >= 1.0 and first > 0.0 and self.unshown_below:
+            self.root.after_idle(self.page_newer)
+    
+    def page_older(self):
+        """Insert the previous page of stored messages at the top of the chat window"""
+        if not self.unshown_above or not self.messages:
+            return
+        start = max(0, self.unshown_above - UIConfig.PAGE_MESSAGES)
+        records = conversation_store.read_turns(self.session_id, start, self.unshown_above)
+        first_mark = self.messages[0][0]
+        
+        self.chat_window.config(state=tk.NORMAL)
+        # A right-gravity mark moves past each insert, so the page is written in order
+        self.chat_window.mark_set("page_insert", "1.0")
+        self.chat_window.mark_gravity("page_insert", tk.RIGHT)
+        page = []
+        for record in records:
+            page.append([self._new_mark("page_insert"), True])
+            for text, tag in self._record_runs(record):
+                self.chat_window.insert("page_insert", text, tag)
+        self.chat_window.mark_set(first_mark, "page_insert")
+        self.chat_window.mark_unset("page_insert")
+        self.chat_window.config(state=tk.DISABLED)
+        
+        self.messages.extendleft(reversed(page))
+        self.unshown_above = start
+        self._trim_bottom(max(UIConfig.MAX_VISIBLE_MESSAGES, len(page) + 1))
+        # Keep the message the user was reading in view
+        self.chat_window.yview(first_mark)
+    
+    def page_newer(self):
+        """Append the next page of stored messages to the bottom of the chat window"""
+        if not self.unshown_below:
+            return
+        total = conversation_store.turn_count(self.session_id)
+        start = total - self.unshown_below
+        records = conversation_store.read_turns(self.session_id, start, start + UIConfig.PAGE_MESSAGES)
+        last_mark = self.messages[-1][0] if self.messages else None
+        
+        self.chat_window.config(state=tk.NORMAL)
+        for record in records:
+            self.messages.append([self._new_mark("end-1c"), True])
+            for text, tag in self._record_runs(record):
+                self.chat_window.insert(tk.END, text, tag)
+        self.chat_window.config(state=tk.DISABLED)
+        
+        self.unshown_below -= len(records)
+        self._trim_top(max(UIConfig.MAX_VISIBLE_MESSAGES, len(records) + 1))
+        if last_mark is not None:
+            self.chat_window.yview(last_mark)
+    
+    def _reset_window(self):
+        """Empty the chat window"""
         self.chat_window.config(state=tk.NORMAL)
-        self.chat_window.insert(tk.END, f"System: {error_message}\n\n", "error_msg")
+        for mark, _ in self.messages:
+            self.chat_window.mark_unset(mark)
+        self.chat_window.delete(1.0, tk.END)
         self.chat_window.config(state=tk.DISABLED)
+        self.messages.clear()
+        self._end_exchange()
+    
+    def show_latest(self):
+        """Show the most recent stored messages, e.g. before adding a new one"""
+        self._reset_window()
+        total = conversation_store.turn_count(self.session_id)
+        self.unshown_above = max(0, total - UIConfig.MAX_VISIBLE_MESSAGES)
+        self.unshown_below = total - self.unshown_above
+        while self.unshown_below:
+            self.page_newer()
         self.chat_window.see(tk.END)
 
 
@@ -89,13 +448,22 @@ class ChatApp:
         """Clear the chat window and history"""
         result = messagebox.askyesno("Clear Chat", "Are you sure you want to clear the chat history?")
         if result:
+            # Drop the reply in progress and anything typed ahead of it
+            self.pending_messages.clear()
+            if self.current_request is not None:
+                self.current_request.cancel()
+                self.current_request = None
+                self.is_processing = False
+                self.reset_ui_after_response()
+                # Write out chunks that arrived before the cancel, so they go with the old window
+                self.apply_ui_updates()
+            
             # Clear the chat window
-            self.chat_window.config(state=tk.NORMAL)
-            self.chat_window.delete(1.0, tk.END)
-            self.chat_window.config(state=tk.DISABLED)
+            self._reset_window()
             
-            # Clear the chat history in the backend
-            message = clear_chat_history()
+            # Clear the chat history in the backend; the cleared conversation stays in the store
+            message = clear_chat_history(self.session_id)
+            self.start_session()
             
             # Show confirmation
             self.status_label.config(text=message)
@@ -104,8 +472,8 @@ class ChatApp:
             self.show_welcome_message()
     
     def save_chat(self):
-        """Save chat history to a text file"""
-        if self.chat_window.get(1.0, tk.END).strip() == "":
+        """Export the session's chat history from the conversation store to a text file"""
+        if not conversation_store.turn_count(self.session_id):
             messagebox.showinfo("Info", "No chat history to save.")
             return
             
@@ -118,12 +486,87 @@ class ChatApp:
         if file_path:
             try:
                 with open(file_path, "w", encoding="utf-8") as file:
-                    file.write(self.chat_window.get(1.0, tk.END))
+                    conversation_store.export(self.session_id, file)
                 self.status_label.config(text=f"Chat saved to {os.path.basename(file_path)}")
             except Exception as e:
                 ErrorHandler.log_error(e, "Error saving chat history")
                 messagebox.showerror("Error", f"Failed to save chat history: {str(e)}")
     
+    def attach_file(self):
+        """Pick a text file and attach it to the conversation; it is indexed on a background thread"""
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Text files", "*.txt *.md *.log *.csv *.json *.py"), ("All files", "*.*")],
+            title="Attach File"
+        )
+        if not file_path:
+            return
+        self.status_label.config(text=f"Indexing {os.path.basename(file_path)}...", foreground="#FF6600")
+        threading.Thread(target=self._attach, args=(file_path, self.session_id),
+                         name="jarvis-attach", daemon=True).start()
+    
+    def _attach(self, file_path, session_id):
+        """Background part of attach_file"""
+        try:
+            document = attach_document(file_path, session_id)
+        except (OSError, ValueError) as e:
+            ErrorHandler.log_error(e, "Error attaching file")
+            self.post(self.finish_attach, session_id, None, f"Could not attach {os.path.basename(file_path)}: {e}")
+            return
+        self.post(self.finish_attach, session_id, document, None)
+    
+    def finish_attach(self, session_id, document, error_message):
+        """Report the outcome of attach_file (Tk thread)"""
+        if error_message is not None:
+            self.display_error(error_message)
+        elif session_id != self.session_id:
+            # The chat was cleared while indexing; the file went with the old conversation
+            self.display_error(f"{document.name} was not attached because the chat was cleared.")
+        else:
+            self.display_message("Jarvis", f"Attached {document.name} ({document.chunk_count} chunks). "
+                                 "Relevant parts will be sent with your questions.", "ai_msg")
+        if not self.is_processing:
+            self.status_label.config(text="Ready", foreground="black")
+    
+    def search_history(self, event=None):
+        """Search all saved conversations for the words in the search box, on a background thread"""
+        query = self.search_entry.get().strip()
+        if not query:
+            return
+        self.status_label.config(text="Searching...", foreground="#FF6600")
+        threading.Thread(target=self._search, args=(query,), name="jarvis-search", daemon=True).start()
+    
+    def _search(self, query):
+        """Background part of search_history"""
+        started = time.perf_counter()
+        try:
+            hits, error_message = search_conversations(query), None
+        except Exception as e:
+            ErrorHandler.log_error(e, "Error searching conversations")
+            hits, error_message = [], str(e)
+        self.post(self.show_search_results, query, hits, time.perf_counter() - started, error_message)
+    
+    def show_search_results(self, query, hits, elapsed, error_message):
+        """Show search hits in their own window (Tk thread)"""
+        if not self.is_processing:
+            self.status_label.config(text="Ready", foreground="black")
+        if error_message is not None:
+            messagebox.showerror("Search", error_message)
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title(f"Search: {query}")
+        window.geometry("650x450")
+        results = scrolledtext.ScrolledText(window, wrap=tk.WORD, font=("Segoe UI", 10), padx=10, pady=10)
+        results.pack(fill=tk.BOTH, expand=True)
+        results.tag_configure("timestamp", foreground="#666666")
+        results.insert(tk.END, f"{len(hits)} match(es) for '{query}' in {format_ms(elapsed)}\n\n", "timestamp")
+        for hit in hits:
+            when = datetime.fromtimestamp(hit["ts"]).strftime("%Y-%m-%d %H:%M")
+            sender = "User" if hit["role"] == "user" else "Jarvis"
+            results.insert(tk.END, f"{hit['session_id']}  #{hit['turn']}  {when}\n", "timestamp")
+            results.insert(tk.END, f"{sender}: {' '.join(hit['snippet'].split())}\n\n")
+        results.config(state=tk.DISABLED)
+    
     def toggle_theme(self):
         """Toggle between light and dark theme"""
         if self.theme_var.get() == "dark":
@@ -170,6 +613,15 @@ class ChatApp:
         # Menu bar
         self.create_menu_bar()
         
+        # Search box for saved conversations
+        self.search_frame = ttk.Frame(self.main_frame)
+        self.search_frame.pack(padx=10, pady=(0, 5), fill=tk.X)
+        self.search_entry = ttk.Entry(self.search_frame, font=("Segoe UI", 10))
+        self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
+        self.search_entry.bind("<Return>", self.search_history)
+        self.search_button = ttk.Button(self.search_frame, text="Search History", command=self.search_history)
+        self.search_button.pack(side=tk.RIGHT)
+        
         # Chat window with custom tags for styling
         self.chat_window = scrolledtext.ScrolledText(
             self.main_frame, 
@@ -180,6 +632,7 @@ class ChatApp:
             height=20
         )
         self.chat_window.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+        self.chat_window.config(yscrollcommand=self._on_scroll)
         
         # Configure tags for message styling
         self.chat_window.tag_configure("user_msg", foreground="#003366", font=("Segoe UI", 10, "bold"))
@@ -199,6 +652,10 @@ class ChatApp:
         self.save_button = ttk.Button(self.button_frame, text="Save Chat", command=self.save_chat)
         self.save_button.pack(side=tk.LEFT, padx=5)
         
+        # Attach button
+        self.attach_button = ttk.Button(self.button_frame, text="Attach File", command=self.attach_file)
+        self.attach_button.pack(side=tk.LEFT, padx=5)
+        
         # Theme toggle
         self.theme_var = tk.StringVar(value="light")
         self.theme_check = ttk.Checkbutton(
@@ -223,11 +680,42 @@ class ChatApp:
         self.user_entry = ttk.Entry(self.entry_frame, font=("Segoe UI", 10))
         self.user_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
         self.user_entry.bind("<Return>", self.send_message)
+        self.user_entry.bind("<Escape>", self.stop_response)
         self.user_entry.focus()
         
+        # Stop button, enabled while a reply is streaming
+        self.stop_button = ttk.Button(self.entry_frame, text="Stop", command=self.stop_response, state=tk.DISABLED)
+        self.stop_button.pack(side=tk.RIGHT, padx=(5, 0))
+        
         # Send button
         self.send_button = ttk.Button(self.entry_frame, text="Send", command=self.send_message)
         self.send_button.pack(side=tk.RIGHT)
+        
+        # Statistics panel
+        self.stats_label = ttk.Label(self.main_frame, text="No requests yet", font=("Segoe UI", 8),
+                                     foreground="#666666")
+        self.stats_label.pack(padx=10, pady=(0, 5), anchor=tk.W)
+    
+    def refresh_stats(self):
+        """Update the statistics panel from the request metrics"""
+        try:
+            stats = get_stats()
+            duration = stats["jarvis_request_duration_seconds"]
+            if stats["jarvis_requests_total"]:
+                parts = [
+                    f"Requests: {stats['jarvis_requests_total']:.0f}",
+                    f"p50 {format_ms(duration['p50'])}",
+                    f"p95 {format_ms(duration['p95'])}",
+                    f"first token {format_ms(stats['jarvis_time_to_first_token_seconds']['p50'])}",
+                    f"cache hits: {stats['jarvis_response_cache_hits_total']:.0f}",
+                    f"errors: {stats['jarvis_request_errors_total']:.0f}",
+                    f"retries: {stats['jarvis_retries_total']:.0f}"
+                ]
+                self.stats_label.config(text="  |  ".join(parts))
+        except Exception as e:
+            logger.error("Error refreshing statistics: %s", e)
+        finally:
+            self.root.after(UIConfig.STATS_REFRESH_MS, self.refresh_stats)
     
     def create_menu_bar(self):
         """Create the application menu bar"""
@@ -236,6 +724,7 @@ class ChatApp:
         # File menu
         file_menu = tk.Menu(menubar, tearoff=0)
         file_menu.add_command(label="Save Chat", command=self.save_chat)
+        file_menu.add_command(label="Attach File...", command=self.attach_file)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit)
         menubar.add_cascade(label="File", menu=file_menu)
@@ -272,8 +761,16 @@ Version: 1.0.0
 Created with ❤️ using Python and Tkinter."""
         messagebox.showinfo("About Jarvis AI Assistant", about_text)
 
-def main():
+def parse_args(argv=None):
+    """Parse command-line options"""
+    parser = argparse.ArgumentParser(description="Jarvis AI Assistant (Graphical Interface)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Print how long imports, client setup and showing the window took")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main function to start the application"""
+    args = parse_args(argv)
     try:
         # Create the root window
         root = tk.Tk()
@@ -286,10 +783,12 @@ def main():
             if os.path.exists(icon_path):
                 root.iconbitmap(icon_path)
         except Exception as e:
-            logger.warning(f"Could not load application icon: {e}")
+            logger.warning("Could not load application icon: %s", e)
         
         # Create and start the app
         app = ChatApp(root)
+        # Runs once the window has been drawn, so the SDK loads while the user reads it
+        root.after_idle(app.start_warmup, args.profile_startup)
         root.mainloop()
         
     except Exception as e:
@@ -1,9 +1,19 @@
+import argparse
 import os
+import queue
 import sys
+import threading
+import time
 from datetime import datetime
 
-from chat_logic import chat_with_gemini, clear_chat_history
+from startup_profile import startup_profile
+
+with startup_profile.phase("import chat_logic"):
+    from chat_logic import (CancellableRequest, attach_document, backend_stats, clear_chat_history,
+                            conversation_store, detach_documents, get_stats, list_saved_sessions,
+                            persist_session, resume_session, search_conversations, warmup)
 from error_handler import ErrorHandler, logger
+from batch_runner import BatchConfig, run_batch
 
 
 try:
@@ -19,7 +29,13 @@ class CommandHandler:
     COMMANDS = {
         "/help": "Show this help message",
         "/clear": "Clear chat history",
-        "/save": "Save chat history to a file",
+        "/save": "Flush this session's saved history to disk",
+        "/sessions": "List saved sessions",
+        "/resume": "Resume a saved session (/resume <id>)",
+        "/search": "Search all saved sessions (/search <words>; word* matches prefixes)",
+        "/stats": "Show request latency, token and cache statistics",
+        "/attach": "Attach a text file; relevant parts are sent with each question (/attach <file>)",
+        "/detach": "Remove all attached files",
         "/exit": "Exit the program (also /quit or bye)"
     }
     
@@ -30,39 +46,205 @@ class CommandHandler:
         print("Available commands:")
         for cmd, desc in CommandHandler.COMMANDS.items():
             print(f"  {cmd:<10} - {desc}")
+        print("Press Ctrl-C while Jarvis is answering to cancel just that request.")
         print("="*50 + "\n")
 
-def save_chat_history(chat_log):
-    """Save chat history to a file"""
-    if not chat_log:
+def save_chat_history(session_id):
+    """Make sure a session's incrementally saved turns are on disk"""
+    if not conversation_store.turn_count(session_id):
         print("Jarvis: No chat history to save.")
         return
     
-    #
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"chat_history_{timestamp}.txt"
-    
     try:
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write("\n".join(chat_log))
-        print(f"Jarvis: Chat history saved to {filename}")
+        conversation_store.sync(session_id)
+        print(f"Jarvis: Chat history is saved to {conversation_store.segment_path(session_id)}")
     except Exception as e:
         error_msg = f"Failed to save chat history: {str(e)}"
         ErrorHandler.log_error(e, "Error saving chat history")
         print(f"Jarvis: {error_msg}")
 
+def print_sessions():
+    """Print the saved sessions, most recent first"""
+    sessions = list_saved_sessions()
+    if not sessions:
+        print("Jarvis: No saved sessions.")
+        return
+    print("\n" + "="*50)
+    print("Saved sessions:")
+    for session in sessions:
+        updated = datetime.fromtimestamp(session["updated"]).strftime("%Y-%m-%d %H:%M")
+        print(f"  {session['session_id']:<28} {session['turns']:>5} messages  {updated}")
+    print("="*50 + "\n")
+
+def print_search_results(query):
+    """Search the saved sessions and print the ranked hits"""
+    started = time.perf_counter()
+    try:
+        hits = search_conversations(query)
+    except RuntimeError as e:
+        print(f"Jarvis: {e}")
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if not hits:
+        print(f"Jarvis: No saved messages match '{query}'.")
+        return
+    print("\n" + "="*50)
+    print(f"{len(hits)} match(es) for '{query}' ({elapsed_ms:.1f} ms):")
+    for hit in hits:
+        when = datetime.fromtimestamp(hit["ts"]).strftime("%Y-%m-%d %H:%M")
+        sender = "User" if hit["role"] == "user" else "Jarvis"
+        snippet = " ".join(hit["snippet"].split())
+        print(f"  {hit['session_id']}  #{hit['turn']}  {when}  {sender}: {snippet}")
+    print("Use /resume <session id> to continue one of these sessions.")
+    print("="*50 + "\n")
+
+def attach_file(path, session_id):
+    """Index a file and attach it to the session"""
+    try:
+        document = attach_document(path, session_id)
+        print(f"Jarvis: Attached {document.name} ({document.chunk_count} chunks). "
+              "Relevant parts will be sent with your questions.")
+    except (OSError, ValueError) as e:
+        ErrorHandler.log_error(e, "Error attaching file")
+        print(f"Jarvis: Could not attach {path}: {e}")
+
+def format_seconds(value):
+    """Format a duration in seconds as milliseconds, or '-' if unknown"""
+    return "-" if value is None else f"{value * 1000:.0f} ms"
+
+def print_stats():
+    """Print request metrics collected in this process"""
+    stats = get_stats()
+    duration = stats["jarvis_request_duration_seconds"]
+    first_token = stats["jarvis_time_to_first_token_seconds"]
+    errors = stats["jarvis_request_errors_total"]
+    print("\n" + "="*50)
+    print(f"Requests:            {duration['count']} completed, {errors:.0f} failed")
+    print(f"Latency:             p50 {format_seconds(duration['p50'])}, p95 {format_seconds(duration['p95'])}, "
+          f"p99 {format_seconds(duration['p99'])}")
+    print(f"Time to first token: p50 {format_seconds(first_token['p50'])}, p95 {format_seconds(first_token['p95'])}")
+    for label, name in (("Input tokens", "jarvis_request_input_tokens"),
+                        ("Output tokens", "jarvis_request_output_tokens"),
+                        ("History messages", "jarvis_history_messages")):
+        mean = stats[name]["mean"]
+        print(f"{label + ':':<20} mean {'-' if mean is None else f'{mean:.0f}'}")
+    print(f"Cache hits:          {stats['jarvis_response_cache_hits_total']:.0f} "
+          f"(misses {stats['jarvis_response_cache_misses_total']:.0f})")
+    print(f"Retries:             {stats['jarvis_retries_total']:.0f}"
+          f"{' (circuit breaker open)' if stats['jarvis_circuit_breaker_open'] else ''}")
+    backends = backend_stats()
+    routes = backends.get("routes")
+    if routes:
+        print("Routes:")
+        for name, route in routes.items():
+            print(f"  {name:<6} {route['requests']} requests ({route['hinted']} hinted, {route['failures']} failed), "
+                  f"p50 {format_ms(route['latency_p50_ms'])}, p90 {format_ms(route['latency_p90_ms'])} "
+                  f"(SLO {route['latency_slo']:g} s)")
+        for backend in backends["backends"]:
+            print(f"    {backend['route']:<6} {backend['name']}: {backend['calls']} calls, "
+                  f"{backend['failures']} failures{' (over SLO or failing)' if backend['degraded'] else ''}")
+    print("="*50 + "\n")
+
+def format_ms(value):
+    """Format a duration already in milliseconds, or '-' if unknown"""
+    return "-" if value is None else f"{value:.0f} ms"
+
+def warm_up_client():
+    """Load the Gemini SDK and model client in the background while the user types"""
+    try:
+        warmup()
+    except Exception as e:
+        ErrorHandler.log_error(e, "Error warming up the model client")
+
 def print_with_timestamp(sender, message):
     """Print a message with a timestamp"""
     timestamp = datetime.now().strftime("%H:%M:%S")
     print(f"[{timestamp}] {sender}: {message}")
     return f"[{timestamp}] {sender}: {message}"
 
-def main():
+def print_streamed_response(sender, user_message, session_id):
+    """
+    Send a message and print the reply chunk by chunk as it arrives.
+    
+    The request runs on the background event loop, so Ctrl-C cancels just
+    this request: its connection is dropped, the chat history is left as it
+    was, and the prompt comes back.
+    """
+    chunks = queue.Queue()
+    request = CancellableRequest(user_message, session_id=session_id, on_chunk=chunks.put)
+    # None marks the end, queued after the last chunk
+    request.add_done_callback(lambda _: chunks.put(None))
+    
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] {sender}: ", end="", flush=True)
+    
+    while True:
+        try:
+            # Wait with a timeout so Ctrl-C is noticed on every platform
+            chunk = chunks.get(timeout=0.1)
+            if chunk is None:
+                break
+            print(chunk, end="", flush=True)
+        except queue.Empty:
+            continue
+        except KeyboardInterrupt:
+            request.cancel()
+    
+    if request.cancelled():
+        print("\n[Request cancelled]")
+        return f"[{timestamp}] {sender}: [Request cancelled]"
+    
+    stream = request.result()
+    if stream.error_message:
+        # Any partially streamed text was discarded from the chat history
+        if stream.time_to_first_token is not None:
+            print()
+        print(stream.error_message)
+        return f"[{timestamp}] {sender}: {stream.error_message}"
+    
+    print()
+    return f"[{timestamp}] {sender}: {stream.text}"
+
+def parse_args(argv=None):
+    """Parse command-line options"""
+    parser = argparse.ArgumentParser(description="Jarvis AI Assistant (Command Line Interface)")
+    parser.add_argument("--batch", metavar="IN_JSONL",
+                        help="Run the prompts in a JSONL file instead of starting an interactive chat")
+    parser.add_argument("--out", metavar="OUT_JSONL",
+                        help="Where to write batch results; an existing file is resumed")
+    parser.add_argument("--workers", type=int, default=BatchConfig.WORKERS,
+                        help="Number of concurrent requests in batch mode")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Print how long imports, client setup and reaching the prompt took")
+    args = parser.parse_args(argv)
+    if args.batch and not args.out:
+        parser.error("--batch requires --out")
+    return args
+
+def run_batch_mode(args):
+    """Run a batch file and report throughput"""
+    print(f"Running batch {args.batch} -> {args.out} with {args.workers} worker(s)...")
+    try:
+        stats = run_batch(args.batch, args.out, args.workers)
+    except OSError as e:
+        ErrorHandler.log_error(e, "Error running batch")
+        print(f"Batch failed: {str(e)}")
+        return 1
+    print(stats.summary())
+    if stats.failed:
+        print(f"Errors were written to {args.out}.errors")
+    return 1 if stats.interrupted else 0
+
+def main(argv=None):
     """Main function for the command-line interface"""
+    args = parse_args(argv)
+    if args.batch:
+        return run_batch_mode(args)
     
-    chat_log = []
+    session_id = f"cli-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
     
     try:
+        persist_session(session_id)
        
         print("\n" + "="*50)
         print("Welcome to Jarvis AI Assistant (Command Line Interface)")
@@ -70,8 +252,7 @@ def main():
         
        
         welcome_msg = "Hi, I am Jarvis. How may I help you?"
-        log_entry = print_with_timestamp("Jarvis", welcome_msg)
-        chat_log.append(log_entry)
+        print_with_timestamp("Jarvis", welcome_msg)
         
         print("Type /help to see available commands.\n")
         
@@ -81,7 +262,14 @@ def main():
                 readline.parse_and_bind('"\\e[A": previous-history')
                 readline.parse_and_bind('"\\e[B": next-history')
             except Exception as e:
-                logger.warning(f"Could not configure readline: {e}")
+                logger.warning("Could not configure readline: %s", e)
+        
+        startup_profile.mark("prompt ready")
+        warmup_thread = threading.Thread(target=warm_up_client, name="jarvis-warmup", daemon=True)
+        warmup_thread.start()
+        if args.profile_startup:
+            warmup_thread.join()
+            print(startup_profile.report() + "\n")
         
         while True:
             try:
@@ -92,16 +280,11 @@ def main():
                 if not user_question.strip():
                     continue
                 
-             
-                log_entry = f"User: {user_question}"
-                chat_log.append(log_entry)
-                
         
                 cmd = user_question.lower()
                 if cmd in ["/exit", "/quit", "bye", "exit", "quit"]:
                     farewell = "Goodbye!"
                     print(f"Jarvis: {farewell}")
-                    chat_log.append(f"Jarvis: {farewell}")
                     break
                     
                 elif cmd == "/help":
@@ -109,19 +292,58 @@ def main():
                     continue
                     
                 elif cmd == "/clear":
-                    message = clear_chat_history()
+                    message = clear_chat_history(session_id)
                     print(f"Jarvis: {message}")
-                    chat_log = []  # Also clear local chat log
                     continue
                     
                 elif cmd == "/save":
-                    save_chat_history(chat_log)
+                    save_chat_history(session_id)
+                    continue
+                
+                elif cmd == "/stats":
+                    print_stats()
+                    continue
+                
+                elif cmd == "/sessions":
+                    print_sessions()
+                    continue
+                
+                elif cmd == "/search" or cmd.startswith("/search "):
+                    parts = user_question.split(maxsplit=1)
+                    if len(parts) < 2:
+                        print("Jarvis: Usage: /search <words>")
+                        continue
+                    print_search_results(parts[1])
+                    continue
+                
+                elif cmd == "/attach" or cmd.startswith("/attach "):
+                    parts = user_question.split(maxsplit=1)
+                    if len(parts) < 2:
+                        print("Jarvis: Usage: /attach <file>")
+                        continue
+                    attach_file(parts[1].strip().strip('"'), session_id)
+                    continue
+                
+                elif cmd == "/detach":
+                    count = detach_documents(session_id)
+                    print(f"Jarvis: Removed {count} attached file(s).")
+                    continue
+                
+                elif cmd == "/resume" or cmd.startswith("/resume "):
+                    parts = user_question.split(maxsplit=1)
+                    if len(parts) < 2:
+                        print("Jarvis: Usage: /resume <session id> (see /sessions)")
+                        continue
+                    if not conversation_store.turn_count(parts[1]):
+                        print(f"Jarvis: No saved session named {parts[1]}.")
+                        continue
+                    session_id = parts[1]
+                    loaded = resume_session(session_id)
+                    print(f"Jarvis: Resumed session {session_id} ({loaded} recent messages loaded).")
                     continue
                 
                
-                response = chat_with_gemini(user_question)
-                log_entry = print_with_timestamp("Jarvis", response)
-                chat_log.append(log_entry)
+                print_streamed_response("Jarvis", user_question, session_id)
                 
             except KeyboardInterrupt:
                 print("\nJarvis: Interrupted. Goodbye!")
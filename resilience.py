@@ -0,0 +1,306 @@
+import asyncio
+import contextlib
+import contextvars
+import random
+import threading
+import time
+from typing import Dict, Any, Awaitable, Callable, Iterator, Optional, Tuple, TypeVar
+
+from error_handler import CircuitOpenError, DeadlineExceededError, GeminiError, classify_error, logger
+
+T = TypeVar("T")
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for retryable errors"""
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before retry number `attempt` (starting at 1)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+class CircuitBreaker:
+    """
+    Fails fast while the upstream API is down.
+
+    After `failure_threshold` consecutive upstream failures the circuit opens
+    and calls are rejected immediately. Once `reset_timeout` seconds have
+    passed a single trial call is let through (half-open): success closes
+    the circuit again, failure re-opens it.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Return True if a call may be attempted now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Circuit breaker closed; API calls are succeeding again")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                    logger.warning("Circuit breaker opened after %s consecutive failures", self._failures)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Give back a half-open trial slot when the call ended without an upstream verdict"""
+        with self._lock:
+            self._trial_in_flight = False
+
+class Deadline:
+    """
+    When a request must be finished by.
+
+    The clock can be stopped (see deadline_paused) while the request waits
+    for something that is not the upstream API, such as rate-limit budget,
+    so queueing never uses up the time allowed for the call itself.
+    """
+    def __init__(self, seconds: Optional[float]):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+        self.paused_since: Optional[float] = None
+
+    @property
+    def paused(self) -> bool:
+        return self.paused_since is not None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (frozen while paused), or None without a deadline"""
+        if self.expires_at is None:
+            return None
+        now = self.paused_since if self.paused_since is not None else time.monotonic()
+        return self.expires_at - now
+
+    @contextlib.contextmanager
+    def pause(self) -> Iterator[None]:
+        """Stop the clock for the duration of the block"""
+        if self.paused_since is not None:
+            yield
+            return
+        self.paused_since = time.monotonic()
+        try:
+            yield
+        finally:
+            if self.expires_at is not None:
+                self.expires_at += time.monotonic() - self.paused_since
+            self.paused_since = None
+
+_current_deadline: "contextvars.ContextVar[Optional[Deadline]]" = contextvars.ContextVar("jarvis_deadline",
+                                                                                         default=None)
+
+@contextlib.contextmanager
+def deadline_paused() -> Iterator[None]:
+    """Stop the deadline clock of the ResilientCaller call running in this context, if any"""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        yield
+        return
+    with deadline.pause():
+        yield
+
+class ResilientCaller:
+    """
+    Runs API calls with retries, a per-request deadline and a circuit breaker.
+
+    The wrapped function receives the time left before the deadline (or None)
+    so it can pass it on as the transport timeout. Errors are classified with
+    classify_error; only retryable ones are retried, and only while time
+    remains. A call that ends with a retryable error counts as one upstream
+    failure for the breaker, however many attempts it made. Time spent inside
+    deadline_paused() (waiting for rate-limit budget) is not counted against
+    the deadline.
+    """
+    # How often a paused async call checks whether its deadline clock has restarted
+    PAUSE_POLL_INTERVAL = 0.1
+
+    def __init__(self, policy: Optional[RetryPolicy] = None, breaker: Optional[CircuitBreaker] = None,
+                 deadline: Optional[float] = None):
+        self.policy = policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.deadline = deadline
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def _before_attempt(self, deadline: Deadline) -> Optional[float]:
+        """Check the breaker and the deadline; returns the time left for this attempt"""
+        if not self.breaker.allow():
+            with self._lock:
+                self.rejected += 1
+            raise CircuitOpenError("Circuit breaker is open")
+        remaining = deadline.remaining()
+        if remaining is not None and remaining <= 0:
+            self.breaker.release()
+            raise DeadlineExceededError("Request deadline exceeded")
+        return remaining
+
+    def _after_failure(self, error: BaseException, attempt: int,
+                       deadline: Deadline) -> Tuple[GeminiError, Optional[float]]:
+        """Classify a failure; returns the error and how long to wait before retrying (None = give up)"""
+        if not isinstance(error, Exception):
+            # Cancellation and the like: not an upstream failure, never retried
+            self.breaker.release()
+            raise error
+        classified = classify_error(error)
+        delay = self.policy.delay(attempt)
+        remaining = deadline.remaining()
+        if (not classified.retryable or attempt >= self.policy.max_attempts or
+                (remaining is not None and remaining <= delay)):
+            # Only the call as a whole counts against the breaker, not each attempt
+            if classified.retryable:
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()
+            with self._lock:
+                self.failures += 1
+            return classified, None
+
+        self.breaker.release()
+        with self._lock:
+            self.retries += 1
+        logger.info("Retrying after %s (attempt %s) in %.2fs", type(classified).__name__, attempt, delay)
+        return classified, delay
+
+    def call(self, fn: Callable[[Optional[float]], T], deadline: Optional[float] = None) -> T:
+        """
+        Call fn(timeout) with retries.
+
+        Args:
+            fn (Callable): The API call; receives the seconds left before the deadline
+            deadline (Optional[float]): Seconds allowed for the whole request, defaults to self.deadline
+
+        Returns:
+            The result of fn
+
+        Raises:
+            GeminiError: The classified error once retries are exhausted
+        """
+        with self._lock:
+            self.calls += 1
+        expires = Deadline(self.deadline if deadline is None else deadline)
+        token = _current_deadline.set(expires)
+        try:
+            attempt = 0
+            while True:
+                attempt += 1
+                remaining = self._before_attempt(expires)
+                try:
+                    result = fn(remaining)
+                except BaseException as e:
+                    classified, delay = self._after_failure(e, attempt, expires)
+                    if delay is None:
+                        raise classified from e
+                    time.sleep(delay)
+                    continue
+                self.breaker.record_success()
+                return result
+        finally:
+            _current_deadline.reset(token)
+
+    async def call_async(self, fn: Callable[[Optional[float]], Awaitable[T]], deadline: Optional[float] = None) -> T:
+        """Async version of call"""
+        with self._lock:
+            self.calls += 1
+        expires = Deadline(self.deadline if deadline is None else deadline)
+        token = _current_deadline.set(expires)
+        try:
+            attempt = 0
+            while True:
+                attempt += 1
+                remaining = self._before_attempt(expires)
+                try:
+                    if remaining is None:
+                        result = await fn(remaining)
+                    else:
+                        result = await self._within(fn(remaining), expires)
+                except BaseException as e:
+                    classified, delay = self._after_failure(e, attempt, expires)
+                    if delay is None:
+                        raise classified from e
+                    await asyncio.sleep(delay)
+                    continue
+                self.breaker.record_success()
+                return result
+        finally:
+            _current_deadline.reset(token)
+
+    async def _within(self, awaitable: Awaitable[T], deadline: Deadline) -> T:
+        """Like asyncio.wait_for, except that the time limit does not run down while the deadline is paused"""
+        task = asyncio.ensure_future(awaitable)
+        try:
+            while True:
+                remaining = deadline.remaining()
+                if not deadline.paused and remaining <= 0:
+                    raise asyncio.TimeoutError()
+                timeout = self.PAUSE_POLL_INTERVAL if deadline.paused else remaining
+                done, _ = await asyncio.wait({task}, timeout=timeout)
+                if done:
+                    return task.result()
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.wait({task})
+
+    def record_failure(self, error: Exception) -> None:
+        """Report a failure that happened outside call(), e.g. part-way through a stream"""
+        if classify_error(error).retryable:
+            self.breaker.record_failure()
+        with self._lock:
+            self.failures += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return retry and circuit breaker counters"""
+        with self._lock:
+            stats = {
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "rejected": self.rejected
+            }
+        stats["breaker_state"] = self.breaker.state
+        stats["breaker_opened"] = self.breaker.times_opened
+        return stats
@@ -0,0 +1,240 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Awaitable, Callable, Optional, Tuple
+
+from error_handler import ErrorHandler, logger
+
+class _LeaderAbandoned(Exception):
+    """Set on an in-flight future when its leader was cancelled, so followers compute the response themselves"""
+
+class ResponseCache:
+    """
+    Cache of model responses keyed by a stable hash of the request.
+
+    Entries live in an in-memory LRU with a TTL. An optional SQLite database
+    (in WAL mode, so several processes can share it) acts as a persistent
+    second tier. Concurrent requests for the same key are coalesced so only
+    one of them calls the model; the others wait for its result. If that
+    request is cancelled, a waiting one takes over instead of failing too.
+    """
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._inflight: Dict[str, "concurrent.futures.Future[str]"] = {}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str) -> None:
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            logger.info("Using persistent response cache at %s", db_path)
+        except sqlite3.Error as e:
+            ErrorHandler.log_error(e, "Could not open persistent response cache; using memory only")
+            self._db = None
+
+    @staticmethod
+    def make_key(model_name: str, safety_settings: Any, generation_config: Any,
+                 contents: List[Dict[str, Any]]) -> str:
+        """
+        Build a stable cache key for a request.
+
+        Message text is whitespace-normalized so trivially different prompts
+        share an entry.
+        """
+        normalized = [
+            {"role": message["role"], "parts": [" ".join(str(part).split()) for part in message["parts"]]}
+            for message in contents
+        ]
+        payload = json.dumps([model_name, safety_settings, generation_config, normalized],
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for a key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        response = self._db_get(key, now)
+        with self._lock:
+            if response is not None:
+                self.persistent_hits += 1
+                self._store_memory(key, response, now + self.ttl)
+            else:
+                self.misses += 1
+        return response
+
+    def put(self, key: str, response: str) -> None:
+        """Store a response under a key in both tiers"""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store_memory(key, response, expires_at)
+        self._db_put(key, response, expires_at)
+
+    def _store_memory(self, key: str, response: str, expires_at: float) -> None:
+        """Insert into the LRU. Caller must hold self._lock."""
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _db_get(self, key: str, now: float) -> Optional[str]:
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT response FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            ErrorHandler.log_error(e, "Error reading persistent response cache")
+            return None
+
+    def _db_put(self, key: str, response: str, expires_at: float) -> None:
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, expires_at) VALUES (?, ?, ?)",
+                    (key, response, expires_at)
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            ErrorHandler.log_error(e, "Error writing persistent response cache")
+
+    def _join_or_lead(self, key: str) -> Tuple["concurrent.futures.Future[str]", bool]:
+        """Return the in-flight future for a key and whether the caller must compute it"""
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = concurrent.futures.Future()
+            self._inflight[key] = flight
+            return flight, True
+
+    def _land(self, key: str, flight: "concurrent.futures.Future[str]",
+              response: Optional[str], error: Optional[BaseException], cacheable: bool) -> None:
+        if error is None and cacheable:
+            self.put(key, response)
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is None:
+            flight.set_result(response)
+        elif isinstance(error, Exception) and not isinstance(error, concurrent.futures.CancelledError):
+            flight.set_exception(error)
+        else:
+            # Cancelled (e.g. the user pressed Stop) rather than failed: the followers' requests still stand
+            flight.set_exception(_LeaderAbandoned())
+
+    def get_or_compute(self, key: str, compute: Callable[[], str],
+                       cacheable: Callable[[str], bool] = lambda response: True) -> Tuple[str, bool]:
+        """
+        Return the cached response for a key, computing and caching it on a miss.
+
+        Args:
+            key (str): Cache key from make_key
+            compute (Callable): Produces the response; exceptions propagate and are not cached
+            cacheable (Callable): Decides whether a computed response may be stored
+
+        Returns:
+            Tuple[str, bool]: The response and whether it was served from the cache
+        """
+        while True:
+            response = self.get(key)
+            if response is not None:
+                return response, True
+            flight, leader = self._join_or_lead(key)
+            if leader:
+                break
+            try:
+                return flight.result(), True
+            except _LeaderAbandoned:
+                continue
+
+        try:
+            response = compute()
+        except BaseException as e:
+            self._land(key, flight, None, e, False)
+            raise
+        self._land(key, flight, response, None, cacheable(response))
+        return response, False
+
+    async def get_or_compute_async(self, key: str, compute: Callable[[], Awaitable[str]],
+                                   cacheable: Callable[[str], bool] = lambda response: True) -> Tuple[str, bool]:
+        """Async version of get_or_compute; coalesces with sync callers too"""
+        # The persistent tier is SQLite, so reads and writes to it run off the event loop
+        offload = self._db is not None
+        while True:
+            response = await asyncio.to_thread(self.get, key) if offload else self.get(key)
+            if response is not None:
+                return response, True
+            flight, leader = self._join_or_lead(key)
+            if leader:
+                break
+            try:
+                # Shielded, so cancelling this follower does not cancel the shared future under the leader
+                return await asyncio.shield(asyncio.wrap_future(flight)), True
+            except _LeaderAbandoned:
+                continue
+
+        try:
+            response = await compute()
+        except BaseException as e:
+            self._land(key, flight, None, e, False)
+            raise
+        if offload:
+            await asyncio.to_thread(self._land, key, flight, response, None, cacheable(response))
+        else:
+            self._land(key, flight, response, None, cacheable(response))
+        return response, False
+
+    def clear(self) -> None:
+        """Remove all entries from both tiers"""
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.memory_hits + self.persistent_hits,
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced
+            }
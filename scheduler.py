@@ -0,0 +1,167 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from error_handler import logger
+
+class Priority:
+    """Request priorities; lower values are served first"""
+    INTERACTIVE = 0
+    BATCH = 10
+
+class TokenBucket:
+    """A token bucket refilled continuously at `rate_per_minute`"""
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (amounts above capacity wait for a full bucket)"""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return 0.0 if missing <= 0 else missing / self.rate_per_second
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+class RequestScheduler:
+    """
+    Client-side rate limiter for a shared API key.
+
+    Requests are admitted in priority order (then arrival order) once both
+    the requests-per-minute and tokens-per-minute buckets can cover them.
+    Work beyond the budget waits in the queue instead of failing upstream.
+    A limit of 0 disables that budget; with both disabled requests are
+    admitted immediately.
+    """
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self._request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._queue: List[Tuple[int, int, Dict[str, Any]]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self.admitted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.admitted_by_priority: Dict[int, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self._request_bucket is not None or self._token_bucket is not None
+
+    def _enqueue(self, tokens: int, priority: int) -> Tuple[int, int, Dict[str, Any]]:
+        entry = (priority, next(self._counter), {"tokens": tokens, "enqueued_at": time.monotonic()})
+        heapq.heappush(self._queue, entry)
+        return entry
+
+    def _dequeue(self, entry: Tuple[int, int, Dict[str, Any]]) -> None:
+        """Drop an abandoned entry. Caller must hold self._cond."""
+        if entry in self._queue:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            self._cond.notify_all()
+
+    def _try_admit(self, entry: Tuple[int, int, Dict[str, Any]]) -> Optional[float]:
+        """
+        Admit the entry if it is first in line and the budgets allow. Caller must hold self._cond.
+
+        Returns:
+            Optional[float]: 0 if admitted, seconds to wait if first in line, None if behind others
+        """
+        if self._queue[0] is not entry:
+            return None
+        now = time.monotonic()
+        ticket = entry[2]
+        wait = 0.0
+        if self._request_bucket is not None:
+            wait = max(wait, self._request_bucket.time_until(1, now))
+        if self._token_bucket is not None:
+            wait = max(wait, self._token_bucket.time_until(ticket["tokens"], now))
+        if wait > 0:
+            return wait
+
+        heapq.heappop(self._queue)
+        if self._request_bucket is not None:
+            self._request_bucket.consume(1)
+        if self._token_bucket is not None:
+            self._token_bucket.consume(ticket["tokens"])
+
+        waited = now - ticket["enqueued_at"]
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.admitted_by_priority[entry[0]] = self.admitted_by_priority.get(entry[0], 0) + 1
+        if waited > 1.0:
+            logger.info("Request waited %.2fs for rate limit budget", waited)
+        self._cond.notify_all()
+        return 0.0
+
+    def acquire(self, tokens: int, priority: int = Priority.INTERACTIVE) -> float:
+        """
+        Block until the request may be sent.
+
+        Args:
+            tokens (int): Estimated tokens the request will use
+            priority (int): Priority.INTERACTIVE or Priority.BATCH (lower goes first)
+
+        Returns:
+            float: Seconds spent waiting in the queue
+        """
+        if not self.enabled:
+            return 0.0
+        with self._cond:
+            entry = self._enqueue(tokens, priority)
+            try:
+                while True:
+                    wait = self._try_admit(entry)
+                    if wait == 0:
+                        return time.monotonic() - entry[2]["enqueued_at"]
+                    self._cond.wait(wait)
+            except BaseException:
+                self._dequeue(entry)
+                raise
+
+    async def acquire_async(self, tokens: int, priority: int = Priority.INTERACTIVE) -> float:
+        """Async version of acquire that waits without blocking the event loop"""
+        if not self.enabled:
+            return 0.0
+        with self._cond:
+            entry = self._enqueue(tokens, priority)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_admit(entry)
+                if wait == 0:
+                    return time.monotonic() - entry[2]["enqueued_at"]
+                await asyncio.sleep(self.POLL_INTERVAL if wait is None else wait)
+        except BaseException:
+            with self._cond:
+                self._dequeue(entry)
+            raise
+
+    def queue_depth(self) -> int:
+        """Number of requests waiting for budget"""
+        with self._cond:
+            return len(self._queue)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth and wait time statistics"""
+        with self._cond:
+            return {
+                "queue_depth": len(self._queue),
+                "admitted": self.admitted,
+                "average_wait": self.total_wait / self.admitted if self.admitted else 0.0,
+                "max_wait": self.max_wait,
+                "admitted_by_priority": dict(self.admitted_by_priority)
+            }
@@ -0,0 +1,253 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from typing import List, Dict, Any, Callable, Optional, Sequence
+
+from error_handler import ErrorHandler, logger
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+    logger.info("numpy module not available - semantic response cache disabled")
+
+def hashing_embedder(dim: int = 256) -> Callable[[str], List[float]]:
+    """
+    Return a deterministic local embedding function.
+
+    Character trigrams of the lowercased text are hashed into `dim` buckets,
+    so paraphrases that share most of their wording land close together. No
+    network access is needed, which makes it suitable for tests and offline use.
+    """
+    def embed(text: str) -> List[float]:
+        vector = [0.0] * dim
+        normalized = " " + " ".join(text.lower().split()) + " "
+        for i in range(len(normalized) - 2):
+            digest = hashlib.md5(normalized[i:i + 3].encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % dim] += 1.0
+        return vector
+    return embed
+
+class SemanticCache:
+    """
+    Cache of first-turn replies looked up by prompt similarity.
+
+    Prompt embeddings are kept as rows of a NumPy matrix and compared to a
+    new prompt with one vectorized cosine-similarity product; the best match
+    above `threshold` is a hit. The cache holds at most `capacity` entries
+    and replaces the least recently used one when full.
+
+    With a `directory`, the matrix is stored as a memory-mapped .npy file,
+    so it is paged in on demand instead of being read into RAM at startup.
+    Prompts and replies are appended to a JSONL file, and a memory-mapped
+    table holds each slot's record offset, length and stamp. An insert
+    writes one record, and a reply is read from disk only on a hit. The
+    file is rewritten once replaced records make up most of it.
+    """
+    def __init__(self, embed: Callable[[str], Sequence[float]], capacity: int = 1024,
+                 threshold: float = 0.92, directory: Optional[str] = None):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("The semantic cache requires numpy")
+        self.embed = embed
+        self.capacity = capacity
+        self.threshold = threshold
+        self.directory = directory
+        self._vectors = None
+        self._last_used = None
+        # Without a directory, replies are kept in memory; with one, _records locates them in the JSONL file
+        self._entries: List[Optional[Dict[str, str]]] = []
+        self._records = None
+        self._live_bytes = 0
+        self._size = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _paths(self) -> Dict[str, str]:
+        return {
+            "vectors": os.path.join(self.directory, "embeddings.npy"),
+            "last_used": os.path.join(self.directory, "last_used.npy"),
+            "records": os.path.join(self.directory, "records.npy"),
+            "replies": os.path.join(self.directory, "replies.jsonl")
+        }
+
+    def _load(self) -> None:
+        """Open the persisted index on first use. Caller must hold self._lock."""
+        self._loaded = True
+        if not self.directory:
+            return
+        paths = self._paths()
+        if not all(os.path.exists(path) for path in paths.values()):
+            return
+        try:
+            vectors = np.load(paths["vectors"], mmap_mode="r+")
+            last_used = np.load(paths["last_used"], mmap_mode="r+")
+            records = np.load(paths["records"], mmap_mode="r+")
+            if vectors.shape[0] != self.capacity or records.shape != (self.capacity, 3):
+                logger.warning("Semantic cache capacity changed; starting with an empty index")
+                return
+            self._vectors, self._last_used, self._records = vectors, last_used, records
+            # Slots are filled in order; a slot without a readable record has offset -1
+            filled = np.flatnonzero(records[:, 0] >= 0)
+            self._size = int(filled[-1]) + 1 if len(filled) else 0
+            self._live_bytes = int(records[:self._size, 1].sum())
+            logger.info("Opened semantic cache with %s entries from %s", self._size, self.directory)
+        except (OSError, ValueError) as e:
+            ErrorHandler.log_error(e, "Could not open semantic cache; starting with an empty index")
+
+    def _allocate(self, dim: int) -> None:
+        """Create the embedding matrix once the embedding size is known. Caller must hold self._lock."""
+        self._entries = [None] * self.capacity
+        self._size = 0
+        self._live_bytes = 0
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            paths = self._paths()
+            with open(paths["replies"], "wb"):
+                pass
+            self._vectors = np.lib.format.open_memmap(paths["vectors"], mode="w+", dtype=np.float32,
+                                                      shape=(self.capacity, dim))
+            self._last_used = np.lib.format.open_memmap(paths["last_used"], mode="w+", dtype=np.float64,
+                                                        shape=(self.capacity,))
+            # Offset, length and stamp of each slot's record in replies.jsonl
+            self._records = np.lib.format.open_memmap(paths["records"], mode="w+", dtype=np.int64,
+                                                      shape=(self.capacity, 3))
+            self._records[:, 0] = -1
+        else:
+            self._vectors = np.zeros((self.capacity, dim), dtype=np.float32)
+            self._last_used = np.zeros(self.capacity, dtype=np.float64)
+
+    def _embed(self, text: str):
+        vector = np.asarray(self.embed(text), dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, prompt: str) -> Optional[str]:
+        """
+        Return the cached reply for the most similar prompt, if it is similar enough.
+
+        Args:
+            prompt (str): The first-turn user prompt
+
+        Returns:
+            Optional[str]: The cached reply, or None on a miss
+        """
+        query = self._embed(prompt)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if self._size == 0 or self._vectors.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors[:self._size] @ query
+            best = int(np.argmax(similarities))
+            score = float(similarities[best])
+            if math.isnan(score) or score < self.threshold:
+                self.misses += 1
+                return None
+
+            entry = self._entry(best)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._last_used[best] = time.time()
+            self.hits += 1
+            logger.debug("Semantic cache hit (similarity %.3f)", score)
+            return entry["response"]
+
+    def _entry(self, slot: int) -> Optional[Dict[str, Any]]:
+        """Read a slot's prompt and reply, or None if its record is missing. Caller must hold self._lock."""
+        if self._records is None:
+            return self._entries[slot]
+        offset, length, stamp = (int(value) for value in self._records[slot])
+        if offset < 0:
+            return None
+        try:
+            with open(self._paths()["replies"], "rb") as f:
+                f.seek(offset)
+                entry = json.loads(f.read(length))
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read semantic cache entry %s: %s", slot, e)
+            return None
+        # A crash mid-rewrite can leave offsets pointing at another record; the stamp catches that
+        return entry if isinstance(entry, dict) and entry.get("stamp") == stamp else None
+
+    def put(self, prompt: str, response: str) -> None:
+        """Add a prompt/reply pair, replacing the least recently used entry when full"""
+        vector = self._embed(prompt)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._allocate(vector.shape[0])
+
+            if self._size < self.capacity:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+
+            if self._records is not None and self._records[slot, 0] >= 0:
+                # Unlink the old reply before overwriting the vector, so a crash part-way leaves a slot that misses
+                self._live_bytes -= int(self._records[slot, 1])
+                self._records[slot, 0] = -1
+            self._vectors[slot] = vector
+            self._last_used[slot] = time.time()
+            if self._records is None:
+                self._entries[slot] = {"prompt": prompt, "response": response}
+            else:
+                self._append(slot, {"prompt": prompt, "response": response})
+                self._vectors.flush()
+                self._last_used.flush()
+                self._records.flush()
+
+    def _append(self, slot: int, entry: Dict[str, Any]) -> None:
+        """Append a slot's record to replies.jsonl and point the slot at it. Caller must hold self._lock."""
+        stamp = time.time_ns()
+        data = (json.dumps(dict(entry, stamp=stamp), ensure_ascii=False) + "\n").encode("utf-8")
+        try:
+            with open(self._paths()["replies"], "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(data)
+        except OSError as e:
+            ErrorHandler.log_error(e, "Error persisting semantic cache")
+            data, offset, stamp = b"", -1, 0
+        self._records[slot] = (offset, len(data), stamp)
+        self._live_bytes += len(data)
+        if offset + len(data) > 2 * self._live_bytes + (1 << 20):
+            self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite replies.jsonl with only the records slots point to. Caller must hold self._lock."""
+        paths = self._paths()
+        temp_path = paths["replies"] + ".tmp"
+        records = self._records[:self._size].copy()
+        try:
+            with open(paths["replies"], "rb") as source, open(temp_path, "wb") as target:
+                # Read in file order so the old file is scanned once
+                for slot in np.argsort(records[:, 0]):
+                    offset, length, _ = records[slot]
+                    if offset < 0:
+                        continue
+                    source.seek(int(offset))
+                    records[slot, 0] = target.tell()
+                    target.write(source.read(int(length)))
+            os.replace(temp_path, paths["replies"])
+        except OSError as e:
+            ErrorHandler.log_error(e, "Error compacting semantic cache")
+            return
+        self._records[:self._size] = records
+        self._records.flush()
+        logger.debug("Compacted semantic cache replies to %s bytes", self._live_bytes)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters"""
+        with self._lock:
+            return {"entries": self._size, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,315 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+from urllib.parse import urlparse, parse_qs
+
+from chat_logic import (
+    chat_with_gemini, chat_with_gemini_stream, clear_chat_history,
+    find_chat_history, model_registry
+)
+from error_handler import ErrorHandler, logger
+from metrics import metrics_registry
+
+class ServerConfig:
+    """Configuration for the HTTP chat server"""
+    HOST = os.getenv("JARVIS_HOST", "127.0.0.1")
+    PORT = int(os.getenv("JARVIS_PORT", "8000"))
+    MAX_CONCURRENT = int(os.getenv("JARVIS_MAX_CONCURRENT", "8"))
+    MAX_QUEUE = int(os.getenv("JARVIS_MAX_QUEUE", "32"))
+    DRAIN_TIMEOUT = float(os.getenv("JARVIS_DRAIN_TIMEOUT", "30"))
+    MAX_BODY_BYTES = 1024 * 1024
+
+class RequestGate:
+    """
+    Admission control for chat requests.
+
+    At most max_concurrent requests run at once and at most max_queue more
+    wait for a slot. Anything beyond that is rejected immediately so the
+    caller can back off, instead of piling up behind a slow upstream.
+    """
+    def __init__(self, max_concurrent: int, max_queue: int):
+        self._admission = threading.BoundedSemaphore(max_concurrent + max_queue)
+        self._workers = threading.Semaphore(max_concurrent)
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.rejected = 0
+        self.draining = False
+
+    def enter(self) -> Optional[int]:
+        """
+        Admit a request, waiting for a worker slot if needed.
+
+        Returns:
+            Optional[int]: None if admitted, otherwise the HTTP status to reject with
+        """
+        with self._cond:
+            if self.draining:
+                return 503
+            if not self._admission.acquire(blocking=False):
+                self.rejected += 1
+                return 429
+            self.in_flight += 1
+        self._workers.acquire()
+        return None
+
+    def leave(self) -> None:
+        """Release the slot held by an admitted request"""
+        self._workers.release()
+        with self._cond:
+            self.in_flight -= 1
+            self._admission.release()
+            self._cond.notify_all()
+
+    def start_draining(self) -> None:
+        """Stop admitting new requests"""
+        with self._cond:
+            self.draining = True
+
+    def drain(self, timeout: float) -> bool:
+        """Stop admitting requests and wait for in-flight ones; returns True if all finished"""
+        with self._cond:
+            self.draining = True
+            return self._cond.wait_for(lambda: self.in_flight == 0, timeout)
+
+class ChatServer(ThreadingHTTPServer):
+    """Threaded HTTP server carrying the shared request gate"""
+    daemon_threads = True
+
+    def __init__(self, address, gate: RequestGate):
+        super().__init__(address, ChatRequestHandler)
+        self.gate = gate
+        self._collector = lambda: [
+            ("jarvis_http_in_flight", "gauge", "HTTP chat requests being processed or queued", gate.in_flight),
+            ("jarvis_http_rejected_total", "counter", "HTTP chat requests rejected with 429", gate.rejected)
+        ]
+        metrics_registry.register_collector(self._collector)
+
+    def server_close(self):
+        # Another server in the same process must not report its gauges next to this one's
+        metrics_registry.unregister_collector(self._collector)
+        super().server_close()
+
+class ChatRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP endpoints for the chat service.
+
+    POST /chat     {"session_id": ..., "message": ...} -> {"session_id": ..., "response": ...}
+    POST /stream   same body; the reply is streamed as Server-Sent Events
+    POST /clear    {"session_id": ...}
+    GET  /history?session_id=...   404 if the session does not exist
+    GET  /health
+    GET  /metrics  Prometheus text format
+    """
+    server_version = "JarvisServer/1.0"
+
+    def log_message(self, format, *args):
+        logger.info("%s - " + format, self.address_string(), *args)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            gate = self.server.gate
+            self._send_json(200, {
+                "status": "draining" if gate.draining else "ok",
+                "in_flight": gate.in_flight,
+                "rejected": gate.rejected
+            })
+        elif url.path == "/metrics":
+            data = metrics_registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif url.path == "/history":
+            session_id = parse_qs(url.query).get("session_id", [None])[0]
+            if not session_id:
+                self._send_json(400, {"error": "session_id is required"})
+                return
+            history = find_chat_history(session_id)
+            if history is None:
+                self._send_json(404, {"error": "Unknown session_id"})
+                return
+            with history.lock:
+                messages = [{"role": m["role"], "text": m["parts"][0]} for m in history.messages]
+            self._send_json(200, {"session_id": session_id, "messages": messages})
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        routes = {
+            "/chat": self._handle_chat,
+            "/stream": self._handle_stream
+        }
+        if path != "/clear" and path not in routes:
+            self._send_json(404, {"error": "Not found"})
+            return
+
+        body = self._read_json()
+        if body is None:
+            return
+        session_id = body.get("session_id") or uuid.uuid4().hex
+
+        if path == "/clear":
+            self._handle_clear(session_id)
+            return
+        handler = routes[path]
+
+        message = body.get("message")
+        if not isinstance(message, str) or not message.strip():
+            self._send_json(400, {"error": "message is required"})
+            return
+
+        gate = self.server.gate
+        rejection = gate.enter()
+        if rejection is not None:
+            error = "Server is shutting down" if rejection == 503 else "Too many requests"
+            self._send_json(rejection, {"error": error}, {"Retry-After": "1"})
+            return
+        try:
+            handler(session_id, message)
+        except Exception as e:
+            self._send_json(500, {"error": ErrorHandler.handle_api_error(e)})
+        finally:
+            gate.leave()
+
+    def _handle_chat(self, session_id: str, message: str) -> None:
+        response = chat_with_gemini(message, session_id=session_id)
+        self._send_json(200, {"session_id": session_id, "response": response})
+
+    def _handle_stream(self, session_id: str, message: str) -> None:
+        stream = chat_with_gemini_stream(message, session_id=session_id)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.send_header("X-Session-Id", session_id)
+        self.end_headers()
+
+        try:
+            for chunk in stream:
+                self._send_event("chunk", {"text": chunk})
+            if stream.error_message:
+                self._send_event("error", {"error": stream.error_message})
+            else:
+                self._send_event("done", {
+                    "session_id": session_id,
+                    "time_to_first_token": stream.time_to_first_token,
+                    "total_time": stream.total_time
+                })
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; drop the reply without committing it
+            stream.close()
+            logger.info("Client disconnected during stream for session %s", session_id)
+        except Exception as e:
+            # The headers are already sent, so report the failure inside the event stream and end it
+            stream.close()
+            self.close_connection = True
+            try:
+                self._send_event("error", {"error": ErrorHandler.handle_api_error(e)})
+            except OSError:
+                pass
+
+    def _handle_clear(self, session_id: str) -> None:
+        message = clear_chat_history(session_id)
+        self._send_json(200, {"session_id": session_id, "message": message})
+
+    def _read_json(self) -> Optional[Dict[str, Any]]:
+        """Read the JSON request body, replying with 400/413 and returning None if invalid"""
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > ServerConfig.MAX_BODY_BYTES:
+            self._send_json(413, {"error": "Request body too large"})
+            return None
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "Request body must be JSON"})
+            return None
+        if not isinstance(body, dict):
+            self._send_json(400, {"error": "Request body must be a JSON object"})
+            return None
+        return body
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_event(self, event: str, payload: Dict[str, Any]) -> None:
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+def serve(host: str = ServerConfig.HOST, port: int = ServerConfig.PORT,
+          max_concurrent: int = ServerConfig.MAX_CONCURRENT,
+          max_queue: int = ServerConfig.MAX_QUEUE,
+          drain_timeout: float = ServerConfig.DRAIN_TIMEOUT) -> None:
+    """
+    Run the chat server until SIGINT/SIGTERM, then drain in-flight requests.
+
+    Args:
+        host (str): Interface to bind
+        port (int): Port to bind
+        max_concurrent (int): Requests processed at once
+        max_queue (int): Requests allowed to wait for a slot before 429s are returned
+        drain_timeout (float): Seconds to wait for in-flight requests on shutdown
+    """
+    gate = RequestGate(max_concurrent, max_queue)
+    server = ChatServer((host, port), gate)
+
+    def request_shutdown(signum, frame):
+        logger.info("Shutdown requested; no longer accepting requests")
+        gate.start_draining()
+        # shutdown() blocks until serve_forever returns, so it cannot run on this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, request_shutdown)
+    signal.signal(signal.SIGTERM, request_shutdown)
+
+    logger.info("Jarvis server listening on http://%s:%s", host, server.server_port)
+    try:
+        server.serve_forever()
+    finally:
+        if gate.drain(drain_timeout):
+            logger.info("All in-flight requests finished")
+        else:
+            logger.warning("Shutting down with %s request(s) still in flight", gate.in_flight)
+        server.server_close()
+
+def main():
+    """Main function for the HTTP server"""
+    parser = argparse.ArgumentParser(description="Jarvis AI Assistant HTTP server")
+    parser.add_argument("--host", default=ServerConfig.HOST)
+    parser.add_argument("--port", type=int, default=ServerConfig.PORT)
+    parser.add_argument("--max-concurrent", type=int, default=ServerConfig.MAX_CONCURRENT)
+    parser.add_argument("--max-queue", type=int, default=ServerConfig.MAX_QUEUE)
+    parser.add_argument("--drain-timeout", type=float, default=ServerConfig.DRAIN_TIMEOUT)
+    parser.add_argument("--fake-backend", action="store_true",
+                        help="Answer with a local fake model instead of the Gemini API")
+    args = parser.parse_args()
+
+    if args.fake_backend:
+        from fake_backend import install_fake_backend
+        install_fake_backend(model_registry)
+        logger.info("Using the local fake model backend")
+
+    try:
+        serve(args.host, args.port, args.max_concurrent, args.max_queue, args.drain_timeout)
+    except Exception as e:
+        ErrorHandler.log_error(e, "Server error")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+class StartupProfile:
+    """
+    Records how long each startup phase takes.
+
+    Phases (imports, client configuration, ...) are timed with phase(), and
+    milestones such as "prompt ready" are recorded with mark() as the time
+    elapsed since this module was imported.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self.marks: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as a named phase"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, time.perf_counter() - started))
+
+    def mark(self, name: str) -> float:
+        """Record a milestone; returns the seconds since startup"""
+        elapsed = time.perf_counter() - self.started
+        with self._lock:
+            self.marks.append((name, elapsed))
+        return elapsed
+
+    def report(self) -> str:
+        """Format the recorded phases and milestones as a table"""
+        with self._lock:
+            lines = ["Startup profile:"]
+            for name, seconds in self.phases:
+                lines.append(f"  {name:<36} {seconds * 1000:9.1f} ms")
+            for name, seconds in self.marks:
+                lines.append(f"  {'@ ' + name:<36} {seconds * 1000:9.1f} ms after start")
+            return "\n".join(lines)
+
+# Process-wide startup profile
+startup_profile = StartupProfile()
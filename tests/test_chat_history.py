@@ -0,0 +1,94 @@
+import asyncio
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("JARVIS_RESPONSE_CACHE", "0")
+
+import chat_logic
+from chat_logic import CancellableRequest, ChatHistory, HistoryCompactor, SessionManager, model_registry
+from fake_backend import install_fake_backend
+
+class CompactionTest(unittest.TestCase):
+    """Replacing the oldest turns of a long history with a summary"""
+    def setUp(self):
+        self.history = ChatHistory()
+        for i in range(6):
+            self.history.add_turn(f"question {i} " + "detail " * 20, f"answer {i} " + "detail " * 20)
+
+    def compact(self, summary):
+        compactor = HistoryCompactor(enabled=True, threshold_tokens=1, messages_to_compact=4,
+                                     summarize=lambda turns: summary)
+        return compactor, compactor.maybe_compact(self.history).result()
+
+    def test_shorter_summary_replaces_the_oldest_turns(self):
+        tokens = self.history.token_count
+        compactor, saved = self.compact("asked about 0 and 1")
+        self.assertGreater(saved, 0)
+        self.assertEqual(self.history.token_count, tokens - saved)
+        self.assertEqual(len(self.history.messages), 10)
+        self.assertTrue(self.history.messages[0]["parts"][0].startswith("Summary of our conversation so far"))
+        self.assertEqual(compactor.stats()["compactions"], 1)
+
+    def test_longer_summary_is_discarded(self):
+        messages = self.history.messages
+        compactor, saved = self.compact("a rambling recap " * 200)
+        self.assertEqual(saved, 0)
+        self.assertEqual(self.history.messages, messages)
+        self.assertEqual(self.history.compaction_savings, 0)
+        self.assertEqual(compactor.stats()["compactions"], 0)
+        # The same turns are not summarized again on the next commit
+        self.assertIsNone(compactor.maybe_compact(self.history))
+
+class SessionManagerTest(unittest.TestCase):
+    """Evicting sessions while requests are in flight"""
+    def test_session_marked_in_flight_by_get_is_not_evicted(self):
+        manager = SessionManager(max_sessions=1, preamble=None)
+        history = manager.get("a", begin_request=True)
+        manager.get("b")
+        self.assertIn("a", manager.session_ids())
+        history.add_turn("question", "answer")
+        history.end_request()
+        self.assertIs(manager.get("a"), history)
+        manager.get("b")
+        self.assertNotIn("a", manager.session_ids())
+
+class CancelDuringCommitTest(unittest.TestCase):
+    """A cancel that arrives while the finished reply is being committed"""
+    def setUp(self):
+        install_fake_backend(model_registry)
+        self.committing = threading.Event()
+        commit_turn = chat_logic.commit_turn
+
+        def slow_commit(*args):
+            self.committing.set()
+            time.sleep(0.2)
+            commit_turn(*args)
+        patch = mock.patch.object(chat_logic, "commit_turn", slow_commit)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_stream_is_reported_as_completed(self):
+        request = CancellableRequest("hello", session_id="cancel-stream")
+        self.assertTrue(self.committing.wait(5))
+        request.cancel()
+        self.assertTrue(request.wait(5))
+        self.assertFalse(request.cancelled())
+        stream = request.result()
+        self.assertIn("hello", stream.text)
+        self.assertEqual(chat_logic.get_chat_history("cancel-stream").turn_count, 2)
+
+    def test_async_chat_returns_the_committed_reply(self):
+        async def run():
+            task = asyncio.ensure_future(chat_logic.chat_with_gemini_async("hello", session_id="cancel-async"))
+            await asyncio.to_thread(self.committing.wait, 5)
+            task.cancel()
+            return await task
+        self.assertIn("hello", asyncio.run(run()))
+        self.assertEqual(chat_logic.get_chat_history("cancel-async").turn_count, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import time
+import unittest
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("JARVIS_RESPONSE_CACHE", "0")
+
+from backends import GeminiBackend
+from chat_logic import ChatHistory, build_request, model_registry
+from context_cache import ContextCache, stable_prefix
+from fake_backend import install_fake_backend
+
+DOCUMENT = "The quarterly report says revenue grew in every region. " * 400
+
+class ContextCacheTest(unittest.TestCase):
+    """Drives the fake cache provider through a conversation about a large pasted document"""
+    def setUp(self):
+        install_fake_backend(model_registry)
+        self.provider = model_registry.cache_provider()
+        self.cache = ContextCache(model_registry.cache_provider, min_tokens=1000)
+        self.backend = GeminiBackend(model_registry, "gemini-2.5-flash", self.cache)
+        self.history = ChatHistory(token_budget=32000)
+
+    def ask(self, message):
+        contents, stable = build_request(self.history, message)
+        with stable_prefix(stable):
+            reply = self.backend.generate(contents)
+        self.history.add_turn(message, reply)
+        return reply
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def test_pasted_document_is_cached_and_reused(self):
+        self.ask(DOCUMENT)
+        self.ask("Which regions grew?")
+        self.wait_for(lambda: self.cache.stats()["created"] == 1)
+        self.assertEqual(self.provider.created, 1)
+
+        for question in ("By how much?", "Anything else?"):
+            reply = self.ask(question)
+            self.assertIn(question, reply)
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 2)
+        self.assertGreater(stats["tokens_saved"], 2000)
+        # Follow-ups are small, so no further prefixes are registered
+        self.assertEqual(self.provider.created, 1)
+
+    def test_expired_prefix_falls_back_to_the_full_history(self):
+        self.ask(DOCUMENT)
+        self.ask("Which regions grew?")
+        self.wait_for(lambda: self.cache.stats()["created"] == 1)
+        self.provider.expire_all()
+
+        reply = self.ask("Still there?")
+        self.assertIn("5 messages in context", reply)
+        stats = self.cache.stats()
+        self.assertEqual(stats["fallbacks"], 1)
+        self.assertEqual(stats["hits"], 0)
+        self.assertEqual(stats["entries"], 0)
+
+    def test_prefix_is_dropped_before_the_history_is_trimmed(self):
+        self.history = ChatHistory(token_budget=20000)
+        self.ask(DOCUMENT)
+        self.ask("Which regions grew?")
+        self.wait_for(lambda: self.cache.stats()["created"] == 1)
+        while self.history.stable_count() == len(self.history.messages):
+            self.ask("Tell me more. " * 50)
+        self.ask("One more question")
+        self.assertEqual(self.cache.stats()["entries"], 0)
+        self.wait_for(lambda: not self.provider.caches)
+
+if __name__ == "__main__":
+    unittest.main()
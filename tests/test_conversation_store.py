@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from conversation_search import FTS5_AVAILABLE, ConversationSearch
+from conversation_store import ConversationStore
+
+class ConversationStoreTest(unittest.TestCase):
+    """Appending, reading back and recovering from torn writes"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.store = ConversationStore(self.directory)
+
+    def contents(self, session_id):
+        return [turn["content"] for turn in self.store.read_turns(session_id, 0)]
+
+    def test_similar_session_ids_keep_separate_files(self):
+        self.store.append_turn("a/b", "user", "slash")
+        self.store.append_turn("a_b", "user", "underscore")
+        self.assertEqual(self.contents("a/b"), ["slash"])
+        self.assertEqual(self.contents("a_b"), ["underscore"])
+        self.assertEqual(sorted(session["session_id"] for session in self.store.list_sessions()), ["a/b", "a_b"])
+
+    def test_torn_index_entry_and_orphan_record_are_skipped(self):
+        self.store.append_turn("s", "user", "one")
+        # A crash after writing a record but part-way through its index entry
+        with open(self.store.segment_path("s"), "ab") as segment:
+            segment.write(b'{"role": "model", "content": "orphan"')
+        with open(os.path.join(self.directory, "s.idx"), "ab") as index:
+            index.write(b"\x01\x02\x03")
+        self.assertEqual(self.store.turn_count("s"), 1)
+
+        self.assertEqual(self.store.append_turn("s", "model", "two"), 1)
+        self.store.append_turn("s", "user", "three")
+        self.assertEqual(self.contents("s"), ["one", "two", "three"])
+        self.assertEqual([turn["content"] for turn in self.store.load_tail("s", 2)], ["two", "three"])
+
+    def test_listeners_hear_each_turn(self):
+        seen = []
+        self.store.add_listener(lambda session_id, turn: seen.append((session_id, turn)))
+        self.store.append_turn("s", "user", "one")
+        self.store.append_turn("s", "model", "two")
+        self.assertEqual(seen, [("s", 0), ("s", 1)])
+
+@unittest.skipUnless(FTS5_AVAILABLE, "SQLite was built without FTS5")
+class ConversationSearchTest(unittest.TestCase):
+    """The full-text index following the store"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.store = ConversationStore(os.path.join(self.directory, "conversations"))
+        self.search = ConversationSearch(self.store, os.path.join(self.directory, "search.db"),
+                                         delay=0.01, scan_interval=0)
+        self.addCleanup(self.search.close)
+
+    def sessions(self, query):
+        return [(hit["session_id"], hit["turn"]) for hit in self.search.search(query)]
+
+    def test_catches_up_with_conversations_saved_before_the_index(self):
+        self.store.append_turn("old", "user", "my kubernetes ingress is broken")
+        self.store.append_turn("old", "model", "check the ingress controller logs")
+        self.assertEqual(self.sessions("kubernetes"), [("old", 0)])
+        self.assertEqual(self.search.stats(), {"sessions": 1, "turns": 2})
+
+    def test_new_turns_are_searchable_at_once(self):
+        self.search.attach()
+        self.store.append_turn("live", "user", "tell me about zanzibar spices")
+        self.assertEqual(self.sessions("zanzibar"), [("live", 0)])
+        self.store.append_turn("live", "user", "and zanzibar beaches")
+        self.assertEqual(sorted(self.sessions("zanz*")), [("live", 0), ("live", 1)])
+
+    def test_turns_appended_by_another_process_are_picked_up(self):
+        self.search.attach()
+        self.store.append_turn("s", "user", "first message")
+        self.assertEqual(self.sessions("first"), [("s", 0)])
+        # A second store on the same directory has no listener, like another process
+        ConversationStore(self.store.directory).append_turn("s", "user", "quokka sighting")
+        self.assertEqual(self.sessions("quokka"), [("s", 1)])
+        self.assertEqual(self.search.stats()["turns"], 2)
+
+    def test_queries_without_words_find_nothing(self):
+        self.store.append_turn("s", "user", "anything")
+        self.assertEqual(self.search.search('(( "'), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from document_index import DocumentLibrary
+
+class DocumentSearchTest(unittest.TestCase):
+    """Ranking chunks across several attached documents"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.library = DocumentLibrary(os.path.join(self.directory, "index"), chunk_chars=200)
+
+    def attach(self, name, lines):
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return self.library.attach(path)
+
+    def test_document_sharing_only_a_common_word_ranks_below_the_relevant_one(self):
+        relevant = self.attach("kafka.txt", [f"the consumer group rebalance took {i} seconds" for i in range(40)] +
+                               ["kafka rebalance timeout on partition 7"])
+        unrelated = self.attach("recipes.txt", [f"the oven should be hot before step {i}" for i in range(40)])
+        results = self.library.search([unrelated, relevant], "why the kafka rebalance timeout", 3)
+        self.assertEqual([document.name for document, _ in results], ["kafka.txt"] * 3)
+        self.assertIn("partition 7", results[0][1][2])
+
+    def test_results_from_both_documents_when_both_match(self):
+        first = self.attach("a.txt", ["kafka broker settings"] * 5)
+        second = self.attach("b.txt", ["zookeeper quorum settings"] * 5)
+        results = self.library.search([first, second], "kafka zookeeper", 4)
+        self.assertEqual({document.name for document, _ in results}, {"a.txt", "b.txt"})
+
+if __name__ == "__main__":
+    unittest.main()
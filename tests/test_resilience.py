@@ -0,0 +1,157 @@
+import asyncio
+import os
+import time
+import unittest
+from unittest import mock
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("JARVIS_RESPONSE_CACHE", "0")
+
+import chat_logic
+from chat_logic import model_registry
+from error_handler import CircuitOpenError, DeadlineExceededError, InvalidRequestError, ServiceUnavailableError
+from fake_backend import ServiceUnavailable, install_fake_backend
+from resilience import CircuitBreaker, ResilientCaller, RetryPolicy
+from scheduler import RequestScheduler
+
+class InvalidArgument(Exception):
+    """Named like the SDK's exception for a malformed request"""
+
+class CircuitBreakerTest(unittest.TestCase):
+    """Opening, half-open trials and closing again"""
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+
+    def open(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.open()
+        self.assertEqual(self.breaker.times_opened, 1)
+
+    def test_half_open_lets_one_trial_through_and_closes_on_success(self):
+        self.open()
+        time.sleep(0.06)
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_trial_reopens(self):
+        self.open()
+        time.sleep(0.06)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.times_opened, 2)
+
+    def test_released_trial_can_be_retried(self):
+        self.open()
+        time.sleep(0.06)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.release()
+        self.assertTrue(self.breaker.allow())
+
+class ResilientCallerTest(unittest.TestCase):
+    """Retry classification and breaker accounting"""
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        self.caller = ResilientCaller(RetryPolicy(max_attempts=3, base_delay=0.0), self.breaker)
+        self.attempts = 0
+
+    def failing(self, error, succeed_on=None):
+        def call(timeout):
+            self.attempts += 1
+            if self.attempts == succeed_on:
+                return "ok"
+            raise error
+        return call
+
+    def test_transient_errors_are_retried(self):
+        self.assertEqual(self.caller.call(self.failing(ServiceUnavailable("503"), succeed_on=3)), "ok")
+        self.assertEqual(self.attempts, 3)
+        self.assertEqual(self.caller.stats()["retries"], 2)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_exhausted_retries_count_as_one_breaker_failure(self):
+        with self.assertRaises(ServiceUnavailableError):
+            self.caller.call(self.failing(ServiceUnavailable("503")))
+        self.assertEqual(self.attempts, 3)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        with self.assertRaises(ServiceUnavailableError):
+            self.caller.call(self.failing(ServiceUnavailable("503")))
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.caller.call(lambda timeout: "not called")
+        self.assertEqual(self.caller.stats()["rejected"], 1)
+
+    def test_bad_requests_are_not_retried_or_held_against_the_api(self):
+        for _ in range(3):
+            with self.assertRaises(InvalidRequestError):
+                self.caller.call(self.failing(InvalidArgument("bad field")))
+        self.assertEqual(self.attempts, 3)
+        self.assertEqual(self.caller.stats()["retries"], 0)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_async_calls_are_retried_the_same_way(self):
+        async def call(timeout):
+            self.attempts += 1
+            if self.attempts < 2:
+                raise ServiceUnavailable("503")
+            return "ok"
+        self.assertEqual(asyncio.run(self.caller.call_async(call)), "ok")
+        self.assertEqual(self.attempts, 2)
+
+class RateLimitDeadlineTest(unittest.TestCase):
+    """Requests queued for rate-limit budget against the request deadline and the circuit breaker"""
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        self.caller = ResilientCaller(RetryPolicy(max_attempts=1), self.breaker, deadline=0.3)
+        # 120 requests a minute: once the burst is spent, one request every half second
+        self.scheduler = RequestScheduler(requests_per_minute=120)
+        for _ in range(120):
+            self.scheduler.acquire(0)
+        patches = [mock.patch.object(chat_logic, "resilient_caller", self.caller),
+                   mock.patch.object(chat_logic, "request_scheduler", self.scheduler)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def chat_concurrently(self, count):
+        async def run():
+            return await asyncio.gather(*[
+                chat_logic.chat_with_gemini_async(f"queued {i}", session_id=f"queued-{i}", raise_errors=True)
+                for i in range(count)
+            ], return_exceptions=True)
+        return asyncio.run(run())
+
+    def test_queue_wait_does_not_use_up_the_deadline(self):
+        install_fake_backend(model_registry)
+        started = time.monotonic()
+        replies = self.chat_concurrently(3)
+        for i, reply in enumerate(replies):
+            self.assertIsInstance(reply, str)
+            self.assertIn(f"queued {i}", reply)
+        # The last request queued for well over the 0.3s deadline
+        self.assertGreater(time.monotonic() - started, 1.0)
+        self.assertEqual(self.scheduler.stats()["admitted"], 123)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.caller.stats()["failures"], 0)
+
+    def test_slow_upstream_still_hits_the_deadline(self):
+        install_fake_backend(model_registry, latency=1.0)
+        replies = self.chat_concurrently(1)
+        self.assertIsInstance(replies[0], DeadlineExceededError)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from response_cache import ResponseCache
+
+class CoalescingTest(unittest.TestCase):
+    """Concurrent requests for one key share a single computation"""
+    def setUp(self):
+        self.cache = ResponseCache()
+        self.calls = 0
+
+    async def compute(self):
+        self.calls += 1
+        await asyncio.sleep(0.2)
+        return f"reply {self.calls}"
+
+    def test_followers_share_the_leaders_result(self):
+        async def run():
+            return await asyncio.gather(*[self.cache.get_or_compute_async("k", self.compute) for _ in range(3)])
+        results = asyncio.run(run())
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [("reply 1", False), ("reply 1", True), ("reply 1", True)])
+        self.assertEqual(self.cache.stats()["coalesced"], 2)
+
+    def test_follower_takes_over_from_a_cancelled_leader(self):
+        async def run():
+            leader = asyncio.create_task(self.cache.get_or_compute_async("k", self.compute))
+            await asyncio.sleep(0.05)
+            followers = [asyncio.create_task(self.cache.get_or_compute_async("k", self.compute)) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            leader.cancel()
+            return await asyncio.gather(leader, *followers, return_exceptions=True)
+        leader, *followers = asyncio.run(run())
+        self.assertIsInstance(leader, asyncio.CancelledError)
+        # One follower computed the reply again and the other waited for it
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(sorted(followers), [("reply 2", False), ("reply 2", True)])
+
+    def test_cancelled_follower_leaves_the_leader_running(self):
+        async def run():
+            leader = asyncio.create_task(self.cache.get_or_compute_async("k", self.compute))
+            await asyncio.sleep(0.05)
+            follower = asyncio.create_task(self.cache.get_or_compute_async("k", self.compute))
+            await asyncio.sleep(0.05)
+            follower.cancel()
+            return await asyncio.gather(leader, follower, return_exceptions=True)
+        leader, follower = asyncio.run(run())
+        self.assertEqual(leader, ("reply 1", False))
+        self.assertIsInstance(follower, asyncio.CancelledError)
+        self.assertEqual(self.cache.get("k"), "reply 1")
+
+    def test_leader_error_reaches_followers_and_is_not_cached(self):
+        started = threading.Event()
+        def fail():
+            started.set()
+            time.sleep(0.2)
+            raise ValueError("bad request")
+        errors = []
+        def lead():
+            try:
+                self.cache.get_or_compute("k", fail)
+            except ValueError as e:
+                errors.append(e)
+        thread = threading.Thread(target=lead)
+        thread.start()
+        started.wait()
+        with self.assertRaises(ValueError):
+            self.cache.get_or_compute("k", lambda: "unused")
+        thread.join()
+        self.assertEqual(len(errors), 1)
+        self.assertIsNone(self.cache.get("k"))
+
+class PersistentTierTest(unittest.TestCase):
+    """The SQLite tier outlives the in-memory LRU"""
+    def test_entries_survive_a_new_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "responses.db")
+        ResponseCache(db_path=path).put("k", "stored")
+        reopened = ResponseCache(db_path=path)
+        self.assertEqual(asyncio.run(reopened.get_or_compute_async("k", None)), ("stored", True))
+        self.assertEqual(reopened.stats()["persistent_hits"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from semantic_cache import NUMPY_AVAILABLE, SemanticCache, hashing_embedder
+
+@unittest.skipUnless(NUMPY_AVAILABLE, "the semantic cache requires numpy")
+class PersistentSemanticCacheTest(unittest.TestCase):
+    """Embeddings and replies written to a directory and opened again"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def open(self, capacity=8):
+        return SemanticCache(hashing_embedder(), capacity=capacity, threshold=0.9, directory=self.directory)
+
+    def test_replies_survive_reopening(self):
+        cache = self.open()
+        cache.put("what is the capital of france", "Paris")
+        cache.put("how tall is mount everest", "8849 metres")
+        reopened = self.open()
+        self.assertEqual(reopened.lookup("what is the capital of france"), "Paris")
+        self.assertEqual(reopened.lookup("how tall is mount everest"), "8849 metres")
+        self.assertIsNone(reopened.lookup("recommend a jazz album"))
+        self.assertEqual(reopened.stats()["entries"], 2)
+
+    def test_replaced_entries_point_at_their_new_replies(self):
+        cache = self.open(capacity=2)
+        for i in range(6):
+            cache.put(f"question number {i} about topic {i * 7}", f"answer {i}")
+        reopened = self.open(capacity=2)
+        self.assertEqual(reopened.lookup("question number 5 about topic 35"), "answer 5")
+        self.assertEqual(reopened.lookup("question number 4 about topic 28"), "answer 4")
+        self.assertIsNone(reopened.lookup("question number 0 about topic 0"))
+
+    def test_slot_with_a_mismatched_record_misses(self):
+        cache = self.open()
+        cache.put("what is the capital of france", "Paris")
+        # Simulate a crash that left the slot pointing at a record written for another entry
+        path = os.path.join(self.directory, "replies.jsonl")
+        with open(path, encoding="utf-8") as f:
+            record = json.loads(f.readline())
+        record["stamp"] += 1
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        self.assertIsNone(self.open().lookup("what is the capital of france"))
+
+    def test_capacity_change_starts_empty(self):
+        self.open().put("what is the capital of france", "Paris")
+        resized = self.open(capacity=16)
+        self.assertIsNone(resized.lookup("what is the capital of france"))
+        resized.put("how tall is mount everest", "8849 metres")
+        self.assertEqual(self.open(capacity=16).lookup("how tall is mount everest"), "8849 metres")
+
+if __name__ == "__main__":
+    unittest.main()
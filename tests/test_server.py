@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("JARVIS_RESPONSE_CACHE", "0")
+
+from chat_logic import model_registry
+from fake_backend import install_fake_backend
+from server import ChatServer, RequestGate
+
+class ServerSmokeTest(unittest.TestCase):
+    """Runs the HTTP server against the fake backend on a free local port"""
+    def setUp(self):
+        install_fake_backend(model_registry, latency=0.5)
+        self.gate = RequestGate(max_concurrent=1, max_queue=0)
+        self.server = ChatServer(("127.0.0.1", 0), self.gate)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def post(self, path, body):
+        request = urllib.request.Request(self.url + path, data=json.dumps(body).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def start_slow_request(self, results):
+        body = {"session_id": "slow", "message": "hello"}
+        thread = threading.Thread(target=lambda: results.append(self.post("/chat", body)))
+        thread.start()
+        deadline = time.monotonic() + 5
+        while self.gate.in_flight == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.gate.in_flight, 1)
+        return thread
+
+    def test_chat_and_history(self):
+        status, body = self.post("/chat", {"session_id": "s1", "message": "ping"})
+        self.assertEqual(status, 200)
+        self.assertIn("ping", body["response"])
+        with urllib.request.urlopen(f"{self.url}/history?session_id=s1", timeout=10) as response:
+            self.assertEqual(len(json.loads(response.read())["messages"]), 2)
+
+    def test_metrics_are_reported_once(self):
+        second = ChatServer(("127.0.0.1", 0), RequestGate(max_concurrent=1, max_queue=0))
+        second.server_close()
+        with urllib.request.urlopen(f"{self.url}/metrics", timeout=10) as response:
+            metrics = response.read().decode("utf-8")
+        self.assertEqual(metrics.count("# TYPE jarvis_http_in_flight gauge"), 1)
+
+    def test_unknown_history_is_404(self):
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            urllib.request.urlopen(f"{self.url}/history?session_id=never-used", timeout=10)
+        self.assertEqual(raised.exception.code, 404)
+
+    def test_full_server_returns_429(self):
+        results = []
+        thread = self.start_slow_request(results)
+        status, _ = self.post("/chat", {"session_id": "other", "message": "too many"})
+        self.assertEqual(status, 429)
+        thread.join()
+        self.assertEqual(results[0][0], 200)
+        self.assertEqual(self.gate.rejected, 1)
+
+    def test_drain_waits_for_in_flight_requests(self):
+        results = []
+        thread = self.start_slow_request(results)
+        self.assertTrue(self.gate.drain(timeout=5))
+        self.assertEqual(self.gate.in_flight, 0)
+        thread.join()
+        self.assertEqual(results[0][0], 200)
+        status, _ = self.post("/chat", {"session_id": "late", "message": "after drain"})
+        self.assertEqual(status, 503)
+
+if __name__ == "__main__":
+    unittest.main()